@@ -0,0 +1,303 @@
+"""Benchmark every query the app issues, at one or more data scales.
+
+For each scale the database is (optionally) reseeded with data/bulk_seed.py,
+then each case below is run ``--iterations`` times after a warm-up. Results
+(p50/p95/p99 latency, rows/sec) and an EXPLAIN (ANALYZE, BUFFERS) plan per case
+are written to a JSON file that a later run can be compared against.
+
+Usage:
+    python3 bench/benchmark.py --dsn "dbname=library_bench" --scales 0.001,0.01,0.1
+    python3 bench/benchmark.py --no-seed --output before.json     # current data
+    python3 bench/benchmark.py --no-seed --compare before.json    # exit 1 on regression
+    python3 bench/benchmark.py --no-seed --prepared --compare before.json  # prepared hot queries
+
+Seeding TRUNCATEs the target database, so point --dsn at a scratch database.
+Write cases (checkout/return) run inside a transaction that is rolled back.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "code"))
+sys.path.insert(0, os.path.join(ROOT, "data"))
+
+import accrue_fines  # noqa: E402
+import browse  # noqa: E402
+import bulk_seed  # noqa: E402
+import circulation  # noqa: E402
+import computers  # noqa: E402
+import db  # noqa: E402
+import queries  # noqa: E402
+import search  # noqa: E402
+
+SAMPLE_SIZE = 200
+
+
+def load_samples(cur):
+    """Realistic parameter values (search terms, ISBNs, cards) drawn from the data."""
+    samples = {}
+    cur.execute(f"""
+        SELECT isbn, split_part(title, ' ', 1), split_part(author, ' ', 2), checkout_status
+        FROM Book ORDER BY random() LIMIT {SAMPLE_SIZE}
+    """)
+    books = cur.fetchall()
+    samples["isbns"] = [row[0] for row in books] or ["0"]
+    samples["title_words"] = [row[1] for row in books if row[1]] or ["a"]
+    samples["author_names"] = [row[2] for row in books if row[2]] or ["a"]
+    samples["available_isbns"] = [row[0] for row in books if row[3] == "Available"] or ["0"]
+    samples["checked_out_isbns"] = [row[0] for row in books if row[3] == "Checked Out"] or ["0"]
+    cur.execute(f"""
+        SELECT card_id, split_part(name, ' ', 2), status
+        FROM Library_Card ORDER BY random() LIMIT {SAMPLE_SIZE}
+    """)
+    cards = cur.fetchall()
+    samples["card_ids"] = [row[0] for row in cards] or [1]
+    samples["active_card_ids"] = [row[0] for row in cards if row[2] == "Active"] or [1]
+    samples["last_names"] = [row[1] for row in cards if row[1]] or ["a"]
+    cur.execute("SELECT isbn FROM Book WHERE checkout_status = 'Checked Out' LIMIT 1000")
+    samples["book_drop"] = [row[0] for row in cur.fetchall()] or ["0"]
+    return samples
+
+
+def _search(mode, term_key, prefix=None, skip=0):
+    def build(rng, samples):
+        term = rng.choice(samples[term_key])
+        if prefix:
+            term = term[skip:skip + prefix]
+        return search.build_query(term, mode, 26)
+    return build
+
+
+# name -> (build(rng, samples) -> (sql, params), is_write)
+CASES = {
+    "dashboard_snapshot": (lambda rng, s: (queries.DASHBOARD_SNAPSHOT, None), False),
+    "computer_availability": (lambda rng, s: (computers.AVAILABILITY, None), False),
+    "computer_session_start": (lambda rng, s: (computers.START_SESSION_SQL, {
+        "card_id": rng.choice(s["active_card_ids"]),
+        "computer_id": None,
+    }), True),
+    "book_search_browse": (lambda rng, s: search.build_query("", "browse", 26), False),
+    "book_search_text_title": (_search("text", "title_words"), False),
+    "book_search_text_author": (_search("text", "author_names"), False),
+    "book_search_isbn_prefix": (_search("isbn", "isbns", prefix=7), False),
+    "book_search_isbn_substring": (_search("isbn_substring", "isbns", prefix=6, skip=4), False),
+    "member_lookup_name": (lambda rng, s: queries.member_lookup(rng.choice(s["last_names"]), 0, 11), False),
+    "member_lookup_id": (lambda rng, s: queries.member_lookup(str(rng.choice(s["card_ids"])), 0, 11), False),
+    "checkout_single": (lambda rng, s: (circulation.CHECKOUT_SQL, {
+        "card_id": rng.choice(s["active_card_ids"]),
+        "isbns": [rng.choice(s["available_isbns"])],
+        "loan_days": circulation.LOAN_DAYS,
+    }), True),
+    "checkout_cart_10": (lambda rng, s: (circulation.CHECKOUT_SQL, {
+        "card_id": rng.choice(s["active_card_ids"]),
+        "isbns": rng.sample(s["available_isbns"], min(10, len(s["available_isbns"]))),
+        "loan_days": circulation.LOAN_DAYS,
+    }), True),
+    "return_single": (lambda rng, s: (circulation.RETURN_SQL, {"isbns": [rng.choice(s["checked_out_isbns"])]}), True),
+    "return_book_drop_1000": (lambda rng, s: (circulation.RETURN_SQL, {"isbns": s["book_drop"]}), True),
+    "fine_accrual": (lambda rng, s: (accrue_fines.ACCRUE_SQL, {
+        "rate": accrue_fines.FINE_PER_DAY,
+        "max_fine": accrue_fines.MAX_FINE,
+        "lookback_days": accrue_fines.LOOKBACK_DAYS,
+    }), True),
+    "report_top_borrowers": (lambda rng, s: (queries.TOP_BORROWERS, None), False),
+    "report_top_borrowers_30_days": (lambda rng, s: queries.top_borrowers("Last 30 days"), False),
+    "report_top_borrowers_12_months": (lambda rng, s: queries.top_borrowers("Last 12 months"), False),
+    "report_member_fines_all": (lambda rng, s: queries.member_fines("All"), False),
+    "report_member_fines_outstanding": (lambda rng, s: queries.member_fines("Outstanding"), False),
+    "report_active_checkouts": (lambda rng, s: (queries.ACTIVE_CHECKOUTS, None), False),
+    "report_computer_usage": (lambda rng, s: (queries.COMPUTER_USAGE, None), False),
+    "report_overdue_books": (lambda rng, s: (queries.OVERDUE_BOOKS, None), False),
+    "admin_all_members_page": (lambda rng, s: browse.build_query("Library_Card", {}, "card_id", False, 101), False),
+    "admin_all_members_by_name": (lambda rng, s: browse.build_query("Library_Card", {}, "name", False, 101), False),
+    "admin_all_books_page": (lambda rng, s: browse.build_query("Book", {}, "title", False, 101), False),
+    "admin_all_books_filtered": (lambda rng, s: browse.build_query(
+        "Book", {"checkout_status": "Checked Out"}, "due_date", True, 101), False),
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_case(conn, build, samples, iterations, warmup, rng):
+    timings = []
+    total_rows = 0
+    for i in range(warmup + iterations):
+        sql, params = build(rng, samples)
+        with conn.cursor() as cur:
+            start = time.perf_counter()
+            cur.execute(sql, params)
+            rows = cur.fetchall() if cur.description else []
+            elapsed = time.perf_counter() - start
+        # Reads end their snapshot, writes are undone so every iteration sees
+        # the same data
+        conn.rollback()
+        if i >= warmup:
+            timings.append(elapsed)
+            total_rows += len(rows)
+
+    timings.sort()
+    total_time = sum(timings)
+    return {
+        "iterations": iterations,
+        "rows": total_rows,
+        "mean_ms": total_time / len(timings) * 1000,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "max_ms": timings[-1] * 1000,
+        "rows_per_sec": total_rows / total_time if total_time else 0.0,
+    }
+
+
+def explain(conn, build, samples, rng):
+    sql, params = build(rng, samples)
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        plan = cur.fetchone()[0]
+    conn.rollback()
+    return plan
+
+
+def table_counts(cur):
+    counts = {}
+    for table in ("Library_Card", "Book", "Items", "Fine", "Computers_Session", "Loan"):
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        counts[table] = cur.fetchone()[0]
+    return counts
+
+
+def connect(dsn, prepared):
+    """Plain connection, or one that prepares hot queries like the app's pool."""
+    if not prepared:
+        return psycopg2.connect(dsn)
+    conn = psycopg2.connect(dsn, connection_factory=db.PooledConnection, cursor_factory=db.PreparingCursor)
+    conn.statement_cache = db.StatementCache(32, lambda stat: None)
+    return conn
+
+
+def benchmark_scale(dsn, label, args, selected):
+    conn = connect(dsn, args.prepared)
+    try:
+        rng = random.Random(args.seed)
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            server_version = cur.fetchone()[0]
+            counts = table_counts(cur)
+            samples = load_samples(cur)
+        conn.rollback()
+
+        results = []
+        for name in selected:
+            build, is_write = CASES[name]
+            result = run_case(conn, build, samples, args.iterations, args.warmup, rng)
+            result.update(scale=label, case=name, write=is_write, table_counts=counts,
+                          server_version=server_version, prepared=args.prepared)
+            if not args.no_explain:
+                result["plan"] = explain(conn, build, samples, rng)
+            results.append(result)
+            print(f"  {name:34s} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                  f"p99 {result['p99_ms']:9.2f} ms  {result['rows_per_sec']:12,.0f} rows/s")
+        return results
+    finally:
+        conn.close()
+
+
+def compare(results, baseline_path, threshold):
+    """Print p95 changes against a previous run; return True if any case regressed."""
+    with open(baseline_path) as f:
+        baseline = {(r["scale"], r["case"]): r for r in json.load(f)["results"]}
+
+    regressed = False
+    print(f"\nComparison with {baseline_path} (p95, regression threshold {threshold:.0%}):")
+    for result in results:
+        before = baseline.get((result["scale"], result["case"]))
+        if before is None:
+            continue
+        change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"  [{result['scale']}] {result['case']:34s} {before['p95_ms']:9.2f} -> "
+              f"{result['p95_ms']:9.2f} ms ({change:+.1%}){flag}")
+    return regressed
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the library app's queries.")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--scales", default="0.001,0.01,0.1",
+                        help="comma-separated bulk_seed scale factors to benchmark")
+    parser.add_argument("--no-seed", action="store_true", help="benchmark the data already in the database")
+    parser.add_argument("--cases", help="comma-separated subset of cases to run (default: all)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="bulk_seed worker processes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-explain", action="store_true", help="skip EXPLAIN (ANALYZE, BUFFERS) capture")
+    parser.add_argument("--prepared", action="store_true",
+                        help="run the app's hot queries as prepared statements (as its connection pool does)")
+    parser.add_argument("--output", help="results file (default: bench/results-<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 slowdown that counts as a regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    selected = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in selected if name not in CASES]
+    if unknown:
+        sys.exit(f"Unknown cases: {', '.join(unknown)}")
+
+    results = []
+    if args.no_seed:
+        print("Benchmarking current database...")
+        results += benchmark_scale(args.dsn, "current", args, selected)
+    else:
+        for scale in (float(s) for s in args.scales.split(",")):
+            counts = bulk_seed.scaled_counts(scale)
+            print(f"Seeding scale {scale}...")
+            bulk_seed.bulk_seed(args.dsn, counts, args.workers, args.seed)
+            print(f"Benchmarking scale {scale}...")
+            results += benchmark_scale(args.dsn, str(scale), args, selected)
+
+    output = args.output or os.path.join(
+        ROOT, "bench", f"results-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "iterations": args.iterations,
+            "results": results,
+        }, f, indent=2, default=str)
+    print(f"\nResults written to {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
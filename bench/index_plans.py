@@ -0,0 +1,140 @@
+"""Show how each hot-path index changes the plans of the queries it serves.
+
+For every index in INDEX_CASES the benchmark cases it was added for are run
+under EXPLAIN (ANALYZE, BUFFERS) twice: once as-is, and once inside a
+transaction that drops the index first (and is rolled back, so the index
+survives). The scan nodes, buffers read and median execution time of both
+plans are printed side by side and optionally saved as JSON.
+
+Usage:
+    python3 code/migrate.py --dsn "dbname=library_bench"
+    python3 bench/index_plans.py --dsn "dbname=library_bench"
+    python3 bench/index_plans.py --indexes fine_card_id_idx --output plans.json
+
+The database should already be seeded (e.g. with data/bulk_seed.py). The
+temporary DROP INDEX takes an exclusive lock on the table until the rollback,
+so run this against a scratch database, not a live one.
+"""
+import argparse
+import json
+import random
+import statistics
+
+import psycopg2
+
+import benchmark
+
+# index (from code/migrations/003_hot_path_indexes.sql) -> benchmark cases it serves
+INDEX_CASES = {
+    "book_lib_card_id_idx": ["member_lookup_name", "member_lookup_id"],
+    "book_checked_out_due_idx": ["report_active_checkouts", "dashboard_snapshot"],
+    "fine_card_id_idx": ["member_lookup_name", "member_lookup_id"],
+    "library_card_status_idx": ["dashboard_snapshot"],
+    "library_card_name_trgm_idx": ["member_lookup_name"],
+    "library_card_name_idx": ["admin_all_members_by_name"],
+}
+
+
+def plan_summary(plan):
+    """Scan nodes, shared buffers and execution time of an EXPLAIN JSON plan."""
+    nodes = []
+
+    def walk(node):
+        if "Scan" in node["Node Type"]:
+            target = node.get("Index Name") or node.get("Relation Name")
+            nodes.append(f"{node['Node Type']} on {target}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    top = plan[0]["Plan"]
+    return {
+        "scans": nodes,
+        "shared_buffers": top.get("Shared Hit Blocks", 0) + top.get("Shared Read Blocks", 0),
+        "execution_ms": plan[0]["Execution Time"],
+    }
+
+
+def explain_case(conn, sql, params, repeat, drop_index=None):
+    """Median-time EXPLAIN ANALYZE summary, optionally with an index hidden."""
+    summaries = []
+    for _ in range(repeat):
+        with conn.cursor() as cur:
+            if drop_index:
+                cur.execute(f"DROP INDEX {drop_index}")
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+            summaries.append(plan_summary(cur.fetchone()[0]))
+        conn.rollback()
+    summary = summaries[-1]
+    summary["execution_ms"] = statistics.median(s["execution_ms"] for s in summaries)
+    return summary
+
+
+def compare_index(conn, index, samples, args):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (index,))
+        exists = cur.fetchone()[0]
+    conn.rollback()
+    if not exists:
+        print(f"\n{index}: not found (run code/migrate.py first)")
+        return []
+
+    results = []
+    print(f"\n{index}")
+    for case in INDEX_CASES[index]:
+        build, _ = benchmark.CASES[case]
+        # Same parameters for both runs so only the index differs
+        sql, params = build(random.Random(args.seed), samples)
+        without = explain_case(conn, sql, params, args.repeat, drop_index=index)
+        with_index = explain_case(conn, sql, params, args.repeat)
+        speedup = without["execution_ms"] / with_index["execution_ms"] if with_index["execution_ms"] else 0.0
+        print(f"  {case}")
+        print(f"    without: {without['execution_ms']:9.2f} ms  {without['shared_buffers']:8d} buffers  "
+              f"{'; '.join(without['scans'])}")
+        print(f"    with:    {with_index['execution_ms']:9.2f} ms  {with_index['shared_buffers']:8d} buffers  "
+              f"{'; '.join(with_index['scans'])}")
+        print(f"    speedup: {speedup:.1f}x")
+        results.append({"index": index, "case": case, "without": without, "with": with_index,
+                        "speedup": speedup})
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare query plans with and without each hot-path index.")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--indexes", help="comma-separated subset of indexes (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="EXPLAIN ANALYZE runs per plan (median time is reported)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the comparison to this JSON file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    selected = args.indexes.split(",") if args.indexes else list(INDEX_CASES)
+    unknown = [name for name in selected if name not in INDEX_CASES]
+    if unknown:
+        raise SystemExit(f"Unknown indexes: {', '.join(unknown)}")
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        with conn.cursor() as cur:
+            counts = benchmark.table_counts(cur)
+            samples = benchmark.load_samples(cur)
+        conn.rollback()
+        print("Table sizes: " + ", ".join(f"{table}={count:,}" for table, count in counts.items()))
+        results = []
+        for index in selected:
+            results += compare_index(conn, index, samples, args)
+    finally:
+        conn.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"table_counts": counts, "git_revision": benchmark.git_revision(),
+                       "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
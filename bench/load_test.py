@@ -0,0 +1,162 @@
+"""Load test the kiosk API (code/api.py) with many concurrent simulated kiosks.
+
+Each kiosk repeats a patron visit for ``--duration`` seconds: look up the
+patron's card, check out one book, then return it through the drop box.
+Every kiosk works its own set of Available books, so checkouts only fail if
+the API does. Throughput, p50/p95/p99 latency per endpoint and the HTTP
+status counts (including 503s from backpressure) are printed and optionally
+saved as JSON.
+
+Usage:
+    python3 code/api.py --dsn "dbname=library_bench" &
+    python3 bench/load_test.py --dsn "dbname=library_bench" --kiosks 300 --duration 30
+    python3 bench/load_test.py --url http://10.0.0.5:8080 --kiosks 500 --output load.json
+
+--dsn is only used to pick books and cards. The visits really check out and
+return books (each book ends up Available again, with an extra Loan row),
+so point it at a scratch database, not a live one.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+
+import aiohttp
+import psycopg2
+
+import benchmark
+
+
+def pick_books_and_cards(dsn, kiosks, books_per_kiosk):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT isbn FROM Book WHERE checkout_status = 'Available' ORDER BY random() LIMIT %s",
+                        (kiosks * books_per_kiosk,))
+            isbns = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT card_id FROM Library_Card WHERE status = 'Active' ORDER BY random() LIMIT 1000")
+            cards = [row[0] for row in cur.fetchall()]
+        conn.rollback()
+    finally:
+        conn.close()
+    if len(isbns) < kiosks or not cards:
+        raise SystemExit(f"Need at least {kiosks} Available books and one Active card "
+                         f"(found {len(isbns)} and {len(cards)}); seed with data/bulk_seed.py first.")
+    return [isbns[i::kiosks] for i in range(kiosks)], cards
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self.errors = Counter()
+
+    def add(self, endpoint, seconds, status):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[status] += 1
+
+
+async def timed(session, results, endpoint, method, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        async with session.request(method, url, **kwargs) as response:
+            body = await response.json() if response.status == 200 else None
+            results.add(endpoint, time.perf_counter() - started, response.status)
+            return body
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        results.errors[type(e).__name__] += 1
+        return None
+
+
+async def kiosk(session, base_url, isbns, cards, deadline, rng, results):
+    turn = 0
+    while time.monotonic() < deadline:
+        isbn = isbns[turn % len(isbns)]
+        card_id = rng.choice(cards)
+        turn += 1
+        await timed(session, results, "members", "GET", f"{base_url}/members", params={"q": str(card_id)})
+        checkout = await timed(session, results, "checkout", "POST", f"{base_url}/checkout",
+                               json={"card_id": card_id, "isbns": [isbn]})
+        if checkout and checkout["results"][0]["outcome"] != "checked_out":
+            results.errors["checkout_" + checkout["results"][0]["outcome"]] += 1
+        await timed(session, results, "return", "POST", f"{base_url}/return", json={"isbns": [isbn]})
+
+
+async def run(args, isbn_sets, cards):
+    results = Results()
+    connector = aiohttp.TCPConnector(limit=args.kiosks)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        deadline = time.monotonic() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(kiosk(session, args.url.rstrip("/"), isbn_sets[i], cards, deadline,
+                                     random.Random(args.seed + i), results)
+                               for i in range(args.kiosks)))
+        elapsed = time.perf_counter() - started
+        async with session.get(f"{args.url.rstrip('/')}/health") as response:
+            health = await response.json()
+    return results, elapsed, health
+
+
+def summarize(results, elapsed):
+    summary = {"seconds": elapsed, "statuses": dict(results.statuses), "errors": dict(results.errors),
+               "endpoints": {}}
+    total = 0
+    for endpoint, timings in sorted(results.latencies.items()):
+        timings.sort()
+        total += len(timings)
+        summary["endpoints"][endpoint] = {
+            "requests": len(timings),
+            "requests_per_sec": len(timings) / elapsed,
+            "p50_ms": benchmark.percentile(timings, 50) * 1000,
+            "p95_ms": benchmark.percentile(timings, 95) * 1000,
+            "p99_ms": benchmark.percentile(timings, 99) * 1000,
+        }
+    summary["requests"] = total
+    summary["requests_per_sec"] = total / elapsed if elapsed else 0.0
+    return summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the kiosk API with concurrent simulated kiosks.")
+    parser.add_argument("--url", default="http://localhost:8080", help="base URL of code/api.py")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--kiosks", type=int, default=200, help="concurrent simulated kiosks")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--books-per-kiosk", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the summary to this JSON file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    isbn_sets, cards = pick_books_and_cards(args.dsn, args.kiosks, args.books_per_kiosk)
+    print(f"Running {args.kiosks} kiosks against {args.url} for {args.duration:.0f}s...")
+    results, elapsed, health = asyncio.run(run(args, isbn_sets, cards))
+    summary = summarize(results, elapsed)
+    summary["server"] = health
+
+    print(f"\n{summary['requests']:,} requests in {elapsed:.1f}s ({summary['requests_per_sec']:,.0f} req/s)")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"  {endpoint:10s} {stats['requests']:>8,}  {stats['requests_per_sec']:>8,.0f}/s  "
+              f"p50 {stats['p50_ms']:7.1f} ms  p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms")
+    print("Status codes: " + ", ".join(f"{status}={count:,}" for status, count in sorted(summary["statuses"].items())))
+    if summary["errors"]:
+        print("Errors: " + ", ".join(f"{name}={count:,}" for name, count in summary["errors"].items()))
+    batches = health["return_batches"]
+    print(f"Server: {health['limiter']['rejected']:,} rejected with 503, "
+          f"{batches['requests_per_batch']:.1f} returns per batch, "
+          f"pool avg wait {health['pool']['avg_wait'] * 1000:.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Check read-replica routing (db.ReadRouter) against a primary and a streaming replica.
+
+Writes a counter on the primary over and over, and after each write reads
+it back through the router, then reads it ``--reads-per-write`` more times.
+Every second it prints where the reads went, the replica's lag and status,
+and how many reads returned an older value than the one just written
+(should be 0). Stop the replica during a run (pg_ctl -D <replica dir>
+stop) to watch reads fall back to the primary, and start it again to watch
+them return once it has caught up; README.md shows how to set up the pair.
+
+Usage:
+    python3 bench/replica_check.py --dsn "port=5432 dbname=library" --replica-dsn "port=5433 dbname=library"
+    python3 bench/replica_check.py --replica-dsn "port=5433 dbname=library" --duration 60 --max-lag 5
+    python3 bench/replica_check.py --replica-dsn "port=5433 dbname=library" --no-mark-write  # shows stale reads
+
+The counter lives in a scratch table (replica_check) that is dropped at the end.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "code"))
+
+import db  # noqa: E402
+
+SETUP_SQL = """
+    CREATE TABLE IF NOT EXISTS replica_check (id INTEGER PRIMARY KEY, value BIGINT NOT NULL);
+    INSERT INTO replica_check VALUES (1, 0) ON CONFLICT (id) DO UPDATE SET value = 0
+"""
+
+WRITE_SQL = "UPDATE replica_check SET value = %s WHERE id = 1"
+
+READ_SQL = "SELECT value FROM replica_check WHERE id = 1"
+
+
+def wait_for_table(replica, timeout=30.0):
+    """Wait until the replica has replayed the scratch table."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if db.scalar(replica, "SELECT to_regclass('replica_check') IS NOT NULL"):
+            return
+        time.sleep(0.1)
+    sys.exit("replica_check never appeared on the replica; is it replicating from --dsn?")
+
+
+def run(router, duration, reads_per_write, mark_write):
+    totals = {"writes": 0, "reads": 0, "stale": 0, "errors": 0}
+    started = time.monotonic()
+    next_report = started + 1
+    value = 0
+    last = router.stats()
+    while time.monotonic() - started < duration:
+        value += 1
+        db.execute(router.primary, WRITE_SQL, (value,))
+        totals["writes"] += 1
+        if mark_write:
+            router.mark_write()
+        for _ in range(1 + reads_per_write):
+            try:
+                seen = db.scalar(router, READ_SQL)
+            except Exception as e:
+                totals["errors"] += 1
+                print(f"  read failed: {type(e).__name__}: {str(e).strip()}")
+                time.sleep(0.5)
+                continue
+            totals["reads"] += 1
+            if seen < value:
+                totals["stale"] += 1
+
+        if time.monotonic() >= next_report:
+            stats = router.stats()
+            lag = f"{stats['lag_seconds']:.2f}s" if stats['lag_seconds'] is not None else "-"
+            print(f"{time.monotonic() - started:6.1f}s  replica {stats['replica_reads'] - last['replica_reads']:>6,}  "
+                  f"primary {stats['primary_reads'] - last['primary_reads']:>6,}  lag {lag:>7}  "
+                  f"{'healthy' if stats['replica_healthy'] else 'fallback'}"
+                  f"{' (' + stats['error'] + ')' if stats['error'] else ''}  stale so far {totals['stale']:,}")
+            last = stats
+            next_report += 1
+    return totals
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check read-replica routing and fallback.")
+    parser.add_argument("--dsn", default="", help="primary libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--replica-dsn", required=True, help="libpq connection string of the streaming replica")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--reads-per-write", type=int, default=20, help="extra reads after each read-back")
+    parser.add_argument("--max-lag", type=float, default=10.0, help="seconds of lag before reads fall back")
+    parser.add_argument("--no-mark-write", action="store_true",
+                        help="do not announce writes to the router (reads may then be stale)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    primary = db.ConnectionPool({"dsn": args.dsn}, minconn=1, maxconn=2)
+    replica = db.ConnectionPool({"dsn": args.replica_dsn}, minconn=0, maxconn=2, check_after=0)
+    router = db.ReadRouter(primary, replica, max_lag=args.max_lag, check_every=1.0)
+    db.execute(primary, SETUP_SQL)
+    try:
+        wait_for_table(replica)
+        totals = run(router, args.duration, args.reads_per_write, not args.no_mark_write)
+    finally:
+        db.execute(primary, "DROP TABLE IF EXISTS replica_check")
+        router.closeall()
+
+    stats = router.stats()
+    print(f"{totals['writes']:,} writes, {totals['reads']:,} reads "
+          f"({stats['replica_share']:.0%} on the replica, {stats['replica_failures']:,} replica failures, "
+          f"{stats['recovery_conflicts']:,} recovery conflicts), {totals['errors']:,} failed reads, "
+          f"{totals['stale']:,} stale reads")
+    sys.exit(1 if totals["stale"] and not args.no_mark_write else 0)
@@ -0,0 +1,148 @@
+"""Accrue fines for overdue books and items; meant to run daily from cron.
+
+Every open Book loan (from the Loan table) and Items loan that is past its
+due date gets an Outstanding fine of FINE_PER_DAY per day overdue, capped at
+MAX_FINE. Book loans returned late since recent runs (within LOOKBACK_DAYS)
+get their final amount, counted up to the return date, so the days between
+the last run and the return are charged too. All fines are upserted by one
+set-based statement keyed on the loan (see migrations/005_fine_accrual.sql),
+so running the job again the same day changes nothing and a later run
+raises the existing fine instead of adding another. Fines that have been
+paid are left alone.
+
+Usage:
+    python3 code/accrue_fines.py                       # PG* environment variables
+    python3 code/accrue_fines.py --dsn "dbname=library" --rate 0.25 --max-fine 10
+    python3 code/accrue_fines.py --dry-run             # report, then roll back
+    python3 code/accrue_fines.py --lookback-days 30    # after the job has not run for weeks
+
+    # crontab: every night at 01:30
+    30 1 * * * cd /srv/library && python3 code/accrue_fines.py >> accrue_fines.log 2>&1
+"""
+import argparse
+import sys
+import time
+from decimal import Decimal
+
+import psycopg2
+
+FINE_PER_DAY = Decimal("0.50")
+MAX_FINE = Decimal("25.00")
+
+# How far back returned loans are settled; covers a week of missed runs
+LOOKBACK_DAYS = 7
+
+# Arbitrary key for pg_try_advisory_xact_lock, so overlapping runs skip
+ACCRUAL_LOCK_ID = 4_720_015
+
+# Overdue loans are found through partial indexes (loan_open_due_idx,
+# loan_returned_late_idx, items_on_loan_due_idx) and upserted in key order,
+# which keeps concurrent writers to Fine from deadlocking against the job.
+ACCRUE_SQL = """
+    WITH overdue_books AS (
+        SELECT DISTINCT ON (isbn, card_id, checkout_date) isbn, card_id, checkout_date, days_overdue
+        FROM (
+            SELECT l.isbn, l.card_id, l.checkout_date, CURRENT_DATE - l.due_date AS days_overdue
+            FROM Loan l
+            WHERE l.returned_date IS NULL
+              AND l.due_date < CURRENT_DATE
+              AND l.checkout_date < CURRENT_DATE
+            UNION ALL
+            SELECT l.isbn, l.card_id, l.checkout_date, l.returned_date - l.due_date
+            FROM Loan l
+            WHERE l.returned_date > l.due_date
+              AND l.returned_date >= CURRENT_DATE - %(lookback_days)s::integer
+        ) loans
+        WHERE EXISTS (SELECT 1 FROM Book b WHERE b.isbn = loans.isbn)
+        ORDER BY isbn, card_id, checkout_date, days_overdue DESC
+    ), overdue_items AS (
+        SELECT item_id, card_id, checkout_date, CURRENT_DATE - due_date AS days_overdue
+        FROM Items
+        WHERE card_id IS NOT NULL
+          AND due_date < CURRENT_DATE
+          AND checkout_date IS NOT NULL
+    ), book_fines AS (
+        INSERT INTO Fine AS f (card_id, isbn, amount, status, loan_checkout_date, days_overdue)
+        SELECT card_id, isbn, LEAST(days_overdue * %(rate)s::numeric, %(max_fine)s::numeric),
+               'Outstanding', checkout_date, days_overdue
+        FROM overdue_books
+        ORDER BY isbn, card_id, checkout_date
+        ON CONFLICT (isbn, card_id, loan_checkout_date)
+            WHERE isbn IS NOT NULL AND loan_checkout_date IS NOT NULL
+        DO UPDATE SET amount = EXCLUDED.amount, days_overdue = EXCLUDED.days_overdue
+            WHERE f.status = 'Outstanding' AND f.days_overdue IS DISTINCT FROM EXCLUDED.days_overdue
+        RETURNING xmax = 0 AS inserted
+    ), item_fines AS (
+        INSERT INTO Fine AS f (card_id, item_id, amount, status, loan_checkout_date, days_overdue)
+        SELECT card_id, item_id, LEAST(days_overdue * %(rate)s::numeric, %(max_fine)s::numeric),
+               'Outstanding', checkout_date, days_overdue
+        FROM overdue_items
+        ORDER BY item_id, card_id, checkout_date
+        ON CONFLICT (item_id, card_id, loan_checkout_date)
+            WHERE item_id IS NOT NULL AND loan_checkout_date IS NOT NULL
+        DO UPDATE SET amount = EXCLUDED.amount, days_overdue = EXCLUDED.days_overdue
+            WHERE f.status = 'Outstanding' AND f.days_overdue IS DISTINCT FROM EXCLUDED.days_overdue
+        RETURNING xmax = 0 AS inserted
+    ), changed AS (
+        SELECT inserted FROM book_fines
+        UNION ALL
+        SELECT inserted FROM item_fines
+    )
+    SELECT (SELECT COUNT(*) FROM overdue_books) AS overdue_books,
+           (SELECT COUNT(*) FROM overdue_items) AS overdue_items,
+           COUNT(*) FILTER (WHERE inserted) AS inserted,
+           COUNT(*) FILTER (WHERE NOT inserted) AS updated
+    FROM changed
+"""
+
+
+def accrue_fines(dsn, rate=FINE_PER_DAY, max_fine=MAX_FINE, dry_run=False, lookback_days=LOOKBACK_DAYS):
+    """Run one accrual pass; returns a dict of counts and the elapsed seconds.
+
+    Returns None if another run holds the accrual lock.
+    """
+    started = time.monotonic()
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (ACCRUAL_LOCK_ID,))
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                return None
+            cur.execute(ACCRUE_SQL, {'rate': rate, 'max_fine': max_fine, 'lookback_days': lookback_days})
+            columns = [desc[0] for desc in cur.description]
+            result = dict(zip(columns, cur.fetchone()))
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Accrue fines for overdue books and items.")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--rate", type=Decimal, default=FINE_PER_DAY, help="fine per day overdue")
+    parser.add_argument("--max-fine", type=Decimal, default=MAX_FINE, help="cap per loan")
+    parser.add_argument("--dry-run", action="store_true", help="compute and report, then roll back")
+    parser.add_argument("--lookback-days", type=int, default=LOOKBACK_DAYS,
+                        help="settle fines of books returned late within this many days")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = accrue_fines(args.dsn, args.rate, args.max_fine, args.dry_run, args.lookback_days)
+    if result is None:
+        sys.exit("Another fine accrual run is in progress; skipping.")
+    processed = result["overdue_books"] + result["overdue_items"]
+    print(f"{'[dry run] ' if args.dry_run else ''}Processed {processed:,} overdue loans "
+          f"({result['overdue_books']:,} books, {result['overdue_items']:,} items): "
+          f"{result['inserted']:,} fines added, {result['updated']:,} updated "
+          f"in {result['seconds']:.2f}s ({processed / max(result['seconds'], 1e-9):,.0f} loans/s)")
@@ -0,0 +1,371 @@
+"""HTTP/JSON API for self-checkout kiosks and scanner stations.
+
+    POST /checkout   {"card_id": 1042, "isbns": ["9780131103627", ...]}
+    POST /return     {"isbns": ["9780131103627", ...]}
+    GET  /members?q=smith&after=0&limit=10
+    GET  /export/<name>?format=csv|parquet&option=...   reports and tables (export.EXPORTS)
+    GET  /health     pool, replica, backpressure and batching counters
+
+The circulation endpoints call the same circulation functions as the
+Streamlit pages and answer with the dicts they return ({"results": [...]}
+per ISBN, or {"members": [...], "has_next": ...}). Exports are streamed into
+the response as they are read (export.py), in constant memory; each one
+holds a database connection until it finishes.
+
+The server is a single asyncio process. Database calls run on a thread pool
+sized to the connection pool, so at most ``pool_size`` statements are in
+flight and the event loop never blocks on psycopg2. Requests beyond that
+wait in a queue of at most ``max_pending``; when the queue is full the API
+answers 503 with a Retry-After header straight away instead of letting
+latency grow without bound. Exports, which hold a thread and a connection
+for as long as the client takes to download, run on their own
+``max_exports`` threads and extra connections, so slow downloads never take
+capacity from checkout and return. Returns that arrive within ``batch_window_ms``
+of each other (a busy drop box) are merged into one RETURN statement and
+transaction, and each caller gets back the results for its own ISBNs.
+
+With ``--replica-dsn``, member lookups and exports read from a streaming
+replica (db.ReadRouter) while it is up, no more than ``--max-replica-lag``
+seconds behind and caught up with the checkouts and returns this server has
+made; otherwise they fall back to the primary.
+
+Usage:
+    python3 code/api.py                                  # PG* environment variables, port 8080
+    python3 code/api.py --dsn "dbname=library" --port 8080 --pool-size 20 --max-pending 500
+    python3 code/api.py --dsn "port=5432 dbname=library" --replica-dsn "port=5433 dbname=library"
+
+bench/load_test.py drives it with many concurrent simulated kiosks.
+"""
+import argparse
+import asyncio
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import circulation
+import db
+import export
+
+# Largest scan list accepted in one request
+MAX_ISBNS = 500
+
+
+class Overloaded(Exception):
+    """The request queue is full; the client should retry later."""
+
+
+class Limiter:
+    """Runs blocking database calls on the executor, at most ``concurrency`` at a time.
+
+    Callers beyond that wait; once ``max_pending`` calls are running or
+    waiting, new ones are rejected with Overloaded.
+    """
+
+    def __init__(self, executor, concurrency, max_pending):
+        self.executor = executor
+        self.max_pending = max(max_pending, concurrency)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return {"pending": self.pending, "max_pending": self.max_pending, "rejected": self.rejected}
+
+
+class ReturnBatcher:
+    """Coalesces concurrent return requests into one circulation.return_books() call.
+
+    The first request opens a window of ``window`` seconds; every request
+    that arrives before it closes (or until ``max_isbns`` ISBNs are queued)
+    joins the same statement. If two requests in one batch scan the same
+    ISBN, the first gets the real outcome and the later ones see it as
+    already available, as if they had been run one after the other.
+    """
+
+    def __init__(self, pool, limiter, window, max_isbns=1000):
+        self.pool = pool
+        self.limiter = limiter
+        self.window = window
+        self.max_isbns = max_isbns
+        self._queued = []
+        self._queued_isbns = 0
+        self._timer = None
+        self._running = set()      # the event loop only keeps weak references to tasks
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, isbns):
+        future = asyncio.get_running_loop().create_future()
+        self._queued.append((isbns, future))
+        self._queued_isbns += len(isbns)
+        if self._queued_isbns >= self.max_isbns or self.window <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queued, self._queued_isbns = self._queued, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.requests += len(batch)
+        isbns = circulation.unique_isbns(isbn for request_isbns, _ in batch for isbn in request_isbns)
+        try:
+            results = await self.limiter.run(circulation.return_books, self.pool, isbns)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_isbn = {result['isbn']: result for result in results}
+        claimed = set()
+        for request_isbns, future in batch:
+            request_results = []
+            for isbn in request_isbns:
+                result = by_isbn[isbn]
+                if isbn in claimed and result['outcome'] == circulation.RETURNED:
+                    result = dict(result, card_id=None, due_date=None, days_overdue=None,
+                                  outcome=circulation.ALREADY_AVAILABLE)
+                claimed.add(isbn)
+                request_results.append(result)
+            if not future.done():
+                future.set_result(request_results)
+
+    def stats(self):
+        return {"batches": self.batches, "requests": self.requests,
+                "requests_per_batch": self.requests / self.batches if self.batches else 0.0}
+
+
+def _wrote(app):
+    """Keep the next reads on the primary until the replica has this write."""
+    if app["read_pool"] is not app["pool"]:
+        app["read_pool"].mark_write()
+
+
+def _json(data, status=200):
+    return web.json_response(data, status=status, dumps=lambda obj: json.dumps(obj, default=str))
+
+
+def _error(status, message, **headers):
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+
+async def _body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text='{"error": "request body must be JSON"}', content_type="application/json")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text='{"error": "request body must be a JSON object"}',
+                                 content_type="application/json")
+    return body
+
+
+def _isbns(body):
+    isbns = body.get("isbns")
+    if not isinstance(isbns, list) or not all(isinstance(isbn, str) for isbn in isbns):
+        raise web.HTTPBadRequest(text='{"error": "isbns must be a list of strings"}', content_type="application/json")
+    isbns = circulation.unique_isbns(isbns)
+    if not isbns or len(isbns) > MAX_ISBNS:
+        raise web.HTTPBadRequest(text=f'{{"error": "between 1 and {MAX_ISBNS} ISBNs per request"}}',
+                                 content_type="application/json")
+    return isbns
+
+
+@web.middleware
+async def backpressure(request, handler):
+    """Turn a full queue or an exhausted pool into 503 + Retry-After."""
+    try:
+        return await handler(request)
+    except Overloaded:
+        return _error(503, "server busy, retry shortly", **{"Retry-After": "1"})
+    except db.PoolTimeout:
+        return _error(503, "no database connection available", **{"Retry-After": "1"})
+
+
+async def checkout(request):
+    body = await _body(request)
+    card_id = body.get("card_id")
+    if isinstance(card_id, str) and card_id.strip().isdigit():
+        card_id = int(card_id)
+    if not isinstance(card_id, int) or isinstance(card_id, bool):
+        return _error(400, "card_id must be an integer")
+    isbns = _isbns(body)
+    results = await request.app["limiter"].run(circulation.checkout_books, request.app["pool"], card_id, isbns)
+    _wrote(request.app)
+    return _json({"results": results})
+
+
+async def return_books(request):
+    isbns = _isbns(await _body(request))
+    results = await request.app["batcher"].submit(isbns)
+    _wrote(request.app)
+    return _json({"results": results})
+
+
+async def members(request):
+    term = request.query.get("q", "").strip()
+    if not term:
+        return _error(400, "q is required")
+    try:
+        after = int(request.query.get("after", 0))
+        limit = min(max(int(request.query.get("limit", 10)), 1), 100)
+    except ValueError:
+        return _error(400, "after and limit must be integers")
+    found, has_next = await request.app["limiter"].run(
+        circulation.lookup_members, request.app["read_pool"], term, after, limit)
+    return _json({"members": found, "has_next": has_next})
+
+
+class ResponseWriter(io.RawIOBase):
+    """Binary file that an exporter running on the executor writes into a StreamResponse.
+
+    Each write waits until aiohttp has handed the data to the client socket,
+    so a slow client slows the export down instead of buffering it.
+    """
+
+    def __init__(self, response, loop):
+        super().__init__()
+        self.response = response
+        self.loop = loop
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        asyncio.run_coroutine_threadsafe(self.response.write(data), self.loop).result()
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+
+async def export_report(request):
+    name = request.match_info["name"]
+    fmt = request.query.get("format", export.CSV)
+    if name not in export.EXPORTS:
+        return _error(404, f"unknown export {name!r}")
+    if fmt not in export.FORMATS:
+        return _error(400, f"format must be one of {', '.join(export.FORMATS)}")
+    if fmt == export.PARQUET and export.pa is None:
+        return _error(501, "Parquet export needs pyarrow on the server")
+    try:
+        sql, params = export.EXPORTS[name](request.query.get("option"))
+    except KeyError:
+        return _error(400, "unknown option")
+
+    # Admission is checked before the headers go out, while a 503 can still be sent
+    limiter = request.app["export_limiter"]
+    if limiter.pending >= limiter.max_pending:
+        limiter.rejected += 1
+        raise Overloaded()
+    response = web.StreamResponse(headers={
+        "Content-Type": export.FORMATS[fmt],
+        "Content-Disposition": f'attachment; filename="{name}.{fmt}"',
+    })
+    await response.prepare(request)
+    writer = ResponseWriter(response, asyncio.get_running_loop())
+    await limiter.run(export.export, request.app["read_pool"], sql, params, writer, fmt)
+    await response.write_eof()
+    return response
+
+
+async def health(request):
+    read_pool = request.app["read_pool"]
+    return _json({
+        "pool": request.app["pool"].stats(),
+        "replica": read_pool.stats() if read_pool is not request.app["pool"] else None,
+        "limiter": request.app["limiter"].stats(),
+        "export_limiter": request.app["export_limiter"].stats(),
+        "return_batches": request.app["batcher"].stats(),
+    })
+
+
+def create_app(dsn="", pool_size=20, max_pending=500, batch_window_ms=5.0, replica_dsn=None, max_replica_lag=10.0,
+               max_exports=2):
+    # Exports get connections of their own on top of pool_size
+    pool = db.ConnectionPool({"dsn": dsn}, minconn=min(4, pool_size), maxconn=pool_size + max_exports)
+    read_pool = pool
+    if replica_dsn:
+        read_pool = db.ReadRouter(
+            pool, db.ConnectionPool({"dsn": replica_dsn}, minconn=0, maxconn=pool_size + max_exports),
+            max_lag=max_replica_lag)
+    executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="db")
+    export_executor = ThreadPoolExecutor(max_workers=max_exports, thread_name_prefix="export")
+
+    async def start(app):
+        app["limiter"] = Limiter(executor, pool_size, max_pending)
+        app["export_limiter"] = Limiter(export_executor, max_exports, 2 * max_exports)
+        app["batcher"] = ReturnBatcher(pool, app["limiter"], batch_window_ms / 1000)
+
+    async def stop(app):
+        # shutdown(wait=True) blocks until running statements finish, so wait
+        # for it off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, executor.shutdown)
+        await loop.run_in_executor(None, export_executor.shutdown)
+        if read_pool is not pool:
+            read_pool.replica.closeall()
+        pool.closeall()
+
+    app = web.Application(middlewares=[backpressure])
+    app["pool"] = pool
+    app["read_pool"] = read_pool
+    app.on_startup.append(start)
+    app.on_cleanup.append(stop)
+    app.router.add_post("/checkout", checkout)
+    app.router.add_post("/return", return_books)
+    app.router.add_get("/members", members)
+    app.router.add_get("/export/{name}", export_report)
+    app.router.add_get("/health", health)
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the circulation API for kiosks and scanner stations.")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--pool-size", type=int, default=20, help="database connections (and concurrent statements)")
+    parser.add_argument("--max-pending", type=int, default=500,
+                        help="requests running or queued before answering 503")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0,
+                        help="how long a return waits for others to share its statement (0 disables batching)")
+    parser.add_argument("--max-exports", type=int, default=2,
+                        help="concurrent exports, on their own threads and connections (twice as many may queue)")
+    parser.add_argument("--replica-dsn", help="libpq connection string of a streaming replica for member lookups "
+                                              "and exports (default: everything on --dsn)")
+    parser.add_argument("--max-replica-lag", type=float, default=10.0,
+                        help="seconds the replica may lag before reads fall back to the primary")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(create_app(args.dsn, args.pool_size, args.max_pending, args.batch_window_ms,
+                           args.replica_dsn, args.max_replica_lag, args.max_exports),
+                host=args.host, port=args.port)
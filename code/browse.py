@@ -0,0 +1,107 @@
+"""Paged table browsing for the All Books / All Members admin pages.
+
+Filtering, sorting and paging are all pushed down to SQL: each page is one
+keyset query returning at most ``page_size`` rows, so memory per admin session
+stays bounded no matter how large the table is. Column names only ever come
+from BROWSE_TABLES, never from user input.
+"""
+import pandas as pd
+
+from search import escape_like
+
+# table -> unique key column, columns in display order, text columns (filtered
+# with a case-insensitive "contains" match) and NOT NULL columns
+BROWSE_TABLES = {
+    "Book": {
+        "key": "isbn",
+        "columns": ["isbn", "title", "author", "condition", "purchase_date",
+                    "lib_card_id", "checkout_date", "due_date", "checkout_status"],
+        "text": {"isbn", "title", "author", "condition", "checkout_status"},
+        "not_null": {"isbn", "title"},
+    },
+    "Library_Card": {
+        "key": "card_id",
+        "columns": ["card_id", "name", "dob", "card_type", "status"],
+        "text": {"name", "card_type", "status"},
+        "not_null": {"card_id", "name"},
+    },
+}
+
+
+def build_query(table, filters, sort_column, descending, limit, after=None):
+    """Return (sql, params) for one page of ``table``.
+
+    ``filters`` maps column names to the value typed by the user; text columns
+    match anywhere in the value, other columns must match exactly. ``after``
+    is the cursor from cursor_after() for the previous page. Rows are ordered
+    by the sort column and then the table's key, ascending or descending, with
+    NULLs last when ascending and first when descending (Postgres' default).
+    """
+    spec = BROWSE_TABLES[table]
+    key = spec["key"]
+    if sort_column not in spec["columns"]:
+        raise ValueError(f"Unknown column {sort_column!r} for {table}")
+
+    conditions = []
+    params = {"limit": limit}
+    for i, (column, value) in enumerate(sorted(filters.items())):
+        if column not in spec["columns"]:
+            raise ValueError(f"Unknown column {column!r} for {table}")
+        if column in spec["text"]:
+            conditions.append(f"{column} ILIKE %(filter_{i})s")
+            params[f"filter_{i}"] = f"%{escape_like(value)}%"
+        else:
+            conditions.append(f"{column} = %(filter_{i})s")
+            params[f"filter_{i}"] = value
+
+    if after is not None:
+        conditions.append(_keyset_condition(sort_column, key, descending,
+                                            sort_column in spec["not_null"], after, params))
+
+    direction = "DESC" if descending else "ASC"
+    order = f"{key} {direction}" if sort_column == key else f"{sort_column} {direction}, {key} {direction}"
+    where = f"WHERE {' AND '.join(f'({c})' for c in conditions)}" if conditions else ""
+    sql = f"""
+        SELECT {', '.join(spec['columns'])}
+        FROM {table}
+        {where}
+        ORDER BY {order}
+        LIMIT %(limit)s
+    """
+    return sql, params
+
+
+def _keyset_condition(sort_column, key, descending, not_null, after, params):
+    value, last_key = after
+    params.update(after_value=value, after_key=last_key)
+    if sort_column == key:
+        return f"{key} {'<' if descending else '>'} %(after_key)s"
+
+    op = "<" if descending else ">"
+    if not_null:
+        return f"({sort_column}, {key}) {op} (%(after_value)s, %(after_key)s)"
+    if descending:
+        # NULLs come first: finish the NULL run, then every non-NULL row
+        if value is None:
+            return f"({sort_column} IS NULL AND {key} < %(after_key)s) OR {sort_column} IS NOT NULL"
+        return f"({sort_column}, {key}) < (%(after_value)s, %(after_key)s)"
+    # NULLs come last: rows after the cursor, then the NULL run
+    if value is None:
+        return f"{sort_column} IS NULL AND {key} > %(after_key)s"
+    return f"({sort_column}, {key}) > (%(after_value)s, %(after_key)s) OR {sort_column} IS NULL"
+
+
+def _plain(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    # numpy scalars -> Python scalars so psycopg2 can adapt them
+    return value.item() if hasattr(value, "item") else value
+
+
+def cursor_after(table, page, sort_column):
+    """Keyset cursor pointing just past the last row of a page DataFrame."""
+    last = page.iloc[-1]
+    return (_plain(last[sort_column]), _plain(last[BROWSE_TABLES[table]["key"]]))
+
+
+ESTIMATED_ROWS = "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = %s::regclass"
@@ -0,0 +1,204 @@
+"""Circulation service: checkout, return and member lookup.
+
+This is the one place circulation logic lives; the Streamlit pages
+(project.py) and the kiosk HTTP API (api.py) both call these functions with
+a db.ConnectionPool and render the plain dicts they return.
+
+Checkout and return each validate and write in a single conditional
+statement, so there is no window between "is the book available?" and the
+UPDATE in which another clerk or kiosk can check out the same copy. The same
+statements append to and close out the Loan history table
+(migrations/004_loans.sql). Both run as prepared statements on pooled
+connections (db.hot_query()).
+"""
+import db
+import queries
+from import_catalog import normalize_isbn
+
+LOAN_DAYS = 14
+
+# Outcomes reported per ISBN by checkout_books()
+CHECKED_OUT = "checked_out"
+NOT_FOUND = "not_found"
+UNAVAILABLE = "unavailable"
+CARD_NOT_FOUND = "card_not_found"
+CARD_INACTIVE = "card_inactive"
+
+CHECKOUT_SQL = db.hot_query("checkout", """
+    WITH card AS (
+        SELECT card_id, name, status
+        FROM Library_Card
+        WHERE card_id = %(card_id)s
+    ), book AS (
+        SELECT isbn, title
+        FROM Book
+        WHERE isbn = ANY(%(isbns)s)
+    ), updated AS (
+        UPDATE Book b
+        SET lib_card_id = card.card_id,
+            checkout_date = CURRENT_DATE,
+            due_date = CURRENT_DATE + %(loan_days)s::integer,
+            checkout_status = 'Checked Out'
+        FROM card
+        WHERE b.isbn = ANY(%(isbns)s)
+          AND b.checkout_status = 'Available'
+          AND card.status = 'Active'
+        RETURNING b.isbn, b.lib_card_id, b.checkout_date, b.due_date
+    ), loan AS (
+        INSERT INTO Loan (isbn, card_id, checkout_date, due_date)
+        SELECT isbn, lib_card_id, checkout_date, due_date FROM updated
+    )
+    SELECT req.isbn, book.title, card.name AS borrower, card.status AS card_status,
+           updated.due_date,
+           CASE WHEN updated.isbn IS NOT NULL THEN 'checked_out'
+                WHEN book.isbn IS NULL THEN 'not_found'
+                WHEN card.card_id IS NULL THEN 'card_not_found'
+                WHEN card.status IS DISTINCT FROM 'Active' THEN 'card_inactive'
+                ELSE 'unavailable'
+           END AS outcome
+    FROM unnest(%(isbns)s::varchar[]) WITH ORDINALITY AS req(isbn, pos)
+    LEFT JOIN book ON book.isbn = req.isbn
+    LEFT JOIN card ON TRUE
+    LEFT JOIN updated ON updated.isbn = req.isbn
+    ORDER BY req.pos
+""")
+
+
+# Outcomes reported per ISBN by return_books()
+RETURNED = "returned"
+ALREADY_AVAILABLE = "already_available"
+
+RETURN_SQL = db.hot_query("return", """
+    WITH found AS (
+        SELECT isbn, title
+        FROM Book
+        WHERE isbn = ANY(%(isbns)s)
+    ), returned AS (
+        UPDATE Book b
+        SET lib_card_id = NULL, checkout_date = NULL, due_date = NULL, checkout_status = 'Available'
+        FROM (
+            SELECT isbn, lib_card_id, due_date
+            FROM Book
+            WHERE isbn = ANY(%(isbns)s)
+              AND checkout_status IS DISTINCT FROM 'Available'
+            FOR UPDATE
+        ) prev
+        WHERE b.isbn = prev.isbn
+        RETURNING b.isbn, prev.lib_card_id, prev.due_date
+    ), closed AS (
+        UPDATE Loan l
+        SET returned_date = CURRENT_DATE
+        FROM returned
+        WHERE l.isbn = returned.isbn AND l.returned_date IS NULL
+    )
+    SELECT req.isbn, found.title, returned.lib_card_id AS card_id, returned.due_date,
+           GREATEST(CURRENT_DATE - returned.due_date, 0) AS days_overdue,
+           CASE WHEN returned.isbn IS NOT NULL THEN 'returned'
+                WHEN found.isbn IS NULL THEN 'not_found'
+                ELSE 'already_available'
+           END AS outcome
+    FROM unnest(%(isbns)s::varchar[]) WITH ORDINALITY AS req(isbn, pos)
+    LEFT JOIN found ON found.isbn = req.isbn
+    LEFT JOIN returned ON returned.isbn = req.isbn
+    ORDER BY req.pos
+""")
+
+
+def _rows_as_dicts(cur):
+    columns = [desc[0] for desc in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def unique_isbns(isbns):
+    """Drop blanks and repeated scans while keeping scan order.
+
+    Book stores the 13-digit form of every ISBN
+    (migrations/008_normalize_isbns.sql), so ISBNs are normalized the way the
+    catalog import does it: a hyphenated ISBN typed by hand or a scanned
+    ISBN-10 matches too. Input that is not a valid ISBN is passed on with
+    hyphens and spaces removed and reports as not found.
+    """
+    seen = set()
+    result = []
+    for isbn in isbns:
+        isbn = isbn.strip()
+        isbn = normalize_isbn(isbn) or isbn.replace("-", "").replace(" ", "").upper()
+        if isbn and isbn not in seen:
+            seen.add(isbn)
+            result.append(isbn)
+    return result
+
+
+def checkout_books(pool, card_id, isbns, loan_days=LOAN_DAYS):
+    """Check out one or more books to a card in one statement and transaction.
+
+    Only books that are Available are checked out, and only if the card is
+    Active; concurrent checkouts of the same copy cannot both succeed because
+    the UPDATE re-checks the status on the row it locks. Returns one dict per
+    ISBN (in scan order) with keys isbn, title, borrower, card_status,
+    due_date and outcome.
+    """
+    isbns = unique_isbns(isbns)
+    if not isbns:
+        return []
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(CHECKOUT_SQL, {'card_id': card_id, 'isbns': isbns, 'loan_days': loan_days})
+            results = _rows_as_dicts(cur)
+        conn.commit()
+    return results
+
+
+def return_books(pool, isbns):
+    """Return any number of books in one set-based statement.
+
+    Returns one dict per ISBN (in scan order) with keys isbn, title, card_id,
+    due_date, days_overdue and outcome (returned, already_available or
+    not_found). days_overdue is only set for books that were returned.
+    """
+    isbns = unique_isbns(isbns)
+    if not isbns:
+        return []
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(RETURN_SQL, {'isbns': isbns})
+            results = _rows_as_dicts(cur)
+        conn.commit()
+    return results
+
+
+def lookup_members(pool, member_search, after=0, limit=10):
+    """One page of members matching a card ID (if numeric) or part of a name.
+
+    Returns (members, has_next): up to ``limit`` dicts ordered by card_id,
+    with keys card_id, name, dob, card_type, status, sessions_used, checkouts
+    (list of {title, due_date}) and fines (list of {amount, status}). Pass
+    the last card_id as ``after`` for the next page.
+    """
+    members = db.records(pool, *queries.member_lookup(member_search, after, limit + 1))
+    return members[:limit], len(members) > limit
+
+
+def parse_isbn_list(text):
+    """ISBNs from pasted scanner output or an uploaded TXT/CSV file.
+
+    Takes the first field of each line, so a CSV export with the ISBN in the
+    first column works as-is; fields without a digit (a header row such as
+    "ISBN,Title") are skipped.
+    """
+    fields = (line.split(",")[0].strip().strip('"') for line in text.splitlines())
+    return unique_isbns(field for field in fields if any(ch.isdigit() for ch in field))
+
+
+def describe_checkout(result):
+    """Human-readable message for one checkout_books() result."""
+    outcome = result['outcome']
+    if outcome == CHECKED_OUT:
+        return f"Checked out '{result['title']}' to {result['borrower']} (due {result['due_date']})."
+    if outcome == NOT_FOUND:
+        return f"Book {result['isbn']} not found."
+    if outcome == CARD_NOT_FOUND:
+        return "Library Card not found."
+    if outcome == CARD_INACTIVE:
+        return f"Card for {result['borrower']} is not Active (Status: {result['card_status']})."
+    return f"'{result['title']}' is already checked out."
@@ -0,0 +1,178 @@
+"""Public computer sessions: start, end and live availability.
+
+Starting and ending a session are each one conditional statement on the
+Computer inventory (migrations/006_computers.sql), so two clerks cannot put
+patrons on the same machine and a card cannot hold two machines. Ending a
+session also adds it to the card's tally in Computers_Session. Triggers on
+Computer keep the Computer_Availability counter current and NOTIFY
+AVAILABILITY_CHANNEL at commit; AvailabilityFeed keeps the latest counts in
+memory from those notifications (via listener.Listener).
+"""
+import json
+import threading
+
+import psycopg2
+import psycopg2.errors
+
+import db
+
+AVAILABILITY_CHANNEL = "computer_availability"
+
+# Outcomes reported by start_session()
+STARTED = "started"
+CARD_NOT_FOUND = "card_not_found"
+CARD_INACTIVE = "card_inactive"
+ALREADY_IN_SESSION = "already_in_session"
+NONE_AVAILABLE = "none_available"
+
+# Takes the requested machine, or the lowest-numbered free one; SKIP LOCKED
+# lets concurrent starts claim different machines instead of queueing on one
+START_SESSION_SQL = db.hot_query("start_session", """
+    WITH card AS (
+        SELECT card_id, name, status
+        FROM Library_Card
+        WHERE card_id = %(card_id)s
+    ), busy AS (
+        SELECT computer_id, name
+        FROM Computer
+        WHERE card_id = %(card_id)s
+    ), free AS (
+        SELECT computer_id
+        FROM Computer
+        WHERE status = 'Available'
+          AND (%(computer_id)s::integer IS NULL OR computer_id = %(computer_id)s::integer)
+          AND EXISTS (SELECT 1 FROM card WHERE status = 'Active')
+          AND NOT EXISTS (SELECT 1 FROM busy)
+        ORDER BY computer_id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ), started AS (
+        UPDATE Computer c
+        SET status = 'In Use', card_id = %(card_id)s, session_started = now()
+        FROM free
+        WHERE c.computer_id = free.computer_id AND c.status = 'Available'
+        RETURNING c.computer_id, c.name, c.session_started
+    )
+    SELECT COALESCE(started.computer_id, (SELECT computer_id FROM busy)) AS computer_id,
+           COALESCE(started.name, (SELECT name FROM busy)) AS computer,
+           started.session_started, card.name AS borrower, card.status AS card_status,
+           CASE WHEN started.computer_id IS NOT NULL THEN 'started'
+                WHEN card.card_id IS NULL THEN 'card_not_found'
+                WHEN card.status IS DISTINCT FROM 'Active' THEN 'card_inactive'
+                WHEN EXISTS (SELECT 1 FROM busy) THEN 'already_in_session'
+                ELSE 'none_available'
+           END AS outcome
+    FROM (SELECT 1) one
+    LEFT JOIN card ON TRUE
+    LEFT JOIN started ON TRUE
+""")
+
+END_SESSION_SQL = db.hot_query("end_session", """
+    WITH ended AS (
+        UPDATE Computer c
+        SET status = 'Available', card_id = NULL, session_started = NULL
+        FROM (
+            SELECT computer_id, card_id, session_started
+            FROM Computer
+            WHERE status = 'In Use'
+              AND (card_id = %(card_id)s::integer OR computer_id = %(computer_id)s::integer)
+            FOR UPDATE
+        ) prev
+        WHERE c.computer_id = prev.computer_id
+        RETURNING c.computer_id, c.name, prev.card_id, prev.session_started
+    ), tally AS (
+        INSERT INTO Computers_Session AS cs (card_id, num_of_sessions)
+        SELECT card_id, 1 FROM ended
+        ORDER BY card_id
+        ON CONFLICT (card_id) DO UPDATE SET num_of_sessions = COALESCE(cs.num_of_sessions, 0) + 1
+    )
+    SELECT computer_id, name AS computer, card_id, session_started,
+           now() - session_started AS duration
+    FROM ended
+    ORDER BY computer_id
+""")
+
+AVAILABILITY = db.hot_query("computer_availability", """
+    SELECT total, available, in_use, updated_at FROM Computer_Availability
+""")
+
+COMPUTERS = """
+    SELECT c.computer_id, c.name, c.location, c.status, c.card_id, lc.name AS borrower, c.session_started
+    FROM Computer c
+    LEFT JOIN Library_Card lc ON lc.card_id = c.card_id
+    ORDER BY c.computer_id
+"""
+
+
+def start_session(pool, card_id, computer_id=None):
+    """Put a card on a computer (the given one, or any free one).
+
+    Returns a dict with keys computer_id, computer, session_started,
+    borrower, card_status and outcome (started, card_not_found,
+    card_inactive, already_in_session or none_available). For
+    already_in_session, computer names the machine the card is on.
+    """
+    try:
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(START_SESSION_SQL, {'card_id': card_id, 'computer_id': computer_id})
+                columns = [desc[0] for desc in cur.description]
+                result = dict(zip(columns, cur.fetchone()))
+            conn.commit()
+    except psycopg2.errors.UniqueViolation:
+        # A concurrent start for the same card won the race (computer_card_uidx)
+        return {'computer_id': None, 'computer': None, 'session_started': None, 'borrower': None,
+                'card_status': None, 'outcome': ALREADY_IN_SESSION}
+    return result
+
+
+def end_session(pool, card_id=None, computer_id=None):
+    """End the session of a card or on a computer; returns the ended sessions.
+
+    Each ended session is a dict with keys computer_id, computer, card_id,
+    session_started and duration; an empty list means nothing was in use.
+    """
+    if card_id is None and computer_id is None:
+        raise ValueError("card_id or computer_id is required")
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(END_SESSION_SQL, {'card_id': card_id, 'computer_id': computer_id})
+            columns = [desc[0] for desc in cur.description]
+            results = [dict(zip(columns, row)) for row in cur.fetchall()]
+        conn.commit()
+    return results
+
+
+def availability(pool):
+    """Current counts (total, available, in_use, updated_at): one row, O(1)."""
+    return db.row(pool, AVAILABILITY) or {'total': 0, 'available': 0, 'in_use': 0, 'updated_at': None}
+
+
+def computers(pool):
+    """Every computer with its current session, as a DataFrame."""
+    return db.dataframe(pool, COMPUTERS)
+
+
+class AvailabilityFeed:
+    """Latest computer availability, pushed by NOTIFY instead of polled.
+
+    Subscribe update() to AVAILABILITY_CHANNEL on a listener.Listener;
+    ``version`` increases with every change so readers can tell whether
+    anything moved since they last looked.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self.version = 0
+        self._counts = availability(pool)
+
+    def update(self, channel, payload):
+        counts = json.loads(payload) if payload is not None else availability(self.pool)
+        with self._lock:
+            self._counts = counts
+            self.version += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts), self.version
@@ -0,0 +1,706 @@
+"""Database access layer for the library app.
+
+Every Streamlit session (and every headless script) borrows a connection from
+a shared ConnectionPool for the duration of one query or transaction and hands
+it back afterwards, so concurrent clerks no longer queue behind a single
+connection and a failed statement only ever affects the caller that issued it.
+
+Queries go through query() (or the scalar/row/rows/records/dataframe/columns/
+execute shortcuts), which returns exactly the result shape the caller asks for.
+Reads run in autocommit mode, so they cost a single round trip with no
+BEGIN/ROLLBACK, and only DataFrame/columnar results touch pandas or numpy.
+A ReadRouter spreads reads onto a streaming replica, falling back to the
+primary whenever the replica is unreachable, lagging or behind a write.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import psycopg2.errors
+from psycopg2 import extensions
+
+import instrumentation
+
+# Keys from the [postgres] secrets section that are passed to psycopg2.connect
+CONNECT_KEYS = ("host", "port", "dbname", "user", "password")
+
+# Errors that mean the connection itself is unusable (server restart, network
+# drop, idle timeout) rather than a problem with the statement.
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+# Hot statements run as server-side prepared statements on pooled
+# connections, so Postgres parses and plans them once per connection instead
+# of on every call. Registered by the modules that own the SQL (see
+# hot_query()); anything else is sent as plain text.
+HotQuery = namedtuple("HotQuery", "name body params")
+
+_hot_queries = {}
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+def hot_query(name, sql):
+    """Register ``sql`` (psycopg2 placeholders) as a prepared statement; returns ``sql``.
+
+    Parameters must have types Postgres can infer from their context, so add
+    casts such as ``%(days)s::integer`` where an operator is ambiguous.
+    """
+    params = []
+    positional = 0
+
+    def to_dollar(match):
+        nonlocal positional
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(1) is None:
+            positional += 1
+            params.append(positional - 1)
+            return f"${len(params)}"
+        if match.group(1) not in params:
+            params.append(match.group(1))
+        return f"${params.index(match.group(1)) + 1}"
+
+    body = _PLACEHOLDER.sub(to_dollar, sql)
+    _hot_queries[sql] = HotQuery(f"hot_{name}", body, tuple(params))
+    return sql
+
+
+class StatementCache:
+    """LRU of the hot statements prepared on one connection."""
+
+    def __init__(self, size, count):
+        self.size = size
+        self._count = count        # pool callback for hit/miss/eviction counters
+        self._prepared = OrderedDict()
+
+    def statement_name(self, cur, hot):
+        """Name of ``hot``'s prepared statement on ``cur``'s connection, preparing it if needed."""
+        if hot.name in self._prepared:
+            self._prepared.move_to_end(hot.name)
+            self._count("prepared_hits")
+            return hot.name
+        self._count("prepared_misses")
+        if len(self._prepared) >= self.size:
+            evicted, _ = self._prepared.popitem(last=False)
+            extensions.cursor.execute(cur, f"DEALLOCATE {evicted}")
+            self._count("prepared_evictions")
+        extensions.cursor.execute(cur, f"PREPARE {hot.name} AS {hot.body}")
+        self._prepared[hot.name] = True
+        return hot.name
+
+    def clear(self):
+        self._prepared.clear()
+
+
+class PooledConnection(extensions.connection):
+    """Connection that carries its own StatementCache."""
+
+    statement_cache = None
+
+
+class PreparingCursor(extensions.cursor):
+    """Cursor that runs registered hot queries through EXECUTE of a prepared statement.
+
+    If the server no longer knows a statement (e.g. after DISCARD ALL), the
+    connection's cache is cleared; in autocommit mode the statement is then
+    prepared again and retried, otherwise the error is raised.
+    """
+
+    def execute(self, query, vars=None):
+        hot = _hot_queries.get(query)
+        cache = getattr(self.connection, "statement_cache", None)
+        if hot is None or cache is None:
+            return super().execute(query, vars)
+        for attempt in range(2):
+            name = cache.statement_name(self, hot)
+            if hot.params:
+                values = [vars[param] for param in hot.params]
+                statement = f"EXECUTE {name}({', '.join(['%s'] * len(values))})"
+            else:
+                values, statement = None, f"EXECUTE {name}"
+            try:
+                return super().execute(statement, values)
+            except psycopg2.errors.InvalidSqlStatementName:
+                cache.clear()
+                if attempt or not self.connection.autocommit:
+                    raise
+
+
+def connect_kwargs(config):
+    """Pick the psycopg2.connect() arguments out of a secrets/config mapping."""
+    return {key: config[key] for key in CONNECT_KEYS if key in config}
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Connections are created lazily up to ``maxconn``; callers beyond that wait
+    (up to ``timeout`` seconds) for one to be returned. A connection that has
+    been idle for more than ``check_after`` seconds is pinged before it is
+    handed out and transparently replaced if the server has gone away. With
+    a ``recorder`` (instrumentation.QueryRecorder), every statement run on the
+    pool's connections is measured. Hot queries (hot_query()) are prepared on
+    each connection on first use and kept in an LRU of up to
+    ``prepared_cache_size`` statements; a replacement connection simply
+    prepares them again.
+    """
+
+    def __init__(self, connect_kwargs, minconn=1, maxconn=10, timeout=30.0, check_after=30.0,
+                 recorder=None, prepared_cache_size=32):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("pool size must satisfy 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self._connect_kwargs = dict(connect_kwargs)
+        self._connect_kwargs["connection_factory"] = PooledConnection
+        self._connect_kwargs["cursor_factory"] = PreparingCursor
+        self.recorder = recorder
+        if recorder is not None:
+            self._connect_kwargs["cursor_factory"] = instrumentation.instrumented_cursor(recorder, PreparingCursor)
+        self.prepared_cache_size = prepared_cache_size
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_after = check_after
+
+        self._cond = threading.Condition()
+        self._idle = []          # (connection, last_returned) pairs, most recent last
+        self._size = 0           # connections open or being opened
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "max_wait": 0.0,
+            "timeouts": 0,
+            "reconnects": 0,
+            "discarded": 0,
+            "prepared_hits": 0,
+            "prepared_misses": 0,
+            "prepared_evictions": 0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        conn.statement_cache = StatementCache(self.prepared_cache_size, self._count)
+        return conn
+
+    def _count(self, stat):
+        with self._cond:
+            self._stats[stat] += 1
+
+    def _is_alive(self, conn, last_returned):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_returned < self.check_after:
+            return True
+        try:
+            # Plain cursor: liveness pings are not instrumented
+            with conn.cursor(cursor_factory=extensions.cursor) as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def getconn(self, timeout=None):
+        """Check a connection out of the pool, waiting if all are in use."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed.")
+                if self._idle:
+                    conn, last_returned = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn, last_returned = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {timeout:.1f}s.")
+                waited = True
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            if waited:
+                wait_time = time.monotonic() - start
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += wait_time
+                self._stats["max_wait"] = max(self._stats["max_wait"], wait_time)
+
+        # Connecting and pinging happen outside the lock so a slow server does
+        # not block other sessions from returning connections.
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._is_alive(conn, last_returned):
+                self._close_quietly(conn)
+                conn = self._connect()
+                with self._cond:
+                    self._stats["reconnects"] += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if not discard:
+            if conn.closed:
+                discard = True
+            else:
+                try:
+                    status = conn.get_transaction_status()
+                    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                        discard = True
+                    elif status != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Borrow a connection for the duration of a ``with`` block.
+
+        The caller is responsible for committing; anything left uncommitted is
+        rolled back when the connection is returned. Connections that fail with
+        a connection-level error are thrown away instead of being reused.
+        """
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        """Snapshot of pool usage for monitoring."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._in_use,
+                waiting=self._waiting,
+                minconn=self.minconn,
+                maxconn=self.maxconn,
+            )
+        stats["avg_wait"] = stats["wait_time"] / stats["waits"] if stats["waits"] else 0.0
+        lookups = stats["prepared_hits"] + stats["prepared_misses"]
+        stats["prepared_hit_rate"] = stats["prepared_hits"] / lookups if lookups else 0.0
+        return stats
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+# Where a streaming replica stands. While it has replayed everything it has
+# received, it is as current as replication allows (the replay timestamp
+# would only show how long the primary has been idle).
+REPLICA_STATE_SQL = """
+    SELECT pg_is_in_recovery() AS in_recovery,
+           pg_last_wal_replay_lsn() - '0/0'::pg_lsn AS replayed_lsn,
+           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END AS lag_seconds
+"""
+
+PRIMARY_LSN_SQL = "SELECT pg_current_wal_lsn() - '0/0'::pg_lsn"
+
+# Statements a hot standby cancels when replay needs the rows they are reading
+# ("conflict with recovery"); they are simply run again on the primary
+RECOVERY_CONFLICTS = (psycopg2.errors.SerializationFailure,)
+
+
+class ReadRouter:
+    """Sends reads to a streaming replica while it is usable, otherwise to the primary.
+
+    Use it in place of a ConnectionPool for read-only work; writes belong on
+    ``primary``. The replica is used while it is reachable, still in recovery
+    and at most ``max_lag`` seconds behind, and only once it has replayed
+    every write announced with mark_write(), so a page that reads right
+    after writing sees its own change. Replica state is re-checked every
+    ``check_every`` seconds, and every ``recheck_after`` seconds while
+    announced writes are still being replayed. A replica that cannot be
+    reached is skipped until the next check.
+    """
+
+    def __init__(self, primary, replica, max_lag=10.0, check_every=5.0, recheck_after=0.2):
+        self.primary = primary
+        self.replica = replica
+        self.recorder = primary.recorder
+        self.max_lag = max_lag
+        self.check_every = check_every
+        self.recheck_after = recheck_after
+
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._checked_at = float("-inf")
+        self._healthy = False
+        self._state = {"in_recovery": None, "replayed_lsn": 0, "lag_seconds": None, "error": None}
+        self._writes = 0           # writes announced with mark_write()
+        self._writes_seen = 0      # ... of which required_lsn accounts for
+        self._required_lsn = 0
+        self._stats = {
+            "replica_reads": 0,
+            "primary_reads": 0,
+            "replica_failures": 0,
+            "recovery_conflicts": 0,
+            "checks": 0,
+        }
+
+    def mark_write(self):
+        """Keep reads on the primary until the replica has replayed writes committed so far.
+
+        Call it after committing, or on hearing that another process has. The
+        primary's WAL position is only looked up by the next read, so a burst
+        of writes costs one lookup.
+        """
+        with self._lock:
+            self._writes += 1
+
+    def _catch_up_writes(self):
+        if self._writes_seen == self._writes:
+            return
+        with self._write_lock:
+            writes = self._writes
+            if self._writes_seen == writes:
+                return
+            # Read after the writes committed, so at or past their commit records
+            lsn = int(query(self.primary, PRIMARY_LSN_SQL, shape=SCALAR))
+            with self._lock:
+                self._required_lsn = max(self._required_lsn, lsn)
+                self._writes_seen = writes
+
+    def _check_replica(self):
+        try:
+            state = query(self.replica, REPLICA_STATE_SQL, shape=ROW)
+        except CONNECTION_ERRORS + (PoolTimeout,) as e:
+            self.replica_failed(e)
+            return
+        state = {"in_recovery": state["in_recovery"],
+                 "replayed_lsn": int(state["replayed_lsn"] or 0),
+                 "lag_seconds": float(state["lag_seconds"] or 0),
+                 "error": None}
+        if not state["in_recovery"]:
+            # Promoted, or pointed at a primary: it no longer follows our writes
+            state["error"] = "not in recovery"
+        with self._lock:
+            self._state = state
+            self._healthy = state["error"] is None and state["lag_seconds"] <= self.max_lag
+            self._checked_at = time.monotonic()
+            self._stats["checks"] += 1
+
+    def replica_failed(self, error):
+        """Route reads to the primary until the next replica check."""
+        with self._lock:
+            self._healthy = False
+            self._state = dict(self._state, error=str(error).strip() or type(error).__name__)
+            self._checked_at = time.monotonic()
+            self._stats["replica_failures"] += 1
+
+    def choose(self):
+        """The pool the next read should run on."""
+        self._catch_up_writes()
+        since_check = time.monotonic() - self._checked_at
+        behind = self._state["replayed_lsn"] < self._required_lsn
+        if (since_check >= self.check_every or (behind and self._healthy and since_check >= self.recheck_after)) \
+                and self._check_lock.acquire(blocking=False):
+            # One session checks; the others route on the state they already have
+            try:
+                self._check_replica()
+            finally:
+                self._check_lock.release()
+        with self._lock:
+            if self._healthy and self._state["replayed_lsn"] >= self._required_lsn:
+                self._stats["replica_reads"] += 1
+                return self.replica
+            self._stats["primary_reads"] += 1
+            return self.primary
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Borrow a connection for reading, from the replica if it is usable.
+
+        If no replica connection can be had, the primary lends one instead.
+        """
+        target = self.choose()
+        if target is self.replica:
+            try:
+                conn = self.replica.getconn(timeout)
+            except CONNECTION_ERRORS as e:
+                self.replica_failed(e)
+                target = self.primary
+            except PoolTimeout:
+                target = self.primary
+        if target is self.primary:
+            conn = self.primary.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except CONNECTION_ERRORS as e:
+            discard = True
+            if target is self.replica:
+                self.replica_failed(e)
+            raise
+        finally:
+            target.putconn(conn, discard=discard)
+
+    def stats(self):
+        """Routing counters and the replica's last known state."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(self._state)
+            stats.update(
+                replica_healthy=self._healthy,
+                required_lsn=self._required_lsn,
+                max_lag=self.max_lag,
+                last_check_age=time.monotonic() - self._checked_at,
+            )
+        reads = stats["replica_reads"] + stats["primary_reads"]
+        stats["replica_share"] = stats["replica_reads"] / reads if reads else 0.0
+        return stats
+
+    def closeall(self):
+        self.replica.closeall()
+        self.primary.closeall()
+
+
+# Result shapes accepted by query()
+SCALAR = "scalar"        # first column of the first row (or None)
+ROW = "row"              # first row as a {column: value} dict (or None)
+ROWS = "rows"            # list of tuples
+RECORDS = "records"      # list of {column: value} dicts
+DATAFRAME = "dataframe"  # pandas DataFrame built column by column
+COLUMNS = "columns"      # {column: numpy array}
+
+# Default numpy dtypes by Postgres type OID; anything else (text, dates, json,
+# and numeric, which stays exact as Decimal for money) is an object array
+# unless the caller asks for a dtype via ``types``, e.g.
+# {"due_date": "datetime64[D]", "avg_sessions": "float64"}
+INT_TYPES = {20, 21, 23}            # int8, int2, int4
+FLOAT_TYPES = {700, 701}            # float4, float8
+BOOL_TYPE = 16
+
+FETCH_CHUNK = 10_000
+
+
+def _default_dtype(type_code):
+    if type_code in INT_TYPES:
+        return "int64"
+    if type_code in FLOAT_TYPES:
+        return "float64"
+    if type_code == BOOL_TYPE:
+        return "bool"
+    return None
+
+
+def _column_array(values, dtype):
+    """Convert one column's values to a typed numpy array.
+
+    Columns containing NULLs become a pandas nullable Int64 array (integers),
+    or fall back to NaN (floats), NaT (dates) or an object array (booleans)
+    rather than failing.
+    """
+    if dtype is None:
+        return np.fromiter(values, dtype=object, count=len(values))
+    has_null = any(v is None for v in values)
+    if has_null:
+        if dtype == "int64":
+            return pd.array(values, dtype="Int64")
+        if dtype == "float64":
+            return np.array([np.nan if v is None else float(v) for v in values], dtype="float64")
+        if dtype == "bool":
+            return np.fromiter(values, dtype=object, count=len(values))
+        if dtype.startswith("datetime64"):
+            return np.array([np.datetime64("NaT") if v is None else v for v in values], dtype=dtype)
+    if dtype == "float64":
+        # numeric arrives as Decimal; converting up front avoids object columns
+        return np.fromiter((float(v) for v in values), dtype="float64", count=len(values))
+    return np.array(values, dtype=dtype)
+
+
+def _fetch_columns(cur, types):
+    """Fetch a result set straight into typed column arrays, chunk by chunk."""
+    names = [desc[0] for desc in cur.description]
+    dtypes = [
+        (types or {}).get(name, _default_dtype(desc[1]))
+        for name, desc in zip(names, cur.description)
+    ]
+    chunks = [[] for _ in names]
+    while True:
+        batch = cur.fetchmany(FETCH_CHUNK)
+        if not batch:
+            break
+        for i, values in enumerate(zip(*batch)):
+            chunks[i].append(_column_array(list(values), dtypes[i]))
+    columns = {}
+    for name, dtype, parts in zip(names, dtypes, chunks):
+        if not parts:
+            columns[name] = np.array([], dtype=dtype or object)
+        elif len(parts) == 1:
+            columns[name] = parts[0]
+        elif any(not isinstance(part, np.ndarray) for part in parts):
+            # Some chunk had NULLs in an integer column
+            columns[name] = pd.array(np.concatenate([np.asarray(part, dtype=object) for part in parts]), dtype="Int64")
+        else:
+            columns[name] = np.concatenate(parts)
+    return columns
+
+
+def _shape_result(cur, shape, types):
+    if shape == SCALAR:
+        row = cur.fetchone()
+        return row[0] if row else None
+    if shape == ROW:
+        row = cur.fetchone()
+        return dict(zip([desc[0] for desc in cur.description], row)) if row else None
+    if shape == ROWS:
+        return cur.fetchall()
+    if shape == RECORDS:
+        names = [desc[0] for desc in cur.description]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+    if shape == COLUMNS:
+        return _fetch_columns(cur, types)
+    if shape == DATAFRAME:
+        return pd.DataFrame(_fetch_columns(cur, types), copy=False)
+    raise ValueError(f"Unknown result shape {shape!r}")
+
+
+def query(pool, sql, params=None, shape=DATAFRAME, types=None, write=False):
+    """Run one statement on a pooled connection and return the requested shape.
+
+    ``types`` optionally overrides the numpy dtype per column for DATAFRAME and
+    COLUMNS results. With ``write=True`` the statement runs in a transaction
+    that is committed before returning; statements without a result set
+    return the affected row count.
+
+    On a ReadRouter, writes run on the primary, and a read that the replica
+    fails (connection lost, or cancelled by a recovery conflict) is run
+    again on the primary.
+    """
+    if isinstance(pool, ReadRouter):
+        target = pool.primary if write else pool.choose()
+        if target is pool.replica:
+            try:
+                return query(target, sql, params, shape, types)
+            except CONNECTION_ERRORS as e:
+                pool.replica_failed(e)
+            except PoolTimeout:
+                pass
+            except RECOVERY_CONFLICTS:
+                pool._count("recovery_conflicts")
+        return query(pool.primary, sql, params, shape, types, write)
+    with pool.connection() as conn:
+        if not write:
+            conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                result = _shape_result(cur, shape, types) if cur.description else cur.rowcount
+            if write:
+                conn.commit()
+        finally:
+            if not write and not conn.closed:
+                conn.autocommit = False
+    return result
+
+
+def scalar(pool, sql, params=None):
+    return query(pool, sql, params, shape=SCALAR)
+
+
+def row(pool, sql, params=None):
+    return query(pool, sql, params, shape=ROW)
+
+
+def rows(pool, sql, params=None):
+    return query(pool, sql, params, shape=ROWS)
+
+
+def records(pool, sql, params=None):
+    return query(pool, sql, params, shape=RECORDS)
+
+
+def dataframe(pool, sql, params=None, types=None):
+    return query(pool, sql, params, shape=DATAFRAME, types=types)
+
+
+def columns(pool, sql, params=None, types=None):
+    return query(pool, sql, params, shape=COLUMNS, types=types)
+
+
+def execute(pool, sql, params=None):
+    """Run a write statement in its own transaction.
+
+    Returns the affected row count, or the rows (tuples) of a RETURNING clause.
+    """
+    return query(pool, sql, params, shape=ROWS, write=True)
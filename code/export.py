@@ -0,0 +1,222 @@
+"""Streaming CSV / Parquet export of the reports and admin tables.
+
+CSV is produced by Postgres itself with COPY (...) TO STDOUT and written to
+the target file as it arrives, so Python never builds a row, let alone a
+DataFrame. Parquet is read through a server-side (named) cursor CHUNK_ROWS
+rows at a time, and each chunk becomes one row group, so memory stays
+bounded by the chunk size however large the result. pyarrow is an optional
+dependency needed only for Parquet.
+
+The same functions serve the Streamlit export buttons, the kiosk API's
+GET /export/<name> (streamed straight into the HTTP response) and the CLI:
+
+    python3 code/export.py Book -o books.csv
+    python3 code/export.py Book --format parquet -o books.parquet
+    python3 code/export.py member_fines --option Outstanding -o fines.csv
+    python3 code/export.py --list
+"""
+import argparse
+import io
+import json
+import sys
+import time
+
+from psycopg2 import extensions
+
+import browse
+import db
+import queries
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = pq = None
+
+CSV = "csv"
+PARQUET = "parquet"
+FORMATS = {CSV: "text/csv", PARQUET: "application/vnd.apache.parquet"}
+
+# Rows per Parquet row group (and per server-side cursor fetch)
+CHUNK_ROWS = 50_000
+
+
+def table_export(table, filters=None, sort_column=None, descending=False):
+    """(sql, params) for a whole admin table, optionally filtered and sorted like the browser.
+
+    Without filters or a sort the rows come out in storage order, which spares
+    Postgres a sort of the whole table; the admin pages ask for that when the
+    browser shows the table unfiltered in its default order.
+    """
+    if not filters and sort_column is None:
+        return f"SELECT {', '.join(browse.BROWSE_TABLES[table]['columns'])} FROM {table}", None
+    sort_column = sort_column or browse.BROWSE_TABLES[table]["key"]
+    return browse.build_query(table, filters or {}, sort_column, descending, None)
+
+
+# name -> (option -> (sql, params)); the option is the report's filter, if any
+EXPORTS = {
+    "top_borrowers": lambda option: queries.top_borrowers(option or "Checked out now"),
+    "member_fines": lambda option: queries.member_fines(option or "All"),
+    "active_checkouts": lambda option: (queries.ACTIVE_CHECKOUTS, None),
+    "computer_usage": lambda option: (queries.COMPUTER_USAGE, None),
+    "overdue_books": lambda option: (queries.OVERDUE_BOOKS, None),
+    "Book": lambda option: table_export("Book"),
+    "Library_Card": lambda option: table_export("Library_Card"),
+}
+
+
+class ExportTooLarge(Exception):
+    """The export grew past the byte limit of its LimitedFile."""
+
+
+class LimitedFile(io.RawIOBase):
+    """Binary file that passes writes to ``raw`` until ``limit`` bytes, then raises ExportTooLarge.
+
+    For callers that have to hold the finished export (the Streamlit download
+    button), so an oversized one is cut off instead of filling memory.
+    """
+
+    def __init__(self, raw, limit):
+        super().__init__()
+        self.raw = raw
+        self.limit = limit
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.position + len(data) > self.limit:
+            raise ExportTooLarge(f"export is larger than {self.limit:,} bytes")
+        self.raw.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+
+def export_csv(pool, sql, params, out):
+    """Write the result of ``sql`` as CSV with a header row to ``out``; returns the row count."""
+    with pool.connection() as conn:
+        with conn.cursor(cursor_factory=extensions.cursor) as cur:
+            statement = cur.mogrify(sql, params).decode()
+            cur.copy_expert(f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+            return cur.rowcount
+
+
+def _plain(value):
+    return value
+
+
+def _as_float(value):
+    return None if value is None else float(value)
+
+
+def _as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _arrow_schema(description):
+    """Arrow fields (and a per-column value converter) from the cursor's Postgres types."""
+    fields, converters = [], []
+    for column in description:
+        oid = column.type_code
+        if oid == 16:
+            arrow_type, convert = pa.bool_(), _plain
+        elif oid in (20, 21, 23):
+            arrow_type, convert = pa.int64(), _plain
+        elif oid in (700, 701):
+            arrow_type, convert = pa.float64(), _plain
+        elif oid == 1700 and column.precision is not None and column.scale is not None:
+            arrow_type, convert = pa.decimal128(column.precision, column.scale), _plain
+        elif oid == 1700:
+            # Computed numerics (SUM, AVG) have no declared precision
+            arrow_type, convert = pa.float64(), _as_float
+        elif oid == 1082:
+            arrow_type, convert = pa.date32(), _plain
+        elif oid == 1114:
+            arrow_type, convert = pa.timestamp("us"), _plain
+        elif oid == 1184:
+            arrow_type, convert = pa.timestamp("us", tz="UTC"), _plain
+        else:
+            arrow_type, convert = pa.string(), _as_text
+        fields.append(pa.field(column.name, arrow_type))
+        converters.append(convert)
+    return pa.schema(fields), converters
+
+
+def _chunk_table(rows, schema, converters):
+    columns = []
+    for i, (field, convert) in enumerate(zip(schema, converters)):
+        values = [row[i] for row in rows] if convert is _plain else [convert(row[i]) for row in rows]
+        columns.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def export_parquet(pool, sql, params, out, chunk_rows=CHUNK_ROWS):
+    """Write the result of ``sql`` as Parquet to ``out``, one row group per chunk; returns the row count."""
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    rows = 0
+    with pool.connection() as conn:
+        # A named cursor keeps the result on the server; plain cursor class,
+        # since hot-query rewriting does not apply to DECLARE
+        with conn.cursor(name="export", cursor_factory=extensions.cursor) as cur:
+            cur.itersize = chunk_rows
+            cur.execute(sql, params)
+            chunk = cur.fetchmany(chunk_rows)
+            schema, converters = _arrow_schema(cur.description)
+            with pq.ParquetWriter(out, schema) as writer:
+                while chunk:
+                    writer.write_table(_chunk_table(chunk, schema, converters))
+                    rows += len(chunk)
+                    chunk = cur.fetchmany(chunk_rows)
+                if not rows:
+                    writer.write_table(schema.empty_table())
+    return rows
+
+
+def export(pool, sql, params, out, fmt=CSV):
+    """Stream ``sql`` into binary file ``out`` in the given format; returns the row count."""
+    if fmt == CSV:
+        return export_csv(pool, sql, params, out)
+    if fmt == PARQUET:
+        return export_parquet(pool, sql, params, out)
+    raise ValueError(f"Unknown export format {fmt!r}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export a report or table as CSV or Parquet.")
+    parser.add_argument("name", nargs="?", help="report or table to export (see --list)")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--format", choices=list(FORMATS), default=CSV)
+    parser.add_argument("--option", help="report filter, e.g. 'Last 30 days' or 'Outstanding'")
+    parser.add_argument("-o", "--output", help="output file (default: standard output)")
+    parser.add_argument("--list", action="store_true", help="list what can be exported")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.list or not args.name:
+        print("\n".join(EXPORTS))
+        sys.exit(0 if args.list else 2)
+    if args.name not in EXPORTS:
+        sys.exit(f"Unknown export {args.name!r}; one of: {', '.join(EXPORTS)}")
+    pool = db.ConnectionPool({"dsn": args.dsn}, minconn=1, maxconn=1)
+    started = time.monotonic()
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        rows = export(pool, *EXPORTS[args.name](args.option), out, args.format)
+    finally:
+        if args.output:
+            out.close()
+        pool.closeall()
+    elapsed = time.monotonic() - started
+    print(f"Exported {rows:,} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
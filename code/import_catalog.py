@@ -0,0 +1,304 @@
+"""Import a vendor catalog file (CSV or JSON lines) into Book.
+
+The file is read one record at a time and each record is validated as it
+streams past: the ISBN is normalized to 13 digits (hyphens and spaces
+dropped, ISBN-10 converted) and its check digit verified, the title is
+required, and lengths and the purchase date must fit the Book columns.
+Valid records are fed straight into COPY into a temporary staging table,
+so files larger than memory are fine; rejected records are counted by
+reason and can be written to a rejects file.
+
+The staging table is then merged into Book with one set-based upsert, in
+ISBN order: new ISBNs are inserted as Available, and existing books only get
+their catalog fields (title, author, condition, purchase date) updated.
+Circulation fields (borrower, dates, checkout status) are never touched, and
+rows whose catalog fields did not change are not rewritten. If an ISBN
+appears more than once in the file, its last record wins.
+Book stores ISBNs in the same 13-digit form (migrations/008_normalize_isbns.sql),
+so existing books are matched whatever form the file uses.
+
+Usage:
+    python3 code/import_catalog.py vendor-2026-10.csv
+    python3 code/import_catalog.py vendor.jsonl --dsn "dbname=library" --rejects rejects.csv
+    python3 code/import_catalog.py vendor.csv --column isbn=EAN --column title="Product Title" --dry-run
+
+CSV files need a header row; columns are matched by name (isbn, title,
+author, condition, purchase_date), or mapped with --column. Purchase dates
+are YYYY-MM-DD.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import date
+
+import psycopg2
+
+FIELDS = ["isbn", "title", "author", "condition", "purchase_date"]
+
+# Longest value each Book column accepts
+MAX_LENGTHS = {"title": 255, "author": 100, "condition": 50}
+
+# Records per block handed to COPY
+COPY_BLOCK = 10_000
+
+STAGING_TABLE = """
+    CREATE TEMP TABLE catalog_staging (
+        line_no BIGINT NOT NULL,
+        isbn VARCHAR(13) NOT NULL,
+        title VARCHAR(255) NOT NULL,
+        author VARCHAR(100),
+        condition VARCHAR(50),
+        purchase_date DATE
+    ) ON COMMIT DROP
+"""
+
+# Blank author/condition/purchase date in the file keep the existing value
+MERGE_SQL = """
+    WITH src AS (
+        SELECT DISTINCT ON (isbn) isbn, title, author, condition, purchase_date
+        FROM catalog_staging
+        ORDER BY isbn, line_no DESC
+    ), merged AS (
+        INSERT INTO Book AS b (isbn, title, author, condition, purchase_date, checkout_status)
+        SELECT isbn, title, author, condition, purchase_date, 'Available'
+        FROM src
+        ORDER BY isbn
+        ON CONFLICT (isbn) DO UPDATE
+            SET title = EXCLUDED.title,
+                author = COALESCE(EXCLUDED.author, b.author),
+                condition = COALESCE(EXCLUDED.condition, b.condition),
+                purchase_date = COALESCE(EXCLUDED.purchase_date, b.purchase_date)
+            WHERE (b.title, b.author, b.condition, b.purchase_date) IS DISTINCT FROM
+                  (EXCLUDED.title, COALESCE(EXCLUDED.author, b.author),
+                   COALESCE(EXCLUDED.condition, b.condition), COALESCE(EXCLUDED.purchase_date, b.purchase_date))
+        RETURNING xmax = 0 AS inserted
+    )
+    SELECT (SELECT COUNT(*) FROM src) AS distinct_isbns,
+           COUNT(*) FILTER (WHERE inserted) AS inserted,
+           COUNT(*) FILTER (WHERE NOT inserted) AS updated
+    FROM merged
+"""
+
+
+def _ean_check_digit(first12):
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    """The 13-digit form of an ISBN-10 or ISBN-13, or None if it is not a valid ISBN."""
+    isbn = "".join(ch for ch in str(value) if ch not in "- \t").upper()
+    if len(isbn) == 10:
+        if not (isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == "X")):
+            return None
+        digits = [int(d) for d in isbn[:9]] + [10 if isbn[9] == "X" else int(isbn[9])]
+        if sum((10 - i) * d for i, d in enumerate(digits)) % 11:
+            return None
+        return "978" + isbn[:9] + _ean_check_digit("978" + isbn[:9])
+    if len(isbn) == 13 and isbn.isdigit() and isbn[:3] in ("978", "979"):
+        return isbn if _ean_check_digit(isbn[:12]) == isbn[12] else None
+    return None
+
+
+def validate(record):
+    """(row for the staging table, None) for a valid record, or (None, rejection reason)."""
+    isbn = normalize_isbn(record.get("isbn") or "")
+    if isbn is None:
+        return None, "invalid isbn"
+    values = {}
+    for field in ("title", "author", "condition"):
+        value = record.get(field)
+        value = str(value).strip() if value is not None else ""
+        if len(value) > MAX_LENGTHS[field]:
+            return None, f"{field} too long"
+        values[field] = value or None
+    if values["title"] is None:
+        return None, "missing title"
+    purchase_date = str(record.get("purchase_date") or "").strip()
+    if purchase_date:
+        try:
+            purchase_date = date.fromisoformat(purchase_date)
+        except ValueError:
+            return None, "invalid purchase_date"
+    return (isbn, values["title"], values["author"], values["condition"], purchase_date or None), None
+
+
+def read_csv(path, columns):
+    """(line number, record) per CSV row, with header names mapped to FIELDS."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        headers = {name.strip().lower(): name for name in reader.fieldnames or []}
+        source = {field: columns.get(field) or headers.get(field) for field in FIELDS}
+        if source["isbn"] is None or source["title"] is None:
+            raise SystemExit(f"{path}: no isbn/title columns (found {', '.join(reader.fieldnames or [])}); "
+                             f"map them with --column")
+        for row in reader:
+            yield reader.line_num, {field: row.get(name) if name else None for field, name in source.items()}
+
+
+def read_jsonl(path, columns):
+    """(line number, record) per JSON object line; a malformed line yields record None."""
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            if not isinstance(data, dict):
+                yield line_no, None
+                continue
+            yield line_no, {field: data.get(columns.get(field, field)) for field in FIELDS}
+
+
+class CopyStream:
+    """Read-only file over an iterator of text blocks, for COPY FROM STDIN."""
+
+    def __init__(self, blocks):
+        self._blocks = blocks
+        self._block = ""
+        self._pos = 0
+
+    def read(self, size=-1):
+        parts = []
+        wanted = size
+        while wanted != 0:
+            if self._pos >= len(self._block):
+                self._block, self._pos = next(self._blocks, None), 0
+                if self._block is None:
+                    self._block = ""
+                    break
+            end = len(self._block) if wanted < 0 else min(self._pos + wanted, len(self._block))
+            parts.append(self._block[self._pos:end])
+            if wanted > 0:
+                wanted -= end - self._pos
+            self._pos = end
+        return "".join(parts)
+
+    readline = read
+
+
+class Import:
+    """Validates records on their way into COPY and keeps the counts."""
+
+    def __init__(self, records, rejects_file=None):
+        self.records = records
+        self.read = 0
+        self.staged = 0
+        self.rejected = Counter()
+        self._rejects = csv.writer(rejects_file) if rejects_file else None
+        if self._rejects:
+            self._rejects.writerow(["line", "reason", "record"])
+
+    def blocks(self):
+        block = io.StringIO()
+        writer = csv.writer(block)
+        pending = 0
+        for line_no, record in self.records:
+            self.read += 1
+            row, reason = validate(record) if record is not None else (None, "malformed record")
+            if row is None:
+                self.rejected[reason] += 1
+                if self._rejects:
+                    self._rejects.writerow([line_no, reason, json.dumps(record, default=str)])
+                continue
+            writer.writerow((line_no,) + tuple("" if v is None else v for v in row))
+            self.staged += 1
+            pending += 1
+            if pending >= COPY_BLOCK:
+                yield block.getvalue()
+                block.seek(0)
+                block.truncate()
+                pending = 0
+        if pending:
+            yield block.getvalue()
+
+
+def import_catalog(dsn, records, rejects_file=None, dry_run=False):
+    """Stage, validate and merge ``records``; returns a dict of counts and timings."""
+    started = time.monotonic()
+    job = Import(records, rejects_file)
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(STAGING_TABLE)
+            # Empty CSV fields are NULL (blank author/condition/purchase date)
+            cur.copy_expert("COPY catalog_staging (line_no, isbn, title, author, condition, purchase_date) "
+                            "FROM STDIN WITH (FORMAT csv)", CopyStream(job.blocks()))
+            staged_at = time.monotonic()
+            cur.execute("ANALYZE catalog_staging")
+            cur.execute(MERGE_SQL)
+            columns = [desc[0] for desc in cur.description]
+            result = dict(zip(columns, cur.fetchone()))
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    finished = time.monotonic()
+    result.update(
+        read=job.read,
+        staged=job.staged,
+        rejected=sum(job.rejected.values()),
+        rejected_by_reason=dict(job.rejected),
+        duplicates=job.staged - result["distinct_isbns"],
+        unchanged=result["distinct_isbns"] - result["inserted"] - result["updated"],
+        copy_seconds=staged_at - started,
+        merge_seconds=finished - staged_at,
+        seconds=finished - started,
+    )
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import a CSV or JSON-lines catalog file into Book.")
+    parser.add_argument("path", help="catalog file (.csv, or .jsonl/.ndjson for JSON lines)")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="file format (default: from the extension)")
+    parser.add_argument("--column", action="append", default=[], metavar="FIELD=NAME",
+                        help=f"source column/key for a field ({', '.join(FIELDS)}); repeatable")
+    parser.add_argument("--rejects", help="write rejected records (line, reason, record) to this CSV file")
+    parser.add_argument("--dry-run", action="store_true", help="validate and merge, then roll back")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    columns = {}
+    for mapping in args.column:
+        field, _, name = mapping.partition("=")
+        if field not in FIELDS or not name:
+            sys.exit(f"--column expects FIELD=NAME with FIELD one of {', '.join(FIELDS)}")
+        columns[field] = name
+    fmt = args.format or ("jsonl" if os.path.splitext(args.path)[1].lower() in (".jsonl", ".ndjson", ".json")
+                          else "csv")
+    records = read_jsonl(args.path, columns) if fmt == "jsonl" else read_csv(args.path, columns)
+
+    rejects_file = open(args.rejects, "w", newline="") if args.rejects else None
+    try:
+        result = import_catalog(args.dsn, records, rejects_file, args.dry_run)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+    print(f"{'[dry run] ' if args.dry_run else ''}Read {result['read']:,} records in {result['seconds']:.2f}s "
+          f"({result['read'] / max(result['seconds'], 1e-9):,.0f} records/s; "
+          f"COPY {result['copy_seconds']:.2f}s, merge {result['merge_seconds']:.2f}s)")
+    print(f"  inserted   {result['inserted']:>10,}")
+    print(f"  updated    {result['updated']:>10,}")
+    print(f"  unchanged  {result['unchanged']:>10,}")
+    print(f"  duplicates {result['duplicates']:>10,}  (same ISBN again later in the file)")
+    print(f"  rejected   {result['rejected']:>10,}" + (
+        "  (" + ", ".join(f"{reason}: {count:,}" for reason, count in sorted(result['rejected_by_reason'].items()))
+        + ")" if result['rejected'] else ""))
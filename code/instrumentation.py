@@ -0,0 +1,291 @@
+"""Per-query instrumentation for connections handed out by db.ConnectionPool.
+
+Pools created with a QueryRecorder give their connections an
+InstrumentedCursor, so every statement is measured no matter which module
+issues it (db.query, circulation, ...): wall time from execute() to the last
+fetch, rows returned or affected, an estimate of the bytes fetched, and the
+page it was issued from (set_page()). Measurements are aggregated per
+normalized statement (count, mean, p95, max), and statements slower than
+``slow_ms`` get their EXPLAIN plan captured on the same connection.
+
+Every statement is also logged to the ``library.queries`` logger (DEBUG, or
+WARNING when slow) with the measurements as record attributes, and, if the
+OpenTelemetry API is installed, emitted as a span following the database
+semantic conventions, so any configured OpenTelemetry SDK/exporter picks it up.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+try:
+    from opentelemetry import trace
+except ImportError:  # optional dependency
+    trace = None
+
+logger = logging.getLogger("library.queries")
+
+_page = contextvars.ContextVar("page", default=None)
+
+# Rows whose size is measured per statement; the byte count for the rest of
+# the result is extrapolated from their average
+BYTES_SAMPLE_ROWS = 100
+
+# Durations kept per statement for the p95
+DURATION_SAMPLES = 1000
+
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|VALUES)\b", re.IGNORECASE)
+
+
+def set_page(page):
+    """Name the page that subsequent queries in this thread/context come from."""
+    _page.set(page)
+
+
+def normalize(sql):
+    """Collapse a statement to a grouping key: whitespace, literals and placeholders."""
+    if isinstance(sql, bytes):
+        sql = sql.decode()
+    sql = re.sub(r"--[^\n]*", " ", sql)
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"%\(\w+\)s|%s", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _row_bytes(row):
+    size = 0
+    for value in row:
+        if value is None:
+            continue
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        else:
+            size += 8
+    return size
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class QueryRecorder:
+    """Thread-safe aggregate of query measurements, shared by a pool's connections."""
+
+    def __init__(self, slow_ms=500.0, explain_slow=True, max_slow=50, max_events=1000):
+        self.slow_ms = slow_ms
+        self.explain_slow = explain_slow
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._slow = deque(maxlen=max_slow)
+        self._events = deque(maxlen=max_events)
+        self._tracer = trace.get_tracer("library.queries") if trace is not None else None
+
+    def record(self, sql, page, started, seconds, rows, nbytes, error=None, plan=None):
+        key = normalize(sql)
+        slow = seconds * 1000 >= self.slow_ms
+        event = {
+            "timestamp": started,
+            "query": key,
+            "page": page,
+            "duration_ms": seconds * 1000,
+            "rows": rows,
+            "bytes": nbytes,
+            "error": error,
+            "slow": slow,
+        }
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                entry = self._queries[key] = {
+                    "count": 0, "total": 0.0, "max": 0.0, "rows": 0, "bytes": 0, "errors": 0,
+                    "slow": 0, "pages": set(), "durations": deque(maxlen=DURATION_SAMPLES),
+                }
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["rows"] += max(rows, 0)
+            entry["bytes"] += nbytes
+            entry["errors"] += error is not None
+            entry["slow"] += slow
+            if page:
+                entry["pages"].add(page)
+            entry["durations"].append(seconds)
+            self._events.append(event)
+            if slow:
+                self._slow.append(dict(event, plan=plan))
+
+        logger.log(logging.WARNING if slow else logging.DEBUG,
+                   "%s %.1f ms %d rows %s", page or "-", seconds * 1000, rows, key, extra={"query_event": event})
+        if self._tracer is not None:
+            self._emit_span(event, started, seconds)
+
+    def _emit_span(self, event, started, seconds):
+        start_ns = int(started * 1e9)
+        span = self._tracer.start_span(
+            event["query"].split(" ", 1)[0].upper() or "query",
+            kind=trace.SpanKind.CLIENT,
+            start_time=start_ns,
+            attributes={
+                "db.system": "postgresql",
+                "db.statement": event["query"],
+                "db.response.returned_rows": event["rows"],
+                "db.response.bytes": event["bytes"],
+                "app.page": event["page"] or "",
+            },
+        )
+        if event["error"]:
+            span.set_status(trace.Status(trace.StatusCode.ERROR, event["error"]))
+        span.end(end_time=start_ns + int(seconds * 1e9))
+
+    def stats(self):
+        """One dict per normalized statement, slowest total time first."""
+        with self._lock:
+            entries = [(key, dict(entry, durations=sorted(entry["durations"]), pages=sorted(entry["pages"])))
+                       for key, entry in self._queries.items()]
+        result = []
+        for key, entry in entries:
+            result.append({
+                "query": key,
+                "pages": ", ".join(entry["pages"]),
+                "count": entry["count"],
+                "mean_ms": entry["total"] / entry["count"] * 1000,
+                "p95_ms": _percentile(entry["durations"], 95) * 1000,
+                "max_ms": entry["max"] * 1000,
+                "total_ms": entry["total"] * 1000,
+                "rows": entry["rows"],
+                "bytes": entry["bytes"],
+                "errors": entry["errors"],
+                "slow": entry["slow"],
+            })
+        return sorted(result, key=lambda r: r["total_ms"], reverse=True)
+
+    def slow_queries(self):
+        """Most recent slow statements (newest first), with their EXPLAIN plans."""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def export_jsonl(self):
+        """The most recent query events as JSON lines, one event per line."""
+        with self._lock:
+            events = list(self._events)
+        return "".join(json.dumps(event, default=str) + "\n" for event in events)
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._slow.clear()
+            self._events.clear()
+
+
+def instrumented_cursor(recorder, base=extensions.cursor):
+    """A cursor class bound to ``recorder``, for psycopg2.connect(cursor_factory=...).
+
+    ``base`` is another cursor class to instrument (e.g. db.PreparingCursor).
+    """
+    bases = (InstrumentedCursor,) if base is extensions.cursor else (InstrumentedCursor, base)
+    return type("InstrumentedCursor", bases, {"recorder": recorder})
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Cursor that reports each statement to its class's ``recorder``.
+
+    A statement's measurement is closed (and recorded) when the next one is
+    executed or the cursor is closed, so time spent fetching counts too.
+    """
+
+    recorder = None
+
+    def execute(self, query, vars=None):
+        self._finish()
+        self._pending = {"sql": query, "vars": vars, "page": _page.get(), "started": time.time(),
+                         "clock": time.perf_counter(), "fetched": 0, "sampled": 0, "sample_bytes": 0}
+        try:
+            return super().execute(query, vars)
+        except psycopg2.Error as e:
+            self._finish(error=type(e).__name__)
+            raise
+
+    def _count(self, rows):
+        pending = getattr(self, "_pending", None)
+        if pending is None or not rows:
+            return rows
+        pending["fetched"] += len(rows)
+        for row in rows[:max(BYTES_SAMPLE_ROWS - pending["sampled"], 0)]:
+            pending["sample_bytes"] += _row_bytes(row)
+            pending["sampled"] += 1
+        return rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, size=None):
+        return self._count(super().fetchmany(self.arraysize if size is None else size))
+
+    def fetchall(self):
+        return self._count(super().fetchall())
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _finish(self, error=None):
+        pending = getattr(self, "_pending", None)
+        if pending is None or self.recorder is None:
+            return
+        self._pending = None
+        seconds = time.perf_counter() - pending["clock"]
+        if self.description is not None and not error:
+            rows = pending["fetched"]
+        else:
+            rows = self.rowcount if not error else 0
+        nbytes = 0
+        if pending["sampled"]:
+            nbytes = int(pending["sample_bytes"] / pending["sampled"] * pending["fetched"])
+        plan = None
+        if (not error and self.recorder.explain_slow and seconds * 1000 >= self.recorder.slow_ms
+                and EXPLAINABLE.match(pending["sql"] if isinstance(pending["sql"], str) else pending["sql"].decode())):
+            plan = self._explain(pending["sql"], pending["vars"])
+        self.recorder.record(pending["sql"], pending["page"], pending["started"], seconds,
+                             rows, nbytes, error=error, plan=plan)
+
+    def _explain(self, sql, params):
+        """EXPLAIN (without ANALYZE, so nothing runs twice) on this connection.
+
+        Inside an open transaction it runs under a savepoint, so a failure
+        cannot abort the caller's transaction.
+        """
+        conn = self.connection
+        if conn.closed:
+            return None
+        in_transaction = conn.get_transaction_status() == extensions.TRANSACTION_STATUS_INTRANS
+        try:
+            with conn.cursor(cursor_factory=extensions.cursor) as cur:
+                if in_transaction:
+                    cur.execute("SAVEPOINT explain_slow_query")
+                try:
+                    cur.execute("EXPLAIN " + (sql if isinstance(sql, str) else sql.decode()), params)
+                    plan = "\n".join(row[0] for row in cur.fetchall())
+                except psycopg2.Error as e:
+                    plan = f"EXPLAIN failed: {e}"
+                    if in_transaction:
+                        cur.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+                if in_transaction:
+                    cur.execute("RELEASE SAVEPOINT explain_slow_query")
+            if not in_transaction and not conn.autocommit:
+                conn.rollback()
+            return plan
+        except psycopg2.Error:
+            return None
@@ -0,0 +1,137 @@
+"""Background LISTEN/NOTIFY dispatcher for a process.
+
+A Listener owns one dedicated autocommit connection (not a pooled one, since
+it is held for the life of the process) and a daemon thread that waits on
+it with select() and hands every notification to the callbacks subscribed to
+its channel. Notifications are delivered by Postgres at commit, so a callback
+never sees a change that was rolled back.
+
+Each callback is first called with ``payload=None`` once its channel is
+being listened to, and again after every reconnect (the thread reconnects
+with backoff if the connection drops): notifications sent while nobody was
+listening are lost, so subscribers should treat None as "anything may have
+changed" and reload.
+"""
+import logging
+import select
+import threading
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger("library.listener")
+
+# Channel that migrations/007_change_notifications.sql notifies on for every
+# write to a table: CHANGE_CHANNEL_PREFIX + lowercase table name
+CHANGE_CHANNEL_PREFIX = "changed_"
+
+
+def table_channel(table):
+    """The change-notification channel of ``table`` (e.g. Book -> changed_book)."""
+    return CHANGE_CHANNEL_PREFIX + table.lower()
+
+
+# Seconds between select() wake-ups (to notice stop() and new channels)
+POLL_INTERVAL = 1.0
+
+# Reconnect backoff bounds, in seconds
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 30.0
+
+
+class Listener:
+    """Dispatches NOTIFY payloads to ``callback(channel, payload)`` subscribers."""
+
+    def __init__(self, connect_kwargs):
+        self.connect_kwargs = connect_kwargs
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._listening = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self.notifications = 0
+        self.reconnects = 0
+
+    def subscribe(self, channel, callback):
+        """Call ``callback(channel, payload)`` for each NOTIFY on ``channel``.
+
+        Channel names are used as SQL identifiers and must be plain lowercase
+        names. Starts the listener thread on first use.
+        """
+        if not channel.replace("_", "").isalnum() or channel != channel.lower():
+            raise ValueError(f"Invalid channel name: {channel!r}")
+        with self._lock:
+            self._callbacks.setdefault(channel, []).append(callback)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(POLL_INTERVAL * 2)
+
+    def stats(self):
+        with self._lock:
+            channels = sorted(self._callbacks)
+        return {"channels": channels, "notifications": self.notifications, "reconnects": self.reconnects,
+                "connected": bool(self._listening)}
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _listen_new_channels(self, conn):
+        with self._lock:
+            channels = set(self._callbacks) - self._listening
+        if channels:
+            with conn.cursor() as cur:
+                for channel in sorted(channels):
+                    cur.execute(f"LISTEN {channel}")
+            self._listening |= channels
+            for channel in sorted(channels):
+                self._dispatch(channel, None)
+
+    def _dispatch(self, channel, payload):
+        with self._lock:
+            callbacks = list(self._callbacks.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(channel, payload)
+            except Exception:
+                logger.exception("Listener callback for %s failed", channel)
+
+    def _run(self):
+        backoff = RECONNECT_MIN
+        connected_before = False
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                self._listening = set()
+                self.reconnects += connected_before
+                connected_before = True
+                self._listen_new_channels(conn)
+                backoff = RECONNECT_MIN
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], POLL_INTERVAL) != ([], [], []):
+                        conn.poll()
+                        while conn.notifies:
+                            notify = conn.notifies.pop(0)
+                            self.notifications += 1
+                            self._dispatch(notify.channel, notify.payload)
+                    self._listen_new_channels(conn)
+            except Exception as e:
+                # Anything else (e.g. OSError/ValueError from select() on a
+                # dead socket) would otherwise end the thread silently
+                if isinstance(e, psycopg2.Error):
+                    logger.warning("Listener connection lost (%s); reconnecting in %.1fs", e, backoff)
+                else:
+                    logger.exception("Listener failed; reconnecting in %.1fs", backoff)
+                self._listening = set()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, RECONNECT_MAX)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
@@ -0,0 +1,120 @@
+"""Maintain the monthly partitions of the Loan history table.
+
+    python3 code/loans.py list                      # partitions, row and open loan counts
+    python3 code/loans.py ensure --months-ahead 3   # create upcoming months (run monthly from cron)
+    python3 code/loans.py archive --before 2024-01  # detach every month before January 2024
+
+Checkouts for a month without a partition land in ``loan_default`` and are
+moved out when ``ensure`` creates it, so a missed cron run costs nothing but
+pruning. ``archive`` detaches whole months; a detached partition is an
+ordinary table that can be dumped with ``pg_dump -t loan_YYYY_MM`` and then
+dropped. Months that still have open loans are skipped, since Return and
+Overdue Books need them.
+
+Connection settings not given in --dsn are taken from the usual PG*
+environment variables (PGHOST, PGDATABASE, PGUSER, PGPASSWORD, ...).
+"""
+import argparse
+import re
+from datetime import datetime
+
+import psycopg2
+
+PARTITION_NAME = re.compile(r"^loan_(\d{4})_(\d{2})$")
+
+LIST_PARTITIONS = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'loan'::regclass
+    ORDER BY c.relname
+"""
+
+
+def partitions(cur):
+    """(name, bounds, estimated rows) for every attached partition, oldest first."""
+    cur.execute(LIST_PARTITIONS)
+    return cur.fetchall()
+
+
+def open_loans(cur, partition):
+    cur.execute(f"SELECT COUNT(*) FROM {partition} WHERE returned_date IS NULL")
+    return cur.fetchone()[0]
+
+
+def ensure(dsn, months_ahead):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT ensure_loan_partitions(%s)", (months_ahead,))
+            created = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Created {', '.join(created)}" if created else "All partitions already exist.")
+    return created
+
+
+def archive(dsn, before):
+    """Detach the monthly partitions that end on or before ``before`` (a month start)."""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    detached = []
+    try:
+        with conn.cursor() as cur:
+            # DETACH ... CONCURRENTLY is not allowed next to a default
+            # partition, so each detach is a brief exclusive lock on Loan; give
+            # up rather than queue checkouts behind a long-running report
+            cur.execute("SET lock_timeout = '5s'")
+            for name, _, _ in partitions(cur):
+                match = PARTITION_NAME.match(name)
+                if not match or (int(match.group(1)), int(match.group(2))) >= (before.year, before.month):
+                    continue
+                still_open = open_loans(cur, name)
+                if still_open:
+                    print(f"Skipping {name}: {still_open:,} loans are still open")
+                    continue
+                cur.execute(f"ALTER TABLE Loan DETACH PARTITION {name}")
+                detached.append(name)
+                print(f"Detached {name}")
+    finally:
+        conn.close()
+    if detached:
+        print(f"Archive with: pg_dump -t {' -t '.join(detached)} > loans-archive.sql, then DROP TABLE them.")
+    else:
+        print("Nothing to archive.")
+    return detached
+
+
+def list_partitions(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            for name, bounds, rows in partitions(cur):
+                print(f"{name:20s} {bounds:60s} ~{max(rows, 0):>12,} rows  "
+                      f"{open_loans(cur, name):>10,} open")
+    finally:
+        conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maintain the Loan history partitions.")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list partitions with row and open loan counts")
+    ensure_parser = commands.add_parser("ensure", help="create partitions for upcoming months")
+    ensure_parser.add_argument("--months-ahead", type=int, default=3)
+    archive_parser = commands.add_parser("archive", help="detach partitions before a month")
+    archive_parser.add_argument("--before", required=True, type=lambda v: datetime.strptime(v, "%Y-%m").date(),
+                                help="first month to keep, as YYYY-MM")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "list":
+        list_partitions(args.dsn)
+    elif args.command == "ensure":
+        ensure(args.dsn, args.months_ahead)
+    else:
+        archive(args.dsn, args.before)
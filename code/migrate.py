@@ -0,0 +1,223 @@
+"""Apply the SQL migrations in code/migrations/ in version order.
+
+Each file is named ``NNN_description.sql``; the applied versions are recorded
+in the ``schema_migrations`` table, so running the script again only applies
+what is new. Migrations are written to be idempotent as well (IF NOT EXISTS,
+CREATE OR REPLACE), which lets a database set up by hand with psql be brought
+under the runner by simply running it once.
+
+A file starting with ``-- migrate: no-transaction`` is run one statement at a
+time in autocommit mode, which CREATE INDEX CONCURRENTLY requires. Such a
+build leaves an INVALID index behind if it is interrupted; those are dropped
+before the file is retried so ``IF NOT EXISTS`` does not skip them.
+
+Usage:
+    python3 code/migrate.py                       # apply everything pending
+    python3 code/migrate.py --status              # list applied/pending versions
+    python3 code/migrate.py --target 2 --dsn "dbname=library"
+
+Connection settings not given in --dsn are taken from the usual PG*
+environment variables (PGHOST, PGDATABASE, PGUSER, PGPASSWORD, ...).
+"""
+import argparse
+import hashlib
+import os
+import re
+import time
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+NO_TRANSACTION = "-- migrate: no-transaction"
+CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+# Arbitrary key for the session advisory lock, so two runners never interleave
+MIGRATION_LOCK_ID = 4_720_013
+
+# Seconds between attempts to take the lock while another runner holds it
+LOCK_RETRY_INTERVAL = 1.0
+
+SCHEMA_MIGRATIONS = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        duration_ms NUMERIC
+    )
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """(version, name, path) for every migration file, in version order."""
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: "
+                                 f"{os.path.basename(migrations[version][2])} and {filename}")
+        migrations[version] = (version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(sql):
+    """Split a no-transaction migration on semicolons that end a line.
+
+    Only meant for plain DDL files; anything with dollar-quoted function
+    bodies belongs in a regular, transactional migration.
+    """
+    statements = []
+    for chunk in re.split(r";[ \t]*$", sql, flags=re.MULTILINE):
+        code = "\n".join(line for line in chunk.splitlines() if not line.strip().startswith("--"))
+        if code.strip():
+            statements.append(chunk.strip())
+    return statements
+
+
+def applied_migrations(cur):
+    cur.execute("SELECT version, checksum FROM schema_migrations ORDER BY version")
+    return dict(cur.fetchall())
+
+
+def _drop_invalid_indexes(cur, sql):
+    for name in CONCURRENT_INDEX.findall(sql):
+        cur.execute("""
+            SELECT NOT i.indisvalid FROM pg_index i
+            WHERE i.indexrelid = to_regclass(%s)
+        """, (name.lower(),))
+        row = cur.fetchone()
+        if row and row[0]:
+            print(f"  dropping invalid index {name} left by an interrupted build")
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def acquire_lock(cur):
+    """Take the migration lock, polling with pg_try_advisory_lock.
+
+    A runner blocked inside pg_advisory_lock() sits in a running statement
+    whose snapshot CREATE INDEX CONCURRENTLY in the lock holder waits out, so
+    both would wait on each other forever. Between attempts this connection
+    is idle in autocommit and holds no snapshot.
+    """
+    waiting = False
+    while True:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        if cur.fetchone()[0]:
+            return
+        if not waiting:
+            print("Waiting for another migration runner to finish...")
+            waiting = True
+        time.sleep(LOCK_RETRY_INTERVAL)
+
+
+def apply(conn, migration):
+    """Run one migration and record it; returns the elapsed seconds."""
+    version, name, path = migration
+    with open(path) as f:
+        sql = f.read()
+    checksum = hashlib.sha256(sql.encode()).hexdigest()
+    started = time.monotonic()
+
+    if sql.lstrip().startswith(NO_TRANSACTION):
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                _drop_invalid_indexes(cur, sql)
+                for statement in split_statements(sql):
+                    cur.execute(statement)
+        finally:
+            conn.autocommit = False
+    else:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+
+    elapsed = time.monotonic() - started
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (version) DO UPDATE
+            SET name = EXCLUDED.name, checksum = EXCLUDED.checksum,
+                applied_at = now(), duration_ms = EXCLUDED.duration_ms
+        """, (version, name, checksum, round(elapsed * 1000, 1)))
+    conn.commit()
+    return elapsed
+
+
+def migrate(dsn, target=None):
+    """Apply pending migrations up to ``target`` (default: all); returns the versions applied."""
+    migrations = [m for m in discover() if target is None or m[0] <= target]
+    conn = psycopg2.connect(dsn)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            acquire_lock(cur)
+            cur.execute(SCHEMA_MIGRATIONS)
+            applied = applied_migrations(cur)
+        conn.autocommit = False
+
+        done = []
+        for migration in migrations:
+            version, name, _ = migration
+            if version in applied:
+                continue
+            print(f"Applying {version:03d}_{name}...")
+            try:
+                elapsed = apply(conn, migration)
+            except psycopg2.Error as e:
+                conn.rollback()
+                raise MigrationError(f"Migration {version:03d}_{name} failed: {e}") from e
+            print(f"  done in {elapsed:.1f}s")
+            done.append(version)
+        if not done:
+            print("Schema is up to date.")
+        return done
+    finally:
+        conn.close()
+
+
+def status(dsn):
+    migrations = discover()
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+            applied = applied_migrations(cur) if cur.fetchone()[0] else {}
+    finally:
+        conn.close()
+
+    for version, name, path in migrations:
+        with open(path) as f:
+            checksum = hashlib.sha256(f.read().encode()).hexdigest()
+        if version not in applied:
+            state = "pending"
+        elif applied[version] != checksum:
+            state = "applied (file changed since)"
+        else:
+            state = "applied"
+        print(f"{version:03d}_{name:40s} {state}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Apply the library app's schema migrations.")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--target", type=int, help="apply migrations up to and including this version")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.status:
+        status(args.dsn)
+    else:
+        migrate(args.dsn, args.target)
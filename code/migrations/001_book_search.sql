@@ -0,0 +1,11 @@
+-- 001: Indexes behind the Book Search page.
+-- Trigram GIN indexes let substring matches on title/author (ILIKE '%term%')
+-- use an index instead of a sequential scan, the pattern-ops index serves
+-- ISBN prefix lookups, and (title, isbn) backs keyset pagination when browsing.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS book_title_trgm_idx ON Book USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS book_author_trgm_idx ON Book USING gin (author gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS book_isbn_prefix_idx ON Book (isbn varchar_pattern_ops);
+CREATE INDEX IF NOT EXISTS book_title_isbn_idx ON Book (title, isbn);
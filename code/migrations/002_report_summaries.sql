@@ -0,0 +1,307 @@
+-- 002: Summary tables behind the Reports & Analytics aggregates.
+-- Top Borrowers, Member Fines and Computer Usage read these tables instead of
+-- re-running JOIN + GROUP BY over Book, Fine and Computers_Session on every
+-- page view. Statement-level triggers apply the net change of each write
+-- (one checkout, a whole book drop, a bulk import) to the affected summary
+-- rows, so the summaries are updated in the same transaction as the write.
+-- rebuild_report_summaries() recomputes everything from scratch.
+
+CREATE TABLE IF NOT EXISTS Borrower_Summary (
+    card_id INTEGER PRIMARY KEY,
+    num_books_checked_out INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS borrower_summary_rank_idx
+    ON Borrower_Summary (num_books_checked_out DESC, card_id) WHERE num_books_checked_out > 0;
+CREATE INDEX IF NOT EXISTS borrower_summary_updated_idx ON Borrower_Summary (updated_at);
+
+CREATE TABLE IF NOT EXISTS Member_Fine_Summary (
+    card_id INTEGER PRIMARY KEY,
+    total_fines NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    num_fines INTEGER NOT NULL DEFAULT 0,
+    outstanding_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    num_outstanding INTEGER NOT NULL DEFAULT 0,
+    paid_amount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    num_paid INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS member_fine_summary_total_idx
+    ON Member_Fine_Summary (total_fines DESC) WHERE num_fines > 0;
+CREATE INDEX IF NOT EXISTS member_fine_summary_outstanding_idx
+    ON Member_Fine_Summary (outstanding_amount DESC) WHERE outstanding_amount > 0;
+CREATE INDEX IF NOT EXISTS member_fine_summary_paid_idx
+    ON Member_Fine_Summary (paid_amount DESC) WHERE paid_amount > 0;
+CREATE INDEX IF NOT EXISTS member_fine_summary_updated_idx ON Member_Fine_Summary (updated_at);
+
+-- card_type NULL is stored as 'Unknown' so it can be part of the key
+CREATE TABLE IF NOT EXISTS Card_Type_Session_Summary (
+    card_type VARCHAR(50) PRIMARY KEY,
+    total_active_sessions INTEGER NOT NULL DEFAULT 0,
+    sessions_counted INTEGER NOT NULL DEFAULT 0,     -- rows with a non-NULL num_of_sessions
+    total_sessions_all_time BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS Report_Summary_Status (
+    summary_table VARCHAR(50) PRIMARY KEY,
+    last_rebuilt TIMESTAMPTZ
+);
+
+
+-- Full rebuild ---------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION rebuild_report_summaries() RETURNS void AS $$
+BEGIN
+    DELETE FROM Borrower_Summary;
+    INSERT INTO Borrower_Summary (card_id, num_books_checked_out)
+    SELECT lib_card_id, COUNT(*)
+    FROM Book
+    WHERE checkout_status = 'Checked Out' AND lib_card_id IS NOT NULL
+    GROUP BY lib_card_id;
+
+    DELETE FROM Member_Fine_Summary;
+    INSERT INTO Member_Fine_Summary (card_id, total_fines, num_fines, outstanding_amount,
+                                     num_outstanding, paid_amount, num_paid)
+    SELECT card_id,
+           SUM(amount),
+           COUNT(*),
+           COALESCE(SUM(amount) FILTER (WHERE status = 'Outstanding'), 0),
+           COUNT(*) FILTER (WHERE status = 'Outstanding'),
+           COALESCE(SUM(amount) FILTER (WHERE status = 'Paid'), 0),
+           COUNT(*) FILTER (WHERE status = 'Paid')
+    FROM Fine
+    WHERE card_id IS NOT NULL
+    GROUP BY card_id;
+
+    DELETE FROM Card_Type_Session_Summary;
+    INSERT INTO Card_Type_Session_Summary (card_type, total_active_sessions, sessions_counted,
+                                           total_sessions_all_time)
+    SELECT COALESCE(lc.card_type, 'Unknown'), COUNT(*), COUNT(cs.num_of_sessions),
+           COALESCE(SUM(cs.num_of_sessions), 0)
+    FROM Computers_Session cs
+    JOIN Library_Card lc ON lc.card_id = cs.card_id
+    GROUP BY COALESCE(lc.card_type, 'Unknown');
+
+    INSERT INTO Report_Summary_Status (summary_table, last_rebuilt)
+    VALUES ('Borrower_Summary', now()), ('Member_Fine_Summary', now()),
+           ('Card_Type_Session_Summary', now())
+    ON CONFLICT (summary_table) DO UPDATE SET last_rebuilt = EXCLUDED.last_rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Incremental maintenance ----------------------------------------------------
+-- Each trigger collects the statement's transition tables into signed deltas,
+-- nets them per summary key and upserts in key order (to avoid deadlocks
+-- between concurrent multi-row writes). Transition tables only exist for the
+-- events that have them, so each one is read inside its own IF branch.
+
+CREATE OR REPLACE FUNCTION book_borrower_summary_trg() RETURNS trigger AS $$
+DECLARE
+    old_cards INTEGER[] := '{}';
+    new_cards INTEGER[] := '{}';
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM Borrower_Summary;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COALESCE(array_agg(lib_card_id), '{}') INTO old_cards
+        FROM old_rows WHERE checkout_status = 'Checked Out' AND lib_card_id IS NOT NULL;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COALESCE(array_agg(lib_card_id), '{}') INTO new_cards
+        FROM new_rows WHERE checkout_status = 'Checked Out' AND lib_card_id IS NOT NULL;
+    END IF;
+
+    WITH delta AS (
+        SELECT unnest(old_cards) AS card_id, -1 AS change
+        UNION ALL
+        SELECT unnest(new_cards), 1
+    ), net AS (
+        SELECT card_id, SUM(change) AS change FROM delta GROUP BY card_id HAVING SUM(change) <> 0
+    )
+    INSERT INTO Borrower_Summary AS s (card_id, num_books_checked_out, updated_at)
+    SELECT card_id, change, now() FROM net ORDER BY card_id
+    ON CONFLICT (card_id) DO UPDATE
+        SET num_books_checked_out = s.num_books_checked_out + EXCLUDED.num_books_checked_out,
+            updated_at = now();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fine_summary_trg() RETURNS trigger AS $$
+DECLARE
+    old_cards INTEGER[] := '{}';
+    old_amounts NUMERIC[] := '{}';
+    old_statuses VARCHAR[] := '{}';
+    new_cards INTEGER[] := '{}';
+    new_amounts NUMERIC[] := '{}';
+    new_statuses VARCHAR[] := '{}';
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM Member_Fine_Summary;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT COALESCE(array_agg(card_id), '{}'), COALESCE(array_agg(amount), '{}'),
+               COALESCE(array_agg(status), '{}')
+        INTO old_cards, old_amounts, old_statuses
+        FROM old_rows WHERE card_id IS NOT NULL;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT COALESCE(array_agg(card_id), '{}'), COALESCE(array_agg(amount), '{}'),
+               COALESCE(array_agg(status), '{}')
+        INTO new_cards, new_amounts, new_statuses
+        FROM new_rows WHERE card_id IS NOT NULL;
+    END IF;
+
+    WITH delta AS (
+        SELECT d.card_id, -1 AS sign, d.amount, d.status
+        FROM unnest(old_cards, old_amounts, old_statuses) AS d(card_id, amount, status)
+        UNION ALL
+        SELECT d.card_id, 1, d.amount, d.status
+        FROM unnest(new_cards, new_amounts, new_statuses) AS d(card_id, amount, status)
+    ), net AS (
+        SELECT card_id,
+               SUM(sign * amount) AS total_fines,
+               SUM(sign) AS num_fines,
+               COALESCE(SUM(sign * amount) FILTER (WHERE status = 'Outstanding'), 0) AS outstanding_amount,
+               COALESCE(SUM(sign) FILTER (WHERE status = 'Outstanding'), 0) AS num_outstanding,
+               COALESCE(SUM(sign * amount) FILTER (WHERE status = 'Paid'), 0) AS paid_amount,
+               COALESCE(SUM(sign) FILTER (WHERE status = 'Paid'), 0) AS num_paid
+        FROM delta
+        GROUP BY card_id
+    )
+    INSERT INTO Member_Fine_Summary AS s (card_id, total_fines, num_fines, outstanding_amount,
+                                          num_outstanding, paid_amount, num_paid, updated_at)
+    SELECT card_id, total_fines, num_fines, outstanding_amount, num_outstanding,
+           paid_amount, num_paid, now()
+    FROM net
+    WHERE total_fines <> 0 OR num_fines <> 0 OR outstanding_amount <> 0 OR num_outstanding <> 0
+       OR paid_amount <> 0 OR num_paid <> 0
+    ORDER BY card_id
+    ON CONFLICT (card_id) DO UPDATE
+        SET total_fines = s.total_fines + EXCLUDED.total_fines,
+            num_fines = s.num_fines + EXCLUDED.num_fines,
+            outstanding_amount = s.outstanding_amount + EXCLUDED.outstanding_amount,
+            num_outstanding = s.num_outstanding + EXCLUDED.num_outstanding,
+            paid_amount = s.paid_amount + EXCLUDED.paid_amount,
+            num_paid = s.num_paid + EXCLUDED.num_paid,
+            updated_at = now();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Shared by Computers_Session (sessions added/removed/changed) and
+-- Library_Card (a card with a session changing card_type)
+CREATE OR REPLACE FUNCTION session_summary_trg() RETURNS trigger AS $$
+DECLARE
+    old_types VARCHAR[] := '{}';
+    old_sessions INTEGER[] := '{}';
+    new_types VARCHAR[] := '{}';
+    new_sessions INTEGER[] := '{}';
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM Card_Type_Session_Summary;
+        RETURN NULL;
+    END IF;
+
+    IF TG_TABLE_NAME = 'library_card' THEN
+        -- Sessions move between card types when a card's type changes
+        SELECT COALESCE(array_agg(COALESCE(o.card_type, 'Unknown')), '{}'),
+               COALESCE(array_agg(cs.num_of_sessions), '{}'),
+               COALESCE(array_agg(COALESCE(n.card_type, 'Unknown')), '{}')
+        INTO old_types, old_sessions, new_types
+        FROM old_rows o
+        JOIN new_rows n ON n.card_id = o.card_id
+        JOIN Computers_Session cs ON cs.card_id = o.card_id
+        WHERE o.card_type IS DISTINCT FROM n.card_type;
+        new_sessions := old_sessions;
+    ELSE
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            SELECT COALESCE(array_agg(COALESCE(lc.card_type, 'Unknown')), '{}'),
+                   COALESCE(array_agg(o.num_of_sessions), '{}')
+            INTO old_types, old_sessions
+            FROM old_rows o JOIN Library_Card lc ON lc.card_id = o.card_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            SELECT COALESCE(array_agg(COALESCE(lc.card_type, 'Unknown')), '{}'),
+                   COALESCE(array_agg(n.num_of_sessions), '{}')
+            INTO new_types, new_sessions
+            FROM new_rows n JOIN Library_Card lc ON lc.card_id = n.card_id;
+        END IF;
+    END IF;
+
+    WITH delta AS (
+        SELECT d.card_type, -1 AS sign, d.num_of_sessions
+        FROM unnest(old_types, old_sessions) AS d(card_type, num_of_sessions)
+        UNION ALL
+        SELECT d.card_type, 1, d.num_of_sessions
+        FROM unnest(new_types, new_sessions) AS d(card_type, num_of_sessions)
+    ), net AS (
+        SELECT card_type,
+               SUM(sign) AS sessions,
+               COALESCE(SUM(sign) FILTER (WHERE num_of_sessions IS NOT NULL), 0) AS counted,
+               COALESCE(SUM(sign * num_of_sessions), 0) AS total
+        FROM delta
+        GROUP BY card_type
+    )
+    INSERT INTO Card_Type_Session_Summary AS s (card_type, total_active_sessions, sessions_counted,
+                                                total_sessions_all_time, updated_at)
+    SELECT card_type, sessions, counted, total, now() FROM net
+    WHERE sessions <> 0 OR counted <> 0 OR total <> 0
+    ORDER BY card_type
+    ON CONFLICT (card_type) DO UPDATE
+        SET total_active_sessions = s.total_active_sessions + EXCLUDED.total_active_sessions,
+            sessions_counted = s.sessions_counted + EXCLUDED.sessions_counted,
+            total_sessions_all_time = s.total_sessions_all_time + EXCLUDED.total_sessions_all_time,
+            updated_at = now();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables require one trigger per event
+DROP TRIGGER IF EXISTS book_summary_insert ON Book;
+DROP TRIGGER IF EXISTS book_summary_update ON Book;
+DROP TRIGGER IF EXISTS book_summary_delete ON Book;
+DROP TRIGGER IF EXISTS book_summary_truncate ON Book;
+CREATE TRIGGER book_summary_insert AFTER INSERT ON Book
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_borrower_summary_trg();
+CREATE TRIGGER book_summary_update AFTER UPDATE ON Book
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION book_borrower_summary_trg();
+CREATE TRIGGER book_summary_delete AFTER DELETE ON Book
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION book_borrower_summary_trg();
+CREATE TRIGGER book_summary_truncate AFTER TRUNCATE ON Book
+    FOR EACH STATEMENT EXECUTE FUNCTION book_borrower_summary_trg();
+
+DROP TRIGGER IF EXISTS fine_summary_insert ON Fine;
+DROP TRIGGER IF EXISTS fine_summary_update ON Fine;
+DROP TRIGGER IF EXISTS fine_summary_delete ON Fine;
+DROP TRIGGER IF EXISTS fine_summary_truncate ON Fine;
+CREATE TRIGGER fine_summary_insert AFTER INSERT ON Fine
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fine_summary_trg();
+CREATE TRIGGER fine_summary_update AFTER UPDATE ON Fine
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION fine_summary_trg();
+CREATE TRIGGER fine_summary_delete AFTER DELETE ON Fine
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION fine_summary_trg();
+CREATE TRIGGER fine_summary_truncate AFTER TRUNCATE ON Fine
+    FOR EACH STATEMENT EXECUTE FUNCTION fine_summary_trg();
+
+DROP TRIGGER IF EXISTS session_summary_insert ON Computers_Session;
+DROP TRIGGER IF EXISTS session_summary_update ON Computers_Session;
+DROP TRIGGER IF EXISTS session_summary_delete ON Computers_Session;
+DROP TRIGGER IF EXISTS session_summary_truncate ON Computers_Session;
+DROP TRIGGER IF EXISTS card_type_summary_update ON Library_Card;
+CREATE TRIGGER session_summary_insert AFTER INSERT ON Computers_Session
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION session_summary_trg();
+CREATE TRIGGER session_summary_update AFTER UPDATE ON Computers_Session
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION session_summary_trg();
+CREATE TRIGGER session_summary_delete AFTER DELETE ON Computers_Session
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION session_summary_trg();
+CREATE TRIGGER session_summary_truncate AFTER TRUNCATE ON Computers_Session
+    FOR EACH STATEMENT EXECUTE FUNCTION session_summary_trg();
+CREATE TRIGGER card_type_summary_update AFTER UPDATE ON Library_Card
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION session_summary_trg();
+
+SELECT rebuild_report_summaries();
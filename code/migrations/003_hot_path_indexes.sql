@@ -0,0 +1,39 @@
+-- migrate: no-transaction
+-- Indexes for the columns every page filters or joins on. schema.sql only
+-- has primary keys and UNIQUE constraints, so these lookups were sequential
+-- scans. Built CONCURRENTLY so they can be added to a live database without
+-- blocking checkouts; code/migrate.py runs this file outside a transaction.
+-- bench/index_plans.py shows the plan of each affected query with and
+-- without its index.
+
+-- Member Lookup's current checkouts, Borrower_Summary maintenance and the
+-- foreign key check when a card is deleted. Only checked-out books have a
+-- borrower, so the index skips the (much larger) available stock.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS book_lib_card_id_idx
+    ON Book (lib_card_id) WHERE lib_card_id IS NOT NULL;
+
+-- Active Checkouts and Overdue Books read checked-out books in due date
+-- order, and the Dashboard counts them; the checkout_status filter is the
+-- index predicate, so the index holds only the books that are out.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS book_checked_out_due_idx
+    ON Book (due_date) WHERE checkout_status = 'Checked Out';
+
+-- Member Lookup's fines per card, in fine_id order
+CREATE INDEX CONCURRENTLY IF NOT EXISTS fine_card_id_idx
+    ON Fine (card_id, fine_id);
+
+-- Dashboard active member count (index-only scan)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS library_card_status_idx
+    ON Library_Card (status);
+
+-- Member Lookup name search: ILIKE '%term%' (needs pg_trgm, see 001)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS library_card_name_trgm_idx
+    ON Library_Card USING gin (name gin_trgm_ops);
+
+-- All Members sorted by name, paged by (name, card_id) keyset
+CREATE INDEX CONCURRENTLY IF NOT EXISTS library_card_name_idx
+    ON Library_Card (name, card_id);
+
+ANALYZE Book;
+ANALYZE Fine;
+ANALYZE Library_Card;
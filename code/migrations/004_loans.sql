@@ -0,0 +1,90 @@
+-- Circulation history. Book only holds each copy's current loan, and Return
+-- clears it, so until now every past loan was lost. Loan keeps one row per
+-- loan: Checkout appends it and Return closes it by setting returned_date,
+-- in the same statements that update Book (see code/circulation.py).
+--
+-- The table is range-partitioned by checkout month, so reports over a recent
+-- period only touch the partitions for that period, and old months can be
+-- detached for archiving without a bulk DELETE (code/loans.py). There are no
+-- foreign keys, so history outlives deleted cards or books and a detached
+-- partition is a self-contained table.
+
+CREATE TABLE IF NOT EXISTS Loan (
+    loan_id BIGSERIAL,
+    isbn VARCHAR(20) NOT NULL,
+    card_id INTEGER NOT NULL,
+    checkout_date DATE NOT NULL,
+    due_date DATE NOT NULL,
+    returned_date DATE,
+    PRIMARY KEY (loan_id, checkout_date)
+) PARTITION BY RANGE (checkout_date);
+
+-- Catches loans for months without a partition yet, so a checkout never fails
+-- because nobody ran ensure_loan_partitions(); they are moved out again when
+-- the month's partition is created.
+CREATE TABLE IF NOT EXISTS loan_default PARTITION OF Loan DEFAULT;
+
+-- Return closes the open loan of each ISBN; Overdue Books reads open loans by
+-- due date; Top Borrowers counts loans per card over a period.
+CREATE INDEX IF NOT EXISTS loan_open_isbn_idx ON Loan (isbn) WHERE returned_date IS NULL;
+CREATE INDEX IF NOT EXISTS loan_open_due_idx ON Loan (due_date) WHERE returned_date IS NULL;
+CREATE INDEX IF NOT EXISTS loan_card_checkout_idx ON Loan (card_id, checkout_date);
+
+
+-- Partition maintenance ------------------------------------------------------
+
+-- Create the monthly partitions (named loan_YYYY_MM) from the month of
+-- ``since`` through ``months_ahead`` months after the current one, returning
+-- the names of those created. Existing tables, including detached archive
+-- partitions, are left alone.
+CREATE OR REPLACE FUNCTION ensure_loan_partitions(months_ahead INTEGER DEFAULT 3,
+                                                  since DATE DEFAULT CURRENT_DATE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    part_start DATE := date_trunc('month', since)::date;
+    last_start DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    part_end DATE;
+    part_name TEXT;
+BEGIN
+    WHILE part_start <= last_start LOOP
+        part_end := (part_start + interval '1 month')::date;
+        part_name := 'loan_' || to_char(part_start, 'YYYY_MM');
+        IF to_regclass(part_name) IS NULL THEN
+            -- Attaching a range that the default partition already has rows
+            -- for fails, so build the partition with those rows first
+            EXECUTE format('CREATE TABLE %I (LIKE Loan INCLUDING DEFAULTS)', part_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM loan_default WHERE checkout_date >= %L AND checkout_date < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved', part_start, part_end, part_name);
+            EXECUTE format('ALTER TABLE Loan ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           part_name, part_start, part_end);
+            RETURN NEXT part_name;
+        END IF;
+        part_start := part_end;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Open a loan for every checked-out book that does not have one (books
+-- checked out before this migration, or loaded by the seed scripts), and
+-- return how many were added.
+CREATE OR REPLACE FUNCTION backfill_loans() RETURNS INTEGER AS $$
+DECLARE
+    added INTEGER;
+BEGIN
+    PERFORM ensure_loan_partitions(3, GREATEST(
+        (SELECT MIN(checkout_date) FROM Book WHERE checkout_status = 'Checked Out'),
+        (CURRENT_DATE - interval '2 years')::date));
+
+    INSERT INTO Loan (isbn, card_id, checkout_date, due_date)
+    SELECT b.isbn, b.lib_card_id, COALESCE(b.checkout_date, CURRENT_DATE),
+           COALESCE(b.due_date, b.checkout_date, CURRENT_DATE)
+    FROM Book b
+    WHERE b.checkout_status = 'Checked Out' AND b.lib_card_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM Loan l WHERE l.isbn = b.isbn AND l.returned_date IS NULL);
+    GET DIAGNOSTICS added = ROW_COUNT;
+    RETURN added;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT backfill_loans();
@@ -0,0 +1,22 @@
+-- migrate: no-transaction
+-- Support for the fine accrual job (code/accrue_fines.py). Each accrued fine
+-- remembers the loan it is for (the borrower, the book or item, and the
+-- loan's checkout date), and a unique index on that key lets every run upsert
+-- the fines instead of adding new ones. Fines entered by hand leave
+-- loan_checkout_date NULL and are not covered by the indexes.
+
+ALTER TABLE Fine ADD COLUMN IF NOT EXISTS loan_checkout_date DATE;
+ALTER TABLE Fine ADD COLUMN IF NOT EXISTS days_overdue INTEGER;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS fine_book_loan_uidx
+    ON Fine (isbn, card_id, loan_checkout_date)
+    WHERE isbn IS NOT NULL AND loan_checkout_date IS NOT NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS fine_item_loan_uidx
+    ON Fine (item_id, card_id, loan_checkout_date)
+    WHERE item_id IS NOT NULL AND loan_checkout_date IS NOT NULL;
+
+-- Items on loan by due date, for finding the overdue ones (Book loans use
+-- loan_open_due_idx from 004)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS items_on_loan_due_idx
+    ON Items (due_date) WHERE card_id IS NOT NULL;
@@ -0,0 +1,102 @@
+-- Public computer inventory. Until now the Dashboard guessed availability from
+-- remaining_computers on the newest Computers_Session row and counted active
+-- sessions with COUNT(*). Computer holds one row per machine with the session
+-- running on it (code/computers.py starts and ends sessions atomically), and
+-- Computers_Session keeps its role as the per-card usage tally behind Member
+-- Lookup and the Computer Usage report.
+--
+-- Computer_Availability is a single-row counter kept in step with Computer by
+-- statement-level triggers, so the Dashboard reads availability in O(1), and
+-- every change is announced with NOTIFY computer_availability (delivered at
+-- commit) for open dashboards to pick up without polling.
+
+CREATE TABLE IF NOT EXISTS Computer (
+    computer_id SERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE,
+    location VARCHAR(100),
+    status VARCHAR(20) NOT NULL DEFAULT 'Available'
+        CHECK (status IN ('Available', 'In Use', 'Out of Service')),
+    card_id INTEGER REFERENCES Library_Card(card_id),
+    session_started TIMESTAMPTZ,
+    CHECK ((status = 'In Use') = (card_id IS NOT NULL AND session_started IS NOT NULL))
+);
+
+-- One computer per card at a time; also what a second concurrent start for
+-- the same card fails on
+CREATE UNIQUE INDEX IF NOT EXISTS computer_card_uidx ON Computer (card_id) WHERE card_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS computer_available_idx ON Computer (computer_id) WHERE status = 'Available';
+
+CREATE TABLE IF NOT EXISTS Computer_Availability (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    total INTEGER NOT NULL DEFAULT 0,
+    available INTEGER NOT NULL DEFAULT 0,
+    in_use INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION refresh_computer_availability() RETURNS void AS $$
+BEGIN
+    INSERT INTO Computer_Availability AS a (singleton, total, available, in_use, updated_at)
+    SELECT TRUE, COUNT(*), COUNT(*) FILTER (WHERE status = 'Available'),
+           COUNT(*) FILTER (WHERE status = 'In Use'), now()
+    FROM Computer
+    ON CONFLICT (singleton) DO UPDATE
+        SET total = EXCLUDED.total, available = EXCLUDED.available,
+            in_use = EXCLUDED.in_use, updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION computer_availability_trg() RETURNS trigger AS $$
+DECLARE
+    d_total INTEGER := 0;
+    d_available INTEGER := 0;
+    d_in_use INTEGER := 0;
+    counts Computer_Availability%ROWTYPE;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE Computer_Availability SET total = 0, available = 0, in_use = 0, updated_at = now()
+        RETURNING * INTO counts;
+    ELSE
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            SELECT d_total - COUNT(*),
+                   d_available - COUNT(*) FILTER (WHERE status = 'Available'),
+                   d_in_use - COUNT(*) FILTER (WHERE status = 'In Use')
+            INTO d_total, d_available, d_in_use
+            FROM old_rows;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            SELECT d_total + COUNT(*),
+                   d_available + COUNT(*) FILTER (WHERE status = 'Available'),
+                   d_in_use + COUNT(*) FILTER (WHERE status = 'In Use')
+            INTO d_total, d_available, d_in_use
+            FROM new_rows;
+        END IF;
+        IF d_total = 0 AND d_available = 0 AND d_in_use = 0 THEN
+            RETURN NULL;
+        END IF;
+        UPDATE Computer_Availability
+        SET total = total + d_total, available = available + d_available,
+            in_use = in_use + d_in_use, updated_at = now()
+        RETURNING * INTO counts;
+    END IF;
+    PERFORM pg_notify('computer_availability',
+                      json_build_object('total', counts.total, 'available', counts.available,
+                                        'in_use', counts.in_use, 'updated_at', counts.updated_at)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS computer_availability_insert ON Computer;
+DROP TRIGGER IF EXISTS computer_availability_update ON Computer;
+DROP TRIGGER IF EXISTS computer_availability_delete ON Computer;
+DROP TRIGGER IF EXISTS computer_availability_truncate ON Computer;
+CREATE TRIGGER computer_availability_insert AFTER INSERT ON Computer
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION computer_availability_trg();
+CREATE TRIGGER computer_availability_update AFTER UPDATE ON Computer
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION computer_availability_trg();
+CREATE TRIGGER computer_availability_delete AFTER DELETE ON Computer
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION computer_availability_trg();
+CREATE TRIGGER computer_availability_truncate AFTER TRUNCATE ON Computer
+    FOR EACH STATEMENT EXECUTE FUNCTION computer_availability_trg();
+
+SELECT refresh_computer_availability();
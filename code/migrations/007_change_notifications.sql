@@ -0,0 +1,50 @@
+-- Change notifications for cross-process cache invalidation. Every statement
+-- that changes rows in one of these tables sends NOTIFY changed_<table>
+-- (payload: the operation), delivered at commit and only if the transaction
+-- commits. Each app server process listens (code/listener.py) and drops its
+-- cached results that read the table, whichever process made the write:
+-- another Streamlit server, the kiosk API, or a batch job. Postgres folds
+-- identical notifications within a transaction, so a book drop of 1,000 ISBNs
+-- still sends one per table.
+--
+-- Statements that change no rows (a checkout of a book that is already out,
+-- an accrual run with nothing overdue) send nothing: each trigger sees the
+-- statement's rows as the transition table changed_rows and only notifies
+-- when it is non-empty. Transition tables allow one event per trigger and do
+-- not exist for TRUNCATE, hence four triggers per table.
+
+CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('changed_' || lower(TG_TABLE_NAME), TG_OP);
+    ELSIF EXISTS (SELECT 1 FROM changed_rows) THEN
+        PERFORM pg_notify('changed_' || lower(TG_TABLE_NAME), TG_OP);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Unquoted in schema.sql, so the tables' real names are lowercase
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['library_card', 'book', 'items', 'fine', 'computers_session', 'loan',
+                             'report_summary_status']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_notify_change', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_notify_insert', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_notify_update', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_notify_delete', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_notify_truncate', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()', t || '_notify_insert', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()', t || '_notify_update', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()', t || '_notify_delete', t);
+        EXECUTE format('CREATE TRIGGER %I AFTER TRUNCATE ON %I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()', t || '_notify_truncate', t);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,52 @@
+-- One canonical ISBN form everywhere: 13 digits, no hyphens or spaces, the
+-- form code/import_catalog.py produces and barcode scanners send. Seeded and
+-- hand-entered books were stored hyphenated (978-0-401-63263-5), so a catalog
+-- import matched none of them and inserted a bare-digit twin instead of
+-- updating the existing book.
+
+-- ISBN-10s become ISBN-13s; check digits are not validated here
+CREATE OR REPLACE FUNCTION normalize_isbn(isbn TEXT) RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN length(v) = 10 AND left(v, 9) ~ '^[0-9]{9}$' THEN
+            '978' || left(v, 9) || ((10 - (
+                SELECT sum(substr('978' || left(v, 9), i, 1)::int * CASE WHEN i % 2 = 1 THEN 1 ELSE 3 END)
+                FROM generate_series(1, 12) AS i
+            ) % 10) % 10)::text
+        ELSE v
+    END
+    FROM (SELECT upper(translate(isbn, '- ', '')) AS v) AS s
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Fines follow their book when its ISBN is rewritten
+ALTER TABLE Fine DROP CONSTRAINT IF EXISTS fine_isbn_fkey;
+ALTER TABLE Fine ADD CONSTRAINT fine_isbn_fkey FOREIGN KEY (isbn) REFERENCES Book (isbn) ON UPDATE CASCADE;
+
+-- Fold twins left by earlier imports into the original book: it takes the
+-- imported catalog fields, and the twin's loan if only the twin is on loan
+CREATE TEMP TABLE isbn_twins ON COMMIT DROP AS
+SELECT orig.isbn AS orig_isbn, dup.*
+FROM Book orig
+JOIN Book dup ON dup.isbn = normalize_isbn(orig.isbn) AND dup.isbn <> orig.isbn;
+
+UPDATE Book b
+SET title = t.title,
+    author = COALESCE(t.author, b.author),
+    condition = COALESCE(t.condition, b.condition),
+    purchase_date = COALESCE(t.purchase_date, b.purchase_date)
+FROM isbn_twins t
+WHERE b.isbn = t.orig_isbn;
+
+UPDATE Book b
+SET lib_card_id = t.lib_card_id, checkout_date = t.checkout_date,
+    due_date = t.due_date, checkout_status = t.checkout_status
+FROM isbn_twins t
+WHERE b.isbn = t.orig_isbn
+  AND b.checkout_status = 'Available'
+  AND t.checkout_status IS DISTINCT FROM 'Available';
+
+UPDATE Fine f SET isbn = t.orig_isbn FROM isbn_twins t WHERE f.isbn = t.isbn;
+UPDATE Loan l SET isbn = t.orig_isbn FROM isbn_twins t WHERE l.isbn = t.isbn;
+DELETE FROM Book b USING isbn_twins t WHERE b.isbn = t.isbn;
+
+UPDATE Book SET isbn = normalize_isbn(isbn) WHERE isbn <> normalize_isbn(isbn);
+UPDATE Loan SET isbn = normalize_isbn(isbn) WHERE isbn <> normalize_isbn(isbn);
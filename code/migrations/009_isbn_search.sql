@@ -0,0 +1,8 @@
+-- migrate: no-transaction
+-- ISBN fragments on the Book Search page match anywhere in the ISBN (as they
+-- did before 001), not just at the start. A trigram index serves the
+-- LIKE '%fragment%' lookups for fragments that few books share; for ones
+-- nearly every book shares (978...), the ISBN-ordered primary key scan stops
+-- as soon as a page is full. Needs pg_trgm (001).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS book_isbn_trgm_idx ON Book USING gin (isbn gin_trgm_ops);
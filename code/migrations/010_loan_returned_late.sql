@@ -0,0 +1,5 @@
+-- Loans returned after their due date, for the fine accrual job
+-- (code/accrue_fines.py) to charge the days between its last run and the
+-- return. Only late returns are indexed, a small share of all loans.
+
+CREATE INDEX IF NOT EXISTS loan_returned_late_idx ON Loan (returned_date) WHERE returned_date > due_date;
@@ -0,0 +1,9 @@
+-- migrate: no-transaction
+-- Book Search ranks title/author matches by word similarity. A trigram GiST
+-- index on title and author together (search.SEARCH_TEXT; the expression
+-- must stay identical) both filters with <% and returns the books nearest
+-- the term first (<<-> ordering), so a page of the best matches is read
+-- straight off the index however many books match. Needs pg_trgm (001).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS book_search_text_trgm_idx
+    ON Book USING gist ((title || ' ' || COALESCE(author, '')) gist_trgm_ops);
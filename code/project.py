@@ -1,7 +1,22 @@
+import functools
+import io
+import threading
+import time
+
 import streamlit as st
 import psycopg2
 import pandas as pd
 
+import browse
+import circulation
+import computers
+import db
+import export
+import instrumentation
+import listener
+import queries
+import search
+
 # Page Config
 st.set_page_config(
     page_title="Library Management System",
@@ -9,30 +24,438 @@ st.set_page_config(
     layout="wide"
 )
 
-# Database Connection
+# Database Connection Pool
+@st.cache_resource
+def init_pool():
+    pool_config = st.secrets.get("pool", {})
+    instrumentation_config = st.secrets.get("instrumentation", {})
+    recorder = None
+    if instrumentation_config.get("enabled", True):
+        recorder = instrumentation.QueryRecorder(
+            slow_ms=float(instrumentation_config.get("slow_query_ms", 500)),
+            explain_slow=bool(instrumentation_config.get("explain_slow", True)),
+        )
+    return db.ConnectionPool(
+        db.connect_kwargs(st.secrets["postgres"]),
+        minconn=int(pool_config.get("min_size", 1)),
+        maxconn=int(pool_config.get("max_size", 10)),
+        timeout=float(pool_config.get("timeout", 30)),
+        check_after=float(pool_config.get("check_after", 30)),
+        recorder=recorder,
+        prepared_cache_size=int(pool_config.get("prepared_cache_size", 32)),
+    )
+
+pool = init_pool()
+
+# Optional read replica: with a [postgres_replica] section (any connection key
+# it leaves out is taken from [postgres]), the Dashboard, Book Search, Member
+# Lookup, the reports, the admin table pages and exports read from the
+# replica. Checkout, Return and the Computers page stay on `pool`, and so does
+# any read until the replica has replayed the writes this process made or
+# heard about (invalidate_tables), or whenever it is down or too far behind.
 @st.cache_resource
-def init_connection():
-    return psycopg2.connect(
-        host=st.secrets["postgres"]["host"],
-        port=st.secrets["postgres"]["port"],
-        database=st.secrets["postgres"]["dbname"],
-        user=st.secrets["postgres"]["user"],
-        password=st.secrets["postgres"]["password"]
+def init_read_pool():
+    replica_config = st.secrets.get("postgres_replica")
+    if not replica_config:
+        return pool
+    pool_config = st.secrets.get("pool", {})
+    replica = db.ConnectionPool(
+        db.connect_kwargs({**st.secrets["postgres"], **replica_config}),
+        minconn=0,
+        maxconn=int(pool_config.get("max_size", 10)),
+        timeout=float(pool_config.get("timeout", 30)),
+        check_after=float(pool_config.get("check_after", 30)),
+        recorder=pool.recorder,
+        prepared_cache_size=int(pool_config.get("prepared_cache_size", 32)),
+    )
+    return db.ReadRouter(
+        pool,
+        replica,
+        max_lag=float(replica_config.get("max_lag_seconds", 10)),
+        check_every=float(replica_config.get("check_interval", 5)),
     )
 
-conn = init_connection()
+read_pool = init_read_pool()
 
-# Helper function to run queries
+# Helper function to run read queries into a DataFrame (see db.query for the
+# other result shapes)
 def run_query(query, params=None):
-    with conn.cursor() as cur:
-        cur.execute(query, params)
-        if query.strip().upper().startswith("SELECT"):
-            col_names = [desc[0] for desc in cur.description]
-            data = cur.fetchall()
-            return pd.DataFrame(data, columns=col_names)
-        else:
-            conn.commit()
-            return None
+    return db.dataframe(read_pool, query, params)
+
+# Dashboard metrics snapshot: every dashboard figure comes back from a single
+# query, is cached between reruns and is cleared whenever a table it reads
+# changes (see CACHE_DEPENDENCIES), so it can be kept for a long time.
+DASHBOARD_TTL = 600
+
+@st.cache_data(ttl=DASHBOARD_TTL)
+def load_dashboard_snapshot(generation=None):
+    snapshot = db.row(read_pool, queries.DASHBOARD_SNAPSHOT)
+    snapshot['recent_books'] = pd.DataFrame(
+        snapshot['recent_books'] or [], columns=['title', 'author', 'purchase_date']
+    )
+    return unless_stale(load_dashboard_snapshot, generation, snapshot)
+
+# Computer availability is pushed, not polled: one listener thread per server
+# process receives the NOTIFYs sent by the Computer_Availability triggers, and
+# open Dashboards re-read the in-memory counts every few seconds without
+# touching the database
+AVAILABILITY_REFRESH = 2
+
+@st.cache_resource
+def init_listener():
+    return listener.Listener(db.connect_kwargs(st.secrets["postgres"]))
+
+@st.cache_resource
+def init_availability_feed():
+    feed = computers.AvailabilityFeed(pool)
+    init_listener().subscribe(computers.AVAILABILITY_CHANNEL, feed.update)
+    return feed
+
+# Book Search and Member Lookup pages, cached per query/page like the reports
+SEARCH_TTL = 600
+
+@st.cache_data(ttl=SEARCH_TTL)
+def load_search_page(sql, params=None, generation=None):
+    return unless_stale(load_search_page, generation, run_query(sql, params))
+
+@st.cache_data(ttl=SEARCH_TTL)
+def load_member_page(member_search, after, generation=None):
+    return unless_stale(load_member_page, generation,
+                        circulation.lookup_members(read_pool, member_search, after, MEMBERS_PER_PAGE))
+
+def invalidate_circulation_caches():
+    invalidate_tables("Book", "Loan")
+
+# Exports stream from Postgres into memory (export.py): CSV via COPY TO
+# STDOUT, Parquet chunk by chunk from a server-side cursor, so no DataFrame of
+# the result is ever built. Streamlit can only serve a finished file, though,
+# so exports here stop at EXPORT_MAX_BYTES; larger ones go through the kiosk
+# API's /export endpoint or export.py, which stream to the client or a file.
+EXPORT_MAX_BYTES = 100 * 1024 * 1024
+
+def export_controls(name, sql, params=None):
+    with st.expander("⬇️ Export"):
+        formats = list(export.FORMATS) if export.pa is not None else [export.CSV]
+        fmt = st.radio("Format", formats, horizontal=True, key=f"{name}_export_format")
+        if st.button("Prepare export", key=f"{name}_export"):
+            started = time.monotonic()
+            with io.BytesIO() as buffer:
+                try:
+                    rows = export.export(read_pool, sql, params, export.LimitedFile(buffer, EXPORT_MAX_BYTES), fmt)
+                except export.ExportTooLarge:
+                    st.warning(f"This export is larger than {EXPORT_MAX_BYTES // 2**20} MB. Download it from the "
+                               f"kiosk API (GET /export/{name}) or with `python3 code/export.py {name}` instead.")
+                    return
+                data = buffer.getvalue()
+            st.download_button(f"Download {rows:,} rows ({time.monotonic() - started:.1f}s)", data,
+                               file_name=f"{name}.{fmt}", mime=export.FORMATS[fmt], key=f"{name}_download")
+
+# Admin table pages: filters, sorting and keyset paging run in SQL, so only one
+# page of rows is ever held in memory per session
+def show_table_browser(table, default_sort):
+    spec = browse.BROWSE_TABLES[table]
+    
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        filter_columns = st.multiselect("Filter columns", spec['columns'], key=f"{table}_filter_columns")
+    with col2:
+        sort_column = st.selectbox("Sort by", spec['columns'], index=spec['columns'].index(default_sort), key=f"{table}_sort")
+    with col3:
+        page_size = st.selectbox("Rows per page", [50, 100, 500], key=f"{table}_page_size")
+    descending = st.checkbox("Descending", key=f"{table}_descending")
+    
+    filters = {}
+    if filter_columns:
+        filter_cols = st.columns(len(filter_columns))
+        for column, filter_col in zip(filter_columns, filter_cols):
+            with filter_col:
+                value = st.text_input(f"{column} contains" if column in spec['text'] else f"{column} equals",
+                                      key=f"{table}_filter_{column}").strip()
+                if value:
+                    filters[column] = value
+    
+    # Start from the first page whenever the view changes
+    view_key = (table, tuple(sorted(filters.items())), sort_column, descending, page_size)
+    if st.session_state.get(f"{table}_view") != view_key:
+        st.session_state[f"{table}_view"] = view_key
+        st.session_state[f"{table}_cursors"] = [None]
+    cursors = st.session_state[f"{table}_cursors"]
+    
+    try:
+        rows = run_query(*browse.build_query(table, filters, sort_column, descending, page_size + 1, cursors[-1]))
+    except psycopg2.DataError as e:
+        st.error(f"Invalid filter value: {e.pgerror or e}")
+        return
+    
+    has_next = len(rows) > page_size
+    rows = rows.iloc[:page_size]
+    st.dataframe(rows, use_container_width=True)
+    # An unfiltered export in the default order comes out in storage order,
+    # sparing Postgres a sort of the whole table
+    export_sort = None if not filters and sort_column == default_sort and not descending else sort_column
+    export_controls(table, *export.table_export(table, filters, export_sort, descending))
+    
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if len(cursors) > 1 and st.button("⬅️ Previous", key=f"{table}_prev"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if has_next and st.button("Next ➡️", key=f"{table}_next"):
+            cursors.append(browse.cursor_after(table, rows, sort_column))
+            st.rerun()
+    with col3:
+        estimated = db.scalar(read_pool, browse.ESTIMATED_ROWS, (table.lower(),))
+        st.caption(f"Page {len(cursors)} · ~{estimated:,} rows in {table}")
+
+# Reports & Analytics: each report is a fragment, so its own controls (e.g.
+# the fine status filter) rerun just that report, and its result is cached
+# keyed by the SQL and parameters that produced it
+REPORT_TTL = 3600
+
+@st.cache_data(ttl=REPORT_TTL)
+def load_report(sql, params=None, generation=None):
+    return unless_stale(load_report, generation, run_query(sql, params))
+
+@st.cache_data(ttl=REPORT_TTL)
+def load_summary_status(generation=None):
+    status = {row['summary_table']: row for row in db.dataframe(read_pool, queries.SUMMARY_STATUS).to_dict('records')}
+    return unless_stale(load_summary_status, generation, status)
+
+def invalidate_report_caches():
+    invalidate_tables("Report_Summary_Status")
+
+# Cross-process cache coherence: migrations/007_change_notifications.sql makes
+# every write to these tables NOTIFY changed_<table> at commit, whichever
+# process made it (another Streamlit server behind the load balancer, the
+# kiosk API, the fine accrual job), and each server process's listener clears
+# the caches that read the table. Writes made here clear them directly too, so
+# the page that made the change never waits for its own notification. The
+# TTLs above only bound staleness while a listener is reconnecting. Either way
+# the reloads wait for the read replica to replay the change (or use pool).
+#
+# Clearing alone would race with a load already running: it would finish after
+# the clear and store the pre-write result for the whole TTL. So each table
+# also has a generation, bumped by invalidate_tables(); the cached loaders are
+# called through load_current(), which passes the generation of the tables
+# they read as part of the cache key, and a loader whose tables changed while
+# it ran raises StaleLoad instead of returning (st.cache_data does not store
+# exceptions), after which load_current() loads again.
+CACHE_DEPENDENCIES = {
+    "Book": [load_dashboard_snapshot, load_search_page, load_member_page, load_report, load_summary_status],
+    "Library_Card": [load_dashboard_snapshot, load_member_page, load_report],
+    "Fine": [load_member_page, load_report, load_summary_status],
+    "Computers_Session": [load_member_page, load_report, load_summary_status],
+    "Loan": [load_report],
+    "Report_Summary_Status": [load_report, load_summary_status],
+}
+
+class StaleLoad(Exception):
+    """A table the loader reads changed while it ran; its result must not be cached."""
+
+# Loads retried before answering without the cache
+LOAD_ATTEMPTS = 3
+
+@st.cache_resource
+def init_table_generations():
+    return {'lock': threading.Lock(), 'tables': dict.fromkeys(CACHE_DEPENDENCIES, 0)}
+
+def cache_generation(loader):
+    generations = init_table_generations()['tables']
+    return tuple(generations[table] for table, caches in CACHE_DEPENDENCIES.items() if loader in caches)
+
+def unless_stale(loader, generation, result):
+    if generation is not None and cache_generation(loader) != generation:
+        raise StaleLoad()
+    return result
+
+def load_current(loader, *args):
+    for _ in range(LOAD_ATTEMPTS):
+        try:
+            return loader(*args, generation=cache_generation(loader))
+        except StaleLoad:
+            pass
+    # Writes keep overtaking the load; the result cached under generation None
+    # is never looked up again
+    return loader(*args, generation=None)
+
+def invalidate_tables(*tables):
+    if read_pool is not pool:
+        read_pool.mark_write()
+    generations = init_table_generations()
+    with generations['lock']:
+        for table in tables:
+            generations['tables'][table] += 1
+    cleared = []
+    for table in tables:
+        for cache in CACHE_DEPENDENCIES[table]:
+            if cache not in cleared:
+                cache.clear()
+                cleared.append(cache)
+
+@st.cache_resource
+def init_cache_invalidation():
+    subscriber = init_listener()
+    for table in CACHE_DEPENDENCIES:
+        subscriber.subscribe(listener.table_channel(table),
+                             lambda channel, payload, table=table: invalidate_tables(table))
+    return subscriber
+
+# Fragment reruns skip the page selection below, so each report names its page
+# for the query instrumentation itself
+def report_fragment(func):
+    @st.fragment
+    @functools.wraps(func)
+    def run():
+        instrumentation.set_page("Reports & Analytics")
+        func()
+    return run
+
+# Staleness indicator for reports served from trigger-maintained summary tables
+def show_summary_status(report):
+    status = load_current(load_summary_status).get(queries.REPORT_SUMMARY_TABLES[report])
+    if status is None or pd.isna(status['last_rebuilt']):
+        st.warning("Summary table has never been built; an admin can rebuild it above.")
+        return
+    last_change = status['last_rebuilt'] if pd.isna(status['last_change']) else status['last_change']
+    st.caption(f"🟢 Live summary, updated incrementally · last change {last_change:%Y-%m-%d %H:%M:%S} "
+               f"· last full rebuild {status['last_rebuilt']:%Y-%m-%d %H:%M:%S}")
+
+@report_fragment
+def top_borrowers_report():
+    st.subheader("Members with Most Checkouts")
+    st.markdown("**Query Type:** JOIN + GROUP BY")
+    st.markdown("**Tables Involved:** Library_Card, Book (via Borrower_Summary), Loan")
+    st.markdown("Shows members ranked by number of books checked out, now or over a recent period")
+
+    period = st.radio("Period:", list(queries.TOP_BORROWER_PERIODS), horizontal=True)
+
+    # Query 1: Member with Most Checkouts (GROUP BY + JOIN)
+    result1 = load_current(load_report, *queries.top_borrowers(period))
+    export_controls("top_borrowers", *queries.top_borrowers(period))
+    if queries.TOP_BORROWER_PERIODS[period] is None:
+        show_summary_status("top_borrowers")
+
+    if not result1.empty:
+        st.dataframe(result1, use_container_width=True)
+
+        # Show summary stats
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Active Borrowers", len(result1))
+        with col2:
+            st.metric("Max Books Out", result1['num_books_checked_out'].max())
+        with col3:
+            st.metric("Avg Books/Borrower", f"{result1['num_books_checked_out'].mean():.2f}")
+    else:
+        st.info("No active checkouts found.")
+
+@report_fragment
+def member_fines_report():
+    st.subheader("Total Fines by Member")
+    st.markdown("**Query Type:** JOIN + GROUP BY")
+    st.markdown("**Tables Involved:** Library_Card, Fine (via Member_Fine_Summary)")
+    st.markdown("Displays members with outstanding or paid fines, aggregated by member")
+
+    # Filter options
+    fine_status_filter = st.radio("Filter by Fine Status:", ["All", "Outstanding", "Paid"], horizontal=True)
+
+    # Query 2: Total Fines by Member (GROUP BY + JOIN)
+    result2 = load_current(load_report, *queries.member_fines(fine_status_filter))
+    export_controls("member_fines", *queries.member_fines(fine_status_filter))
+    show_summary_status("member_fines")
+
+    if not result2.empty:
+        st.dataframe(result2, use_container_width=True)
+
+        # Summary metrics
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Total Fines Recorded", f"${result2['total_fines'].sum():.2f}")
+        with col2:
+            if 'outstanding_amount' in result2.columns:
+                st.metric("Total Outstanding", f"${result2['outstanding_amount'].sum():.2f}")
+            else:
+                st.metric("Members with Fines", len(result2))
+    else:
+        st.info(f"No {fine_status_filter.lower()} fines found.")
+
+@report_fragment
+def active_checkouts_report():
+    st.subheader("Currently Checked Out Books with Member Information")
+    st.markdown("**Query Type:** JOIN")
+    st.markdown("**Tables Involved:** Book, Library_Card")
+    st.markdown("Lists all checked-out books along with borrower details and due dates")
+
+    # Query 3: Books Checked Out with Member Info (JOIN)
+    result3 = load_current(load_report, queries.ACTIVE_CHECKOUTS)
+    export_controls("active_checkouts", queries.ACTIVE_CHECKOUTS)
+
+    if not result3.empty:
+        st.dataframe(result3, use_container_width=True)
+        st.metric("Total Books Checked Out", len(result3))
+    else:
+        st.info("No books currently checked out.")
+
+@report_fragment
+def computer_usage_report():
+    st.subheader("Computer Sessions by Card Type")
+    st.markdown("**Query Type:** JOIN + GROUP BY")
+    st.markdown("**Tables Involved:** Library_Card, Computers_Session (via Card_Type_Session_Summary)")
+    st.markdown("Analyzes computer usage patterns across different membership types")
+
+    # Query 4: Computer Sessions by Card Type (GROUP BY + JOIN)
+    result4 = load_current(load_report, queries.COMPUTER_USAGE)
+    export_controls("computer_usage", queries.COMPUTER_USAGE)
+    show_summary_status("computer_usage")
+
+    if not result4.empty:
+        st.dataframe(result4, use_container_width=True)
+
+        # Visualization
+        st.markdown("#### Session Distribution by Card Type")
+        chart_data = result4.set_index('card_type')['total_active_sessions']
+        st.bar_chart(chart_data)
+    else:
+        st.info("No computer session data available.")
+
+@report_fragment
+def overdue_books_report():
+    st.subheader("Overdue Books with Member Contact Information")
+    st.markdown("**Query Type:** JOIN with Date Filtering")
+    st.markdown("**Tables Involved:** Loan, Book, Library_Card")
+    st.markdown("Shows all overdue books with borrower details for follow-up")
+
+    # Query 5: Overdue Books with Member Contact (JOIN)
+    result5 = load_current(load_report, queries.OVERDUE_BOOKS)
+    export_controls("overdue_books", queries.OVERDUE_BOOKS)
+
+    if not result5.empty:
+        st.warning(f"⚠️ {len(result5)} overdue book(s) found!")
+        st.dataframe(result5, use_container_width=True)
+
+        # Calculate potential fines (assuming $0.50/day)
+        total_days_overdue = result5['days_overdue'].sum()
+        potential_fines = total_days_overdue * 0.50
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Total Days Overdue", int(total_days_overdue))
+        with col2:
+            st.metric("Potential Fines (@$0.50/day)", f"${potential_fines:.2f}")
+    else:
+        st.success("✅ No overdue books!")
+
+REPORTS = {
+    "📚 Top Borrowers": top_borrowers_report,
+    "💰 Member Fines": member_fines_report,
+    "📖 Active Checkouts": active_checkouts_report,
+    "💻 Computer Usage": computer_usage_report,
+    "⏰ Overdue Books": overdue_books_report,
+}
+
+# Member Lookup expands at most this many members per page
+MEMBERS_PER_PAGE = 10
 
 # Sidebar Navigation
 st.sidebar.title("Navigation")
@@ -61,381 +484,392 @@ else:
         st.rerun()
     st.sidebar.success("Logged in as Admin")
 
+    with st.sidebar.expander("Connection Pool"):
+        pool_stats = pool.stats()
+        st.metric("In Use", f"{pool_stats['in_use']} / {pool_stats['maxconn']}")
+        st.metric("Waiting", pool_stats['waiting'])
+        st.metric("Avg Wait", f"{pool_stats['avg_wait'] * 1000:.1f} ms")
+        st.metric("Prepared Statement Hit Rate", f"{pool_stats['prepared_hit_rate']:.0%}")
+        st.json(pool_stats)
+
+    with st.sidebar.expander("Cache Invalidation"):
+        st.json(init_listener().stats())
+
+    if read_pool is not pool:
+        with st.sidebar.expander("Read Replica"):
+            replica_stats = read_pool.stats()
+            st.metric("Status", "Healthy" if replica_stats['replica_healthy'] else "Using primary")
+            st.metric("Lag", f"{replica_stats['lag_seconds'] or 0:.1f} s")
+            st.metric("Reads on Replica", f"{replica_stats['replica_share']:.0%}")
+            st.json(replica_stats)
+
 # Define Pages
-pages = ["Dashboard", "Book Search", "Member Lookup", "Checkout", "Return", "Reports & Analytics"]
+pages = ["Dashboard", "Book Search", "Member Lookup", "Checkout", "Return", "Computers", "Reports & Analytics"]
 if st.session_state['is_admin']:
     pages.extend(["All Members", "All Books"])
+    if pool.recorder is not None:
+        pages.append("Query Stats")
 
 page = st.sidebar.radio("Go to", pages)
+instrumentation.set_page(page)
+init_cache_invalidation()
 
 if page == "Dashboard":
     st.title("📚 Library Dashboard")
     
-    # Key Metrics
-    col1, col2, col3, col4, col5 = st.columns(5)
-    
-    with col1:
-        total_books = run_query("SELECT COUNT(*) FROM Book").iloc[0, 0]
-        st.metric("Total Books", total_books)
-        
-    with col2:
-        active_members = run_query("SELECT COUNT(*) FROM Library_Card WHERE status = 'Active'").iloc[0, 0]
-        st.metric("Active Members", active_members)
+    @st.fragment(run_every=AVAILABILITY_REFRESH)
+    def dashboard_metrics():
+        instrumentation.set_page("Dashboard")
+        snapshot = load_current(load_dashboard_snapshot)
+        counts, _ = init_availability_feed().snapshot()
+
+        # Key Metrics
+        col1, col2, col3, col4, col5 = st.columns(5)
         
-    with col3:
-        checked_out = run_query("SELECT COUNT(*) FROM Book WHERE checkout_status = 'Checked Out'").iloc[0, 0]
-        st.metric("Books Checked Out", checked_out)
-
-    with col4:
-        active_sessions = run_query("SELECT COUNT(*) FROM Computers_Session").iloc[0, 0]
-        st.metric("Active Computer Sessions", active_sessions)
-
-    with col5:
-        # Taking the most recent value for remaining computers
-        computers_avail = run_query("SELECT remaining_computers FROM Computers_Session ORDER BY session_id DESC LIMIT 1")
-        if not computers_avail.empty:
-            st.metric("Computers Avail", computers_avail.iloc[0, 0])
-        else:
-            st.metric("Computers Avail", "N/A")
+        with col1:
+            st.metric("Total Books", snapshot['total_books'])
+            
+        with col2:
+            st.metric("Active Members", snapshot['active_members'])
+            
+        with col3:
+            st.metric("Books Checked Out", snapshot['checked_out'])
+
+        with col4:
+            st.metric("Active Computer Sessions", counts['in_use'])
+
+        with col5:
+            st.metric("Computers Avail", f"{counts['available']} / {counts['total']}")
+
+    dashboard_metrics()
 
     st.markdown("---")
     
     # Recent Activity or Overview
     st.subheader("Recent Books Added")
-    recent_books = run_query("SELECT title, author, purchase_date FROM Book ORDER BY purchase_date DESC LIMIT 5")
-    st.table(recent_books)
+    st.table(load_current(load_dashboard_snapshot)['recent_books'])
 
 elif page == "Book Search":
     st.title("🔍 Book Search")
     
-    search_term = st.text_input("Search by Title, Author, or ISBN")
+    search_term = st.text_input("Search by Title, Author, or ISBN").strip()
+    page_size = st.selectbox("Results per page", [25, 50, 100])
+    
+    # Keyset pagination: keep the cursor each visited page started from, and
+    # start over whenever the search term or page size changes
+    search_key = (search_term, page_size)
+    if st.session_state.get('search_key') != search_key:
+        st.session_state['search_key'] = search_key
+        st.session_state['search_mode'] = search.search_mode(search_term)
+        st.session_state['search_cursors'] = [None]
+    cursors = st.session_state['search_cursors']
+    
+    results = load_current(load_search_page, *search.build_query(search_term, st.session_state['search_mode'], page_size + 1, cursors[-1]))
+    while results.empty and st.session_state['search_mode'] in search.FALLBACK_MODES and len(cursors) == 1:
+        # Digits that start no ISBN may be inside one, or part of a title (e.g. "1984")
+        st.session_state['search_mode'] = search.FALLBACK_MODES[st.session_state['search_mode']]
+        results = load_current(load_search_page, *search.build_query(search_term, st.session_state['search_mode'], page_size + 1))
+    mode = st.session_state['search_mode']
+    
+    has_next = len(results) > page_size
+    results = results.iloc[:page_size]
+    
+    if not search_term:
+        st.subheader("All Books")
     
-    if search_term:
-        query = """
-            SELECT isbn, title, author, condition, checkout_status 
-            FROM Book 
-            WHERE title ILIKE %s OR author ILIKE %s OR isbn ILIKE %s
-        """
-        search_pattern = f"%{search_term}%"
-        results = run_query(query, (search_pattern, search_pattern, search_pattern))
+    if not results.empty:
+        st.dataframe(results.drop(columns=['distance'], errors='ignore'), use_container_width=True)
         
-        if not results.empty:
-            st.dataframe(results, use_container_width=True)
-        else:
-            st.info("No books found matching your search.")
+        col1, col2, col3 = st.columns([1, 1, 4])
+        with col1:
+            if len(cursors) > 1 and st.button("⬅️ Previous"):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            if has_next and st.button("Next ➡️"):
+                cursors.append(search.cursor_after(results, mode))
+                st.rerun()
+        with col3:
+            st.caption(f"Page {len(cursors)}")
     else:
-        # Show all books by default (limit to 50)
-        st.subheader("All Books")
-        all_books = run_query("SELECT isbn, title, author, condition, checkout_status FROM Book LIMIT 50")
-        st.dataframe(all_books, use_container_width=True)
+        st.info("No books found matching your search.")
 
 elif page == "Member Lookup":
     st.title("👤 Member Lookup")
     
-    member_search = st.text_input("Search by Name or Card ID")
+    member_search = st.text_input("Search by Name or Card ID").strip()
     
     if member_search:
-        # Try to parse as ID if it's a number, otherwise search name
-        if member_search.isdigit():
-            query = "SELECT * FROM Library_Card WHERE card_id = %s"
-            params = (int(member_search),)
-        else:
-            query = "SELECT * FROM Library_Card WHERE name ILIKE %s"
-            params = (f"%{member_search}%",)
-            
-        members = run_query(query, params)
+        # Members are paged by card_id; start over when the search changes
+        if st.session_state.get('member_search') != member_search:
+            st.session_state['member_search'] = member_search
+            st.session_state['member_cursors'] = [0]
+        cursors = st.session_state['member_cursors']
+        
+        # One round trip per page: sessions, checkouts and fines for every
+        # matched member are aggregated alongside the member rows
+        members, has_next = load_current(load_member_page, member_search, cursors[-1])
         
-        if not members.empty:
-            for _, member in members.iterrows():
+        if members:
+            for member in members:
                 with st.expander(f"{member['name']} (ID: {member['card_id']}) - {member['status']}"):
                     st.write(f"**Type:** {member['card_type']}")
                     st.write(f"**DOB:** {member['dob']}")
                     
                     # Show computer session info
-                    comp_session = run_query("SELECT num_of_sessions FROM Computers_Session WHERE card_id = %s", (member['card_id'],))
-                    sessions_used = comp_session.iloc[0, 0] if not comp_session.empty else 0
-                    st.write(f"**Computer Sessions Used:** {sessions_used}")
+                    st.write(f"**Computer Sessions Used:** {member['sessions_used']}")
                     
                     # Show current checkouts
-                    checkouts = run_query("""
-                        SELECT title, due_date 
-                        FROM Book 
-                        WHERE lib_card_id = %s AND checkout_status = 'Checked Out'
-                    """, (member['card_id'],))
-                    
-                    if not checkouts.empty:
+                    if member['checkouts']:
                         st.subheader("Current Checkouts")
-                        st.table(checkouts)
+                        st.table(pd.DataFrame(member['checkouts'], columns=['title', 'due_date']))
                     else:
                         st.write("No active checkouts.")
                         
                     # Show fines
-                    fines = run_query("SELECT amount, status FROM Fine WHERE card_id = %s", (member['card_id'],))
-                    if not fines.empty:
+                    if member['fines']:
                         st.subheader("Fines")
-                        st.table(fines)
+                        st.table(pd.DataFrame(member['fines'], columns=['amount', 'status']))
+            
+            col1, col2, col3 = st.columns([1, 1, 4])
+            with col1:
+                if len(cursors) > 1 and st.button("⬅️ Previous"):
+                    cursors.pop()
+                    st.rerun()
+            with col2:
+                if has_next and st.button("Next ➡️"):
+                    cursors.append(members[-1]['card_id'])
+                    st.rerun()
+            with col3:
+                st.caption(f"Page {len(cursors)} ({MEMBERS_PER_PAGE} members per page)")
         else:
             st.warning("No members found.")
 
 elif page == "Checkout":
     st.title("📖 Checkout Book")
     
+    checkout_mode = st.radio("Mode", ["Single Book", "Cart"], horizontal=True)
+    
     with st.form("checkout_form"):
-        isbn = st.text_input("Book ISBN")
         card_id = st.text_input("Library Card ID")
+        if checkout_mode == "Single Book":
+            isbns = [st.text_input("Book ISBN")]
+        else:
+            isbns = st.text_area("Scan ISBNs (one per line)", height=200).splitlines()
+        isbns = circulation.unique_isbns(isbns)
         submitted = st.form_submit_button("Checkout")
         
         if submitted:
-            if not isbn or not card_id:
+            if not isbns or not card_id:
                 st.error("Please provide both ISBN and Card ID.")
+            elif not card_id.strip().isdigit():
+                st.error("Library Card not found.")
             else:
-                # Check if book exists and is available
-                book_check = run_query("SELECT checkout_status, title FROM Book WHERE isbn = %s", (isbn,))
+                # Validation and the UPDATE happen in one statement, so two
+                # clerks can never both check out the same copy
+                results = circulation.checkout_books(pool, int(card_id), isbns)
+                if any(r['outcome'] == circulation.CHECKED_OUT for r in results):
+                    invalidate_circulation_caches()
                 
-                if book_check.empty:
-                    st.error("Book not found.")
-                elif book_check.iloc[0]['checkout_status'] == 'Checked Out':
-                    st.error(f"'{book_check.iloc[0]['title']}' is already checked out.")
+                if checkout_mode == "Single Book":
+                    result = results[0]
+                    if result['outcome'] == circulation.CHECKED_OUT:
+                        st.success(f"Successfully checked out '{result['title']}' to {result['borrower']}!")
+                    else:
+                        st.error(circulation.describe_checkout(result))
                 else:
-                    # Check if card exists and is active
-                    card_check = run_query("SELECT status, name FROM Library_Card WHERE card_id = %s", (card_id,))
-                    
-                    if card_check.empty:
-                        st.error("Library Card not found.")
-                    elif card_check.iloc[0]['status'] != 'Active':
-                        st.error(f"Card for {card_check.iloc[0]['name']} is not Active (Status: {card_check.iloc[0]['status']}).")
+                    checked_out = sum(r['outcome'] == circulation.CHECKED_OUT for r in results)
+                    if checked_out == len(results):
+                        st.success(f"Checked out all {checked_out} book(s)!")
                     else:
-                        # Perform Checkout
-                        from datetime import datetime, timedelta
-                        checkout_date = datetime.now().date()
-                        due_date = checkout_date + timedelta(days=14)
-                        
-                        run_query("""
-                            UPDATE Book 
-                            SET lib_card_id = %s, checkout_date = %s, due_date = %s, checkout_status = 'Checked Out'
-                            WHERE isbn = %s
-                        """, (card_id, checkout_date, due_date, isbn))
-                        
-                        st.success(f"Successfully checked out '{book_check.iloc[0]['title']}' to {card_check.iloc[0]['name']}!")
+                        st.warning(f"Checked out {checked_out} of {len(results)} book(s).")
+                    st.table(pd.DataFrame({
+                        'isbn': [r['isbn'] for r in results],
+                        'title': [r['title'] for r in results],
+                        'result': [circulation.describe_checkout(r) for r in results],
+                    }))
 
 elif page == "Return":
     st.title("🔙 Return Book")
     
-    with st.form("return_form"):
-        isbn = st.text_input("Book ISBN")
-        submitted = st.form_submit_button("Return")
-        
-        if submitted:
-            if not isbn:
-                st.error("Please provide an ISBN.")
-            else:
-                # Check if book exists and is checked out
-                book_check = run_query("SELECT checkout_status, title FROM Book WHERE isbn = %s", (isbn,))
+    return_mode = st.radio("Mode", ["Single Book", "Book Drop (Bulk)"], horizontal=True)
+    
+    if return_mode == "Single Book":
+        with st.form("return_form"):
+            isbn = st.text_input("Book ISBN").strip()
+            submitted = st.form_submit_button("Return")
+            
+            if submitted:
+                if not isbn:
+                    st.error("Please provide an ISBN.")
+                else:
+                    result = circulation.return_books(pool, [isbn])[0]
+                    
+                    if result['outcome'] == circulation.NOT_FOUND:
+                        st.error("Book not found.")
+                    elif result['outcome'] == circulation.ALREADY_AVAILABLE:
+                        st.info(f"'{result['title']}' is already marked as Available.")
+                    else:
+                        invalidate_circulation_caches()
+                        st.success(f"Successfully returned '{result['title']}'!")
+                        if result['days_overdue']:
+                            st.warning(f"Returned {result['days_overdue']} day(s) late.")
+    else:
+        with st.form("bulk_return_form"):
+            scanned = st.text_area("Scan or paste ISBNs (one per line)", height=200)
+            uploaded = st.file_uploader("...or upload a TXT/CSV file of ISBNs", type=["txt", "csv"])
+            submitted = st.form_submit_button("Return All")
+            
+            if submitted:
+                text = scanned
+                if uploaded is not None:
+                    text += "\n" + uploaded.getvalue().decode("utf-8", errors="replace")
+                isbns = circulation.parse_isbn_list(text)
                 
-                if book_check.empty:
-                    st.error("Book not found.")
-                elif book_check.iloc[0]['checkout_status'] == 'Available':
-                    st.info(f"'{book_check.iloc[0]['title']}' is already marked as Available.")
+                if not isbns:
+                    st.error("Please provide at least one ISBN.")
                 else:
-                    # Perform Return
-                    run_query("""
-                        UPDATE Book 
-                        SET lib_card_id = NULL, checkout_date = NULL, due_date = NULL, checkout_status = 'Available'
-                        WHERE isbn = %s
-                    """, (isbn,))
+                    # The whole book drop is processed in one statement
+                    results = pd.DataFrame(circulation.return_books(pool, isbns))
+                    counts = results['outcome'].value_counts()
+                    if counts.get(circulation.RETURNED, 0):
+                        invalidate_circulation_caches()
                     
-                    st.success(f"Successfully returned '{book_check.iloc[0]['title']}'!")
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Returned", int(counts.get(circulation.RETURNED, 0)))
+                    with col2:
+                        st.metric("Already Available", int(counts.get(circulation.ALREADY_AVAILABLE, 0)))
+                    with col3:
+                        st.metric("Not Found", int(counts.get(circulation.NOT_FOUND, 0)))
+                    with col4:
+                        st.metric("Returned Late", int((results['days_overdue'].fillna(0) > 0).sum()))
+                    st.dataframe(results, use_container_width=True)
+
+elif page == "Computers":
+    st.title("💻 Computer Sessions")
+
+    counts, _ = init_availability_feed().snapshot()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Available", counts['available'])
+    with col2:
+        st.metric("In Use", counts['in_use'])
+    with col3:
+        st.metric("Total", counts['total'])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        with st.form("start_session_form"):
+            st.subheader("Start Session")
+            card_id = st.text_input("Library Card ID")
+            computer_id = st.text_input("Computer ID (optional)")
+            submitted = st.form_submit_button("Start")
+
+            if submitted:
+                if not card_id.strip().isdigit() or (computer_id.strip() and not computer_id.strip().isdigit()):
+                    st.error("Card ID and Computer ID must be numbers.")
+                else:
+                    result = computers.start_session(
+                        pool, int(card_id), int(computer_id) if computer_id.strip() else None)
+                    outcome = result['outcome']
+                    if outcome == computers.STARTED:
+                        st.success(f"{result['borrower']} is on {result['computer']}.")
+                    elif outcome == computers.CARD_NOT_FOUND:
+                        st.error("Library Card not found.")
+                    elif outcome == computers.CARD_INACTIVE:
+                        st.error(f"Card for {result['borrower']} is not Active (Status: {result['card_status']}).")
+                    elif outcome == computers.ALREADY_IN_SESSION:
+                        st.warning(f"This card is already using {result['computer'] or 'a computer'}.")
+                    else:
+                        st.warning("No computer available." if not computer_id.strip()
+                                   else "That computer is not available.")
+    with col2:
+        with st.form("end_session_form"):
+            st.subheader("End Session")
+            card_id = st.text_input("Library Card ID or Computer ID")
+            by_computer = st.checkbox("This is a Computer ID")
+            submitted = st.form_submit_button("End")
+
+            if submitted:
+                if not card_id.strip().isdigit():
+                    st.error("Please enter a number.")
+                else:
+                    if by_computer:
+                        ended = computers.end_session(pool, computer_id=int(card_id))
+                    else:
+                        ended = computers.end_session(pool, card_id=int(card_id))
+                    if ended:
+                        # Session tallies feed Member Lookup and Computer Usage
+                        invalidate_tables("Computers_Session")
+                        for session in ended:
+                            st.success(f"Ended session on {session['computer']} "
+                                       f"({int(session['duration'].total_seconds() // 60)} min).")
+                    else:
+                        st.info("No session in progress.")
+
+    st.subheader("Inventory")
+    st.dataframe(computers.computers(pool), use_container_width=True)
 
 elif page == "Reports & Analytics":
     st.title("📊 Reports & Analytics")
     st.markdown("### Advanced queries with JOINs and GROUP BY operations")
     
-    # Create tabs for different reports
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📚 Top Borrowers", 
-        "💰 Member Fines", 
-        "📖 Active Checkouts",
-        "💻 Computer Usage",
-        "⏰ Overdue Books"
-    ])
-    
-    with tab1:
-        st.subheader("Members with Most Checkouts")
-        st.markdown("**Query Type:** JOIN + GROUP BY")
-        st.markdown("**Tables Involved:** Library_Card, Book")
-        st.markdown("Shows members ranked by number of currently checked-out books")
-        
-        # Query 1: Member with Most Checkouts (GROUP BY + JOIN)
-        query1 = """
-            SELECT lc.card_id, lc.name, lc.card_type, COUNT(b.isbn) as num_books_checked_out
-            FROM Library_Card lc
-            JOIN Book b ON lc.card_id = b.lib_card_id
-            WHERE b.checkout_status = 'Checked Out'
-            GROUP BY lc.card_id, lc.name, lc.card_type
-            ORDER BY num_books_checked_out DESC
-            LIMIT 15
-        """
-        result1 = run_query(query1)
-        
-        if not result1.empty:
-            st.dataframe(result1, use_container_width=True)
-            
-            # Show summary stats
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Total Active Borrowers", len(result1))
-            with col2:
-                st.metric("Max Books Out", result1['num_books_checked_out'].max())
-            with col3:
-                st.metric("Avg Books/Borrower", f"{result1['num_books_checked_out'].mean():.2f}")
-        else:
-            st.info("No active checkouts found.")
-    
-    with tab2:
-        st.subheader("Total Fines by Member")
-        st.markdown("**Query Type:** JOIN + GROUP BY + HAVING")
-        st.markdown("**Tables Involved:** Library_Card, Fine")
-        st.markdown("Displays members with outstanding or paid fines, aggregated by member")
-        
-        # Filter options
-        fine_status_filter = st.radio("Filter by Fine Status:", ["All", "Outstanding", "Paid"], horizontal=True)
-        
-        # Query 2: Total Fines by Member (GROUP BY + JOIN)
-        if fine_status_filter == "All":
-            query2 = """
-                SELECT lc.card_id, lc.name, lc.card_type, 
-                       SUM(f.amount) as total_fines,
-                       COUNT(f.fine_id) as num_fines,
-                       SUM(CASE WHEN f.status = 'Outstanding' THEN f.amount ELSE 0 END) as outstanding_amount
-                FROM Library_Card lc
-                JOIN Fine f ON lc.card_id = f.card_id
-                GROUP BY lc.card_id, lc.name, lc.card_type
-                ORDER BY total_fines DESC
-            """
-        else:
-            query2 = f"""
-                SELECT lc.card_id, lc.name, lc.card_type, 
-                       SUM(f.amount) as total_fines,
-                       COUNT(f.fine_id) as num_fines
-                FROM Library_Card lc
-                JOIN Fine f ON lc.card_id = f.card_id
-                WHERE f.status = '{fine_status_filter}'
-                GROUP BY lc.card_id, lc.name, lc.card_type
-                HAVING SUM(f.amount) > 0
-                ORDER BY total_fines DESC
-            """
-        
-        result2 = run_query(query2)
-        
-        if not result2.empty:
-            st.dataframe(result2, use_container_width=True)
-            
-            # Summary metrics
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric("Total Fines Recorded", f"${result2['total_fines'].sum():.2f}")
-            with col2:
-                if 'outstanding_amount' in result2.columns:
-                    st.metric("Total Outstanding", f"${result2['outstanding_amount'].sum():.2f}")
-                else:
-                    st.metric("Members with Fines", len(result2))
-        else:
-            st.info(f"No {fine_status_filter.lower()} fines found.")
+    if st.session_state['is_admin'] and st.button("🔄 Rebuild report summaries"):
+        db.query(pool, queries.REBUILD_SUMMARIES, shape=db.SCALAR, write=True)
+        invalidate_report_caches()
+        st.success("Report summaries rebuilt.")
     
-    with tab3:
-        st.subheader("Currently Checked Out Books with Member Information")
-        st.markdown("**Query Type:** JOIN")
-        st.markdown("**Tables Involved:** Book, Library_Card")
-        st.markdown("Lists all checked-out books along with borrower details and due dates")
-        
-        # Query 3: Books Checked Out with Member Info (JOIN)
-        query3 = """
-            SELECT b.isbn, b.title, b.author, lc.name as borrower, 
-                   lc.card_id, b.checkout_date, b.due_date,
-                   CURRENT_DATE - b.due_date as days_until_due
-            FROM Book b
-            JOIN Library_Card lc ON b.lib_card_id = lc.card_id
-            WHERE b.checkout_status = 'Checked Out'
-            ORDER BY b.due_date ASC
-        """
-        result3 = run_query(query3)
-        
-        if not result3.empty:
-            st.dataframe(result3, use_container_width=True)
-            st.metric("Total Books Checked Out", len(result3))
-        else:
-            st.info("No books currently checked out.")
-    
-    with tab4:
-        st.subheader("Computer Sessions by Card Type")
-        st.markdown("**Query Type:** JOIN + GROUP BY")
-        st.markdown("**Tables Involved:** Library_Card, Computers_Session")
-        st.markdown("Analyzes computer usage patterns across different membership types")
-        
-        # Query 4: Computer Sessions by Card Type (GROUP BY + JOIN)
-        query4 = """
-            SELECT lc.card_type, 
-                   COUNT(cs.session_id) as total_active_sessions,
-                   AVG(cs.num_of_sessions) as avg_sessions_per_member,
-                   SUM(cs.num_of_sessions) as total_sessions_all_time
-            FROM Library_Card lc
-            JOIN Computers_Session cs ON lc.card_id = cs.card_id
-            GROUP BY lc.card_type
-            ORDER BY total_active_sessions DESC
-        """
-        result4 = run_query(query4)
-        
-        if not result4.empty:
-            st.dataframe(result4, use_container_width=True)
-            
-            # Visualization
-            st.markdown("#### Session Distribution by Card Type")
-            chart_data = result4.set_index('card_type')['total_active_sessions']
-            st.bar_chart(chart_data)
-        else:
-            st.info("No computer session data available.")
-    
-    with tab5:
-        st.subheader("Overdue Books with Member Contact Information")
-        st.markdown("**Query Type:** JOIN with Date Filtering")
-        st.markdown("**Tables Involved:** Book, Library_Card")
-        st.markdown("Shows all overdue books with borrower details for follow-up")
-        
-        # Query 5: Overdue Books with Member Contact (JOIN)
-        query5 = """
-            SELECT b.isbn, b.title, b.author, lc.card_id, lc.name as borrower, 
-                   lc.card_type, b.checkout_date, b.due_date,
-                   CURRENT_DATE - b.due_date as days_overdue
-            FROM Book b
-            JOIN Library_Card lc ON b.lib_card_id = lc.card_id
-            WHERE b.checkout_status = 'Checked Out' 
-              AND b.due_date < CURRENT_DATE
-            ORDER BY days_overdue DESC
-        """
-        result5 = run_query(query5)
-        
-        if not result5.empty:
-            st.warning(f"⚠️ {len(result5)} overdue book(s) found!")
-            st.dataframe(result5, use_container_width=True)
-            
-            # Calculate potential fines (assuming $0.50/day)
-            total_days_overdue = result5['days_overdue'].sum()
-            potential_fines = total_days_overdue * 0.50
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric("Total Days Overdue", int(total_days_overdue))
-            with col2:
-                st.metric("Potential Fines (@$0.50/day)", f"${potential_fines:.2f}")
-        else:
-            st.success("✅ No overdue books!")
+    # Only the selected report runs; unlike st.tabs, the others are not
+    # executed (and do not query) on every rerun
+    selected_report = st.radio("Report", list(REPORTS), horizontal=True,
+                               label_visibility="collapsed", key="selected_report")
+    REPORTS[selected_report]()
 
 elif page == "All Members":
     st.title("👥 All Members")
-    members = run_query("SELECT * FROM Library_Card ORDER BY card_id")
-    st.dataframe(members, use_container_width=True)
+    show_table_browser("Library_Card", "card_id")
 
 elif page == "All Books":
     st.title("📚 All Books")
-    books = run_query("SELECT * FROM Book ORDER BY title")
-    st.dataframe(books, use_container_width=True)
+    show_table_browser("Book", "title")
+
+elif page == "Query Stats":
+    st.title("⏱️ Query Stats")
+    recorder = pool.recorder
+    st.caption(f"Every statement since the server started (or the last reset), grouped by normalized SQL. "
+               f"Statements slower than {recorder.slow_ms:.0f} ms have their EXPLAIN plan captured.")
+
+    stats = pd.DataFrame(recorder.stats())
+    if stats.empty:
+        st.info("No queries recorded yet.")
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Queries", int(stats['count'].sum()))
+        with col2:
+            st.metric("Distinct Statements", len(stats))
+        with col3:
+            st.metric("Slow Queries", int(stats['slow'].sum()))
+        st.dataframe(stats, use_container_width=True,
+                     column_config={"query": st.column_config.TextColumn(width="large")})
+
+    st.subheader("Recent Slow Queries")
+    slow = recorder.slow_queries()
+    if not slow:
+        st.success(f"✅ No queries slower than {recorder.slow_ms:.0f} ms.")
+    for event in slow:
+        with st.expander(f"{event['duration_ms']:.0f} ms · {event['page'] or 'unknown page'} · {event['query'][:80]}"):
+            st.code(event['query'], language="sql")
+            st.code(event['plan'] or "No plan captured.", language="text")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("Download stats (CSV)", stats.to_csv(index=False), "query_stats.csv", "text/csv")
+    with col2:
+        st.download_button("Download recent events (JSON lines)", recorder.export_jsonl(),
+                           "query_events.jsonl", "application/x-ndjson")
+    with col3:
+        if st.button("Reset stats"):
+            recorder.reset()
+            st.rerun()
@@ -0,0 +1,197 @@
+"""SQL issued by the app's pages (see search.py and browse.py for the paged ones).
+
+Kept in one module so the Streamlit pages and the benchmark suite
+(bench/benchmark.py) run exactly the same statements.
+"""
+import db
+from search import escape_like
+
+# Dashboard: every figure in one round trip. The checked-out count is its own
+# subquery so it can be answered from the partial index book_checked_out_due_idx
+# (migrations/003_hot_path_indexes.sql) instead of a pass over every book.
+# Computer availability is not part of it: the Dashboard gets that pushed from
+# the Computer_Availability counter (computers.AvailabilityFeed).
+DASHBOARD_SNAPSHOT = db.hot_query("dashboard_snapshot", """
+    SELECT (SELECT COUNT(*) FROM Book) AS total_books,
+           (SELECT COUNT(*) FROM Book WHERE checkout_status = 'Checked Out') AS checked_out,
+           (SELECT COUNT(*) FROM Library_Card WHERE status = 'Active') AS active_members,
+           (SELECT json_agg(json_build_object('title', r.title, 'author', r.author,
+                                              'purchase_date', r.purchase_date)
+                            ORDER BY r.purchase_date DESC)
+            FROM (SELECT title, author, purchase_date FROM Book
+                  ORDER BY purchase_date DESC LIMIT 5) r) AS recent_books
+""")
+
+# Member Lookup: one page of members with their sessions, checkouts and fines
+# aggregated alongside, so the page costs one round trip regardless of hits
+MEMBER_LOOKUP = """
+    SELECT lc.card_id, lc.name, lc.dob, lc.card_type, lc.status,
+           COALESCE(cs.num_of_sessions, 0) AS sessions_used,
+           (SELECT json_agg(json_build_object('title', b.title, 'due_date', b.due_date)
+                            ORDER BY b.due_date)
+            FROM Book b
+            WHERE b.lib_card_id = lc.card_id AND b.checkout_status = 'Checked Out') AS checkouts,
+           (SELECT json_agg(json_build_object('amount', f.amount, 'status', f.status)
+                            ORDER BY f.fine_id)
+            FROM Fine f
+            WHERE f.card_id = lc.card_id) AS fines
+    FROM Library_Card lc
+    LEFT JOIN Computers_Session cs ON cs.card_id = lc.card_id
+    WHERE {member_filter} AND lc.card_id > %(after)s
+    ORDER BY lc.card_id
+    LIMIT %(limit)s
+"""
+
+
+def member_lookup(member_search, after, limit):
+    """(sql, params) for Member Lookup: card ID if numeric, otherwise name."""
+    if member_search.isdigit():
+        member_filter = "lc.card_id = %(card_id)s"
+        params = {'card_id': int(member_search)}
+    else:
+        member_filter = "lc.name ILIKE %(pattern)s"
+        params = {'pattern': f"%{escape_like(member_search)}%"}
+    params.update(after=after, limit=limit)
+    return MEMBER_LOOKUP.format(member_filter=member_filter), params
+
+
+# Queries 1, 2 and 4 read the summary tables from
+# migrations/002_report_summaries.sql, which triggers keep in step with Book,
+# Fine and Computers_Session, so a report view is an index scan rather than a
+# JOIN + GROUP BY over the whole history.
+
+# Query 1: Member with Most Checkouts (JOIN over the per-borrower GROUP BY summary)
+TOP_BORROWERS = """
+    SELECT lc.card_id, lc.name, lc.card_type, s.num_books_checked_out
+    FROM Borrower_Summary s
+    JOIN Library_Card lc ON lc.card_id = s.card_id
+    WHERE s.num_books_checked_out > 0
+    ORDER BY s.num_books_checked_out DESC, s.card_id
+    LIMIT 15
+"""
+
+# Query 1 over a period: loans per member from the Loan history table
+# (migrations/004_loans.sql). The checkout_date bound lets Postgres prune the
+# monthly partitions outside the period.
+TOP_BORROWERS_SINCE = """
+    SELECT lc.card_id, lc.name, lc.card_type, l.num_books_checked_out
+    FROM (SELECT card_id, COUNT(*) AS num_books_checked_out
+          FROM Loan
+          WHERE checkout_date >= CURRENT_DATE - %(days)s
+          GROUP BY card_id
+          ORDER BY num_books_checked_out DESC, card_id
+          LIMIT 15) l
+    JOIN Library_Card lc ON lc.card_id = l.card_id
+    ORDER BY l.num_books_checked_out DESC, l.card_id
+"""
+
+# Top Borrowers period -> days of loan history (None: current checkouts)
+TOP_BORROWER_PERIODS = {
+    "Checked out now": None,
+    "Last 30 days": 30,
+    "Last 12 months": 365,
+}
+
+
+def top_borrowers(period):
+    """(sql, params) for the Top Borrowers report over one of TOP_BORROWER_PERIODS."""
+    days = TOP_BORROWER_PERIODS[period]
+    if days is None:
+        return TOP_BORROWERS, None
+    return TOP_BORROWERS_SINCE, {'days': days}
+
+
+# Query 2: Total Fines by Member (JOIN over the per-member fine summary)
+MEMBER_FINES_ALL = """
+    SELECT lc.card_id, lc.name, lc.card_type,
+           s.total_fines, s.num_fines, s.outstanding_amount
+    FROM Member_Fine_Summary s
+    JOIN Library_Card lc ON lc.card_id = s.card_id
+    WHERE s.num_fines > 0
+    ORDER BY s.total_fines DESC
+"""
+
+MEMBER_FINES_OUTSTANDING = """
+    SELECT lc.card_id, lc.name, lc.card_type,
+           s.outstanding_amount AS total_fines, s.num_outstanding AS num_fines
+    FROM Member_Fine_Summary s
+    JOIN Library_Card lc ON lc.card_id = s.card_id
+    WHERE s.outstanding_amount > 0
+    ORDER BY s.outstanding_amount DESC
+"""
+
+MEMBER_FINES_PAID = """
+    SELECT lc.card_id, lc.name, lc.card_type,
+           s.paid_amount AS total_fines, s.num_paid AS num_fines
+    FROM Member_Fine_Summary s
+    JOIN Library_Card lc ON lc.card_id = s.card_id
+    WHERE s.paid_amount > 0
+    ORDER BY s.paid_amount DESC
+"""
+
+
+def member_fines(fine_status):
+    """(sql, params) for the Member Fines report ('All', 'Outstanding' or 'Paid')."""
+    if fine_status == "Outstanding":
+        return MEMBER_FINES_OUTSTANDING, None
+    if fine_status == "Paid":
+        return MEMBER_FINES_PAID, None
+    return MEMBER_FINES_ALL, None
+
+
+# Query 3: Books Checked Out with Member Info (JOIN)
+ACTIVE_CHECKOUTS = """
+    SELECT b.isbn, b.title, b.author, lc.name as borrower,
+           lc.card_id, b.checkout_date, b.due_date,
+           CURRENT_DATE - b.due_date as days_until_due
+    FROM Book b
+    JOIN Library_Card lc ON b.lib_card_id = lc.card_id
+    WHERE b.checkout_status = 'Checked Out'
+    ORDER BY b.due_date ASC
+"""
+
+# Query 4: Computer Sessions by Card Type (per-card-type GROUP BY summary)
+COMPUTER_USAGE = """
+    SELECT card_type, total_active_sessions,
+           total_sessions_all_time::numeric / NULLIF(sessions_counted, 0) AS avg_sessions_per_member,
+           total_sessions_all_time
+    FROM Card_Type_Session_Summary
+    WHERE total_active_sessions > 0
+    ORDER BY total_active_sessions DESC
+"""
+
+# Query 5: Overdue Books with Member Contact (JOIN), from the open loans in
+# Loan. A loan is checked out before it falls due, so the (implied)
+# checkout_date bound lets Postgres skip the partitions created ahead of time.
+OVERDUE_BOOKS = """
+    SELECT l.isbn, b.title, b.author, lc.card_id, lc.name as borrower,
+           lc.card_type, l.checkout_date, l.due_date,
+           CURRENT_DATE - l.due_date as days_overdue
+    FROM Loan l
+    JOIN Book b ON b.isbn = l.isbn
+    JOIN Library_Card lc ON l.card_id = lc.card_id
+    WHERE l.returned_date IS NULL
+      AND l.due_date < CURRENT_DATE
+      AND l.checkout_date < CURRENT_DATE
+    ORDER BY days_overdue DESC
+"""
+
+# Freshness of each report summary table: last incremental change and last
+# full rebuild (rebuild_report_summaries()), all in one query
+SUMMARY_STATUS = """
+    SELECT st.summary_table, st.last_rebuilt,
+           CASE st.summary_table
+               WHEN 'Borrower_Summary' THEN (SELECT MAX(updated_at) FROM Borrower_Summary)
+               WHEN 'Member_Fine_Summary' THEN (SELECT MAX(updated_at) FROM Member_Fine_Summary)
+               WHEN 'Card_Type_Session_Summary' THEN (SELECT MAX(updated_at) FROM Card_Type_Session_Summary)
+           END AS last_change
+    FROM Report_Summary_Status st
+"""
+
+REPORT_SUMMARY_TABLES = {
+    "top_borrowers": "Borrower_Summary",
+    "member_fines": "Member_Fine_Summary",
+    "computer_usage": "Card_Type_Session_Summary",
+}
+
+REBUILD_SUMMARIES = "SELECT rebuild_report_summaries()"
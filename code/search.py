@@ -0,0 +1,108 @@
+"""Book catalog search.
+
+Builds the SQL behind the Book Search page. Title/author searches match
+books whose title or author contains the term's words (or close misspellings
+of them) and walk the trigram GiST index from
+migrations/011_search_ranking.sql in order of word similarity, so the best
+matches come first and a page costs the same whatever the number of matches.
+ISBN-looking terms take a prefix fast path on the ISBN pattern index from
+migrations/001_book_search.sql; when no ISBN starts with the term, the page
+falls back to matching it anywhere in the ISBN (trigram index from
+migrations/009_isbn_search.sql), then to a title/author search. Every mode is
+paged with a keyset cursor so only one page is ever fetched.
+"""
+import re
+
+from import_catalog import normalize_isbn
+
+# Digits and hyphens (optionally ending in an X check digit), e.g. 978-0-14
+ISBN_TERM = re.compile(r"^[0-9][0-9-]*[0-9Xx]?$")
+
+RESULT_COLUMNS = "isbn, title, author, condition, checkout_status"
+
+# Title and author as one text, as indexed by migrations/011_search_ranking.sql
+SEARCH_TEXT = "(title || ' ' || COALESCE(author, ''))"
+
+# Mode to retry with when the first page of a search comes back empty
+FALLBACK_MODES = {"isbn": "isbn_substring", "isbn_substring": "text"}
+
+
+def search_mode(term):
+    """Pick how a search term is matched first: 'browse', 'isbn' or 'text'."""
+    if not term:
+        return "browse"
+    if ISBN_TERM.match(term) and sum(ch.isdigit() for ch in term) >= 3:
+        return "isbn"
+    return "text"
+
+
+def escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_query(term, mode, limit, after=None):
+    """Return (sql, params) for one page of results.
+
+    ``after`` is the cursor returned by cursor_after() for the previous page,
+    or None for the first page. Pass ``limit = page_size + 1`` to find out
+    whether another page follows.
+    """
+    params = {"limit": limit}
+
+    if mode == "browse":
+        keyset = ""
+        if after is not None:
+            keyset = "WHERE (title, isbn) > (%(after_title)s, %(after_isbn)s)"
+            params.update(after_title=after[0], after_isbn=after[1])
+        sql = f"""
+            SELECT {RESULT_COLUMNS}
+            FROM Book
+            {keyset}
+            ORDER BY title, isbn
+            LIMIT %(limit)s
+        """
+
+    elif mode in ("isbn", "isbn_substring"):
+        # Stored as 13 digits (migrations/008_normalize_isbns.sql)
+        isbn = escape_like(normalize_isbn(term) or term.replace("-", "").upper())
+        params["pattern"] = isbn + "%" if mode == "isbn" else "%" + isbn + "%"
+        keyset = ""
+        if after is not None:
+            keyset = "AND isbn > %(after_isbn)s"
+            params["after_isbn"] = after[0]
+        sql = f"""
+            SELECT {RESULT_COLUMNS}
+            FROM Book
+            WHERE isbn LIKE %(pattern)s {keyset}
+            ORDER BY isbn
+            LIMIT %(limit)s
+        """
+
+    else:
+        # <% keeps books whose word similarity reaches
+        # pg_trgm.word_similarity_threshold (0.6 by default); <<-> is 1 - word
+        # similarity, which the GiST index returns in order
+        params["term"] = term
+        keyset = ""
+        if after is not None:
+            keyset = f"AND (%(term)s <<-> {SEARCH_TEXT}, isbn) > (%(after_distance)s, %(after_isbn)s)"
+            params.update(after_distance=after[0], after_isbn=after[1])
+        sql = f"""
+            SELECT {RESULT_COLUMNS}, %(term)s <<-> {SEARCH_TEXT} AS distance
+            FROM Book
+            WHERE %(term)s <%% {SEARCH_TEXT} {keyset}
+            ORDER BY distance, isbn
+            LIMIT %(limit)s
+        """
+
+    return sql, params
+
+
+def cursor_after(page, mode):
+    """Keyset cursor pointing just past the last row of a results DataFrame."""
+    last = page.iloc[-1]
+    if mode == "browse":
+        return (last["title"], last["isbn"])
+    if mode in ("isbn", "isbn_substring"):
+        return (last["isbn"],)
+    return (float(last["distance"]), last["isbn"])
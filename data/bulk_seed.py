@@ -0,0 +1,371 @@
+"""Generate a realistic-size library database for testing and benchmarks.
+
+Rows are generated in parallel worker processes and streamed into Postgres
+with COPY FROM STDIN. Keys are assigned up front (card 1..N, item 1..M, and an
+ISBN derived from each book's index), so foreign keys are consistent by
+construction and no RETURNING round trips are needed. Constraints and indexes
+on the seeded tables are dropped before loading and recreated afterwards.
+Apply the schema migrations (code/migrate.py) first; besides the current
+catalog, the generator fills the Loan history table with returned loans.
+
+Usage:
+    python3 data/bulk_seed.py --scale 0.01            # 10k books, 2k cards, ...
+    python3 data/bulk_seed.py --books 1000000 --fines 5000000 --workers 8
+    python3 data/bulk_seed.py --dsn "host=localhost dbname=library user=me"
+
+Connection settings not given in --dsn are taken from the usual PG*
+environment variables (PGHOST, PGDATABASE, PGUSER, PGPASSWORD, ...).
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import psycopg2
+from faker import Faker
+
+# Row counts at --scale 1.0
+BASE_COUNTS = {
+    "cards": 200_000,
+    "sessions": 100_000,
+    "books": 1_000_000,
+    "items": 50_000,
+    "fines": 5_000_000,
+    "loans": 2_000_000,
+}
+
+# Public computers created after the load (independent of --scale)
+COMPUTERS = 50
+
+# Returned loans are spread over this many days of history
+LOAN_HISTORY_DAYS = 730
+
+CHUNK_SIZE = 50_000
+
+# Tables in load order, with the columns written by COPY
+TABLES = [
+    ("Library_Card", "cards", "card_id, name, dob, card_type, status"),
+    ("Identification", "cards", "outside_id_pk, is_adult, is_valid, card_id, is_local"),
+    ("Computers_Session", "sessions", "session_id, card_id, num_of_sessions, remaining_computers"),
+    ("Book", "books", "isbn, title, author, condition, purchase_date, lib_card_id, checkout_date, due_date, checkout_status"),
+    ("Items", "items", "item_id, card_id, name, checkout_date, due_date"),
+    ("Fine", "fines", "fine_id, card_id, item_id, isbn, amount, status"),
+    ("Loan", "loans", "isbn, card_id, checkout_date, due_date, returned_date"),
+]
+
+SERIAL_COLUMNS = [
+    ("Library_Card", "card_id"),
+    ("Computers_Session", "session_id"),
+    ("Items", "item_id"),
+    ("Fine", "fine_id"),
+]
+
+# Set in each worker by _init_worker
+_counts = None
+_first_names = None
+_last_names = None
+_words = None
+_today = None
+
+
+def make_isbn(index):
+    """Deterministic, valid ISBN-13 for the book with the given index."""
+    body = f"978{index:09d}"
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+def _init_worker(counts, seed):
+    global _counts, _first_names, _last_names, _words, _today
+    fake = Faker()
+    fake.seed_instance(seed)
+    _counts = counts
+    # Small vocabularies built once per worker; rows are then assembled with
+    # plain random.choice, which is orders of magnitude faster than Faker.
+    _first_names = [fake.first_name() for _ in range(500)]
+    _last_names = [fake.last_name() for _ in range(1000)]
+    _words = [fake.word().capitalize() for _ in range(2000)]
+    _today = date.today()
+
+
+def _name(rng):
+    return f"{rng.choice(_first_names)} {rng.choice(_last_names)}"
+
+
+def _days_ago(rng, max_days):
+    return _today - timedelta(days=rng.randint(0, max_days))
+
+
+def _card_rows(rng, start, stop):
+    for card_id in range(start + 1, stop + 1):
+        yield (
+            card_id,
+            _name(rng),
+            _days_ago(rng, 85 * 365) - timedelta(days=5 * 365),
+            rng.choice(["Standard", "Student", "Senior", "Child"]),
+            rng.choice(["Active", "Active", "Active", "Suspended"]),
+        )
+
+
+def _identification_rows(rng, start, stop):
+    for card_id in range(start + 1, stop + 1):
+        yield (f"ID{card_id:010d}", rng.random() < 0.5, True, card_id, rng.random() < 0.5)
+
+
+def _session_rows(rng, start, stop):
+    # Computers_Session allows one row per card; session i belongs to card i
+    for session_id in range(start + 1, stop + 1):
+        yield (session_id, session_id, rng.randint(0, 10), rng.randint(0, 5))
+
+
+def _book_rows(rng, start, stop):
+    for index in range(start, stop):
+        lib_card_id = checkout_date = due_date = None
+        checkout_status = "Available"
+        if rng.random() < 0.4:
+            lib_card_id = rng.randint(1, _counts["cards"])
+            checkout_date = _days_ago(rng, 60)
+            due_date = checkout_date + timedelta(days=14)
+            checkout_status = "Checked Out"
+        yield (
+            make_isbn(index),
+            " ".join(rng.choice(_words) for _ in range(rng.randint(2, 5))),
+            _name(rng),
+            rng.choice(["New", "Good", "Fair", "Poor"]),
+            _days_ago(rng, 5 * 365),
+            lib_card_id,
+            checkout_date,
+            due_date,
+            checkout_status,
+        )
+
+
+def _item_rows(rng, start, stop):
+    for item_id in range(start + 1, stop + 1):
+        card_id = checkout_date = due_date = None
+        if rng.random() < 0.5:
+            card_id = rng.randint(1, _counts["cards"])
+            checkout_date = _days_ago(rng, 30)
+            due_date = checkout_date + timedelta(days=3)
+        yield (
+            item_id,
+            card_id,
+            rng.choice(["Laptop", "Projector", "Headphones", "Tablet", "E-Reader", "Calculator"]),
+            checkout_date,
+            due_date,
+        )
+
+
+def _fine_rows(rng, start, stop):
+    for fine_id in range(start + 1, stop + 1):
+        item_id = isbn = None
+        if rng.random() < 0.5 and _counts["items"]:
+            item_id = rng.randint(1, _counts["items"])
+        elif _counts["books"]:
+            isbn = make_isbn(rng.randrange(_counts["books"]))
+        yield (
+            fine_id,
+            rng.randint(1, _counts["cards"]),
+            item_id,
+            isbn,
+            f"{rng.uniform(1.0, 50.0):.2f}",
+            rng.choice(["Paid", "Outstanding"]),
+        )
+
+
+def _loan_rows(rng, start, stop):
+    # Returned loans only; the open loans of the checked-out books are added
+    # from Book by backfill_loans() after the load
+    for _ in range(start, stop):
+        checkout_date = _days_ago(rng, LOAN_HISTORY_DAYS)
+        yield (
+            make_isbn(rng.randrange(_counts["books"])),
+            rng.randint(1, _counts["cards"]),
+            checkout_date,
+            checkout_date + timedelta(days=14),
+            min(checkout_date + timedelta(days=rng.randint(1, 28)), _today),
+        )
+
+
+ROW_GENERATORS = {
+    "Library_Card": _card_rows,
+    "Identification": _identification_rows,
+    "Computers_Session": _session_rows,
+    "Book": _book_rows,
+    "Items": _item_rows,
+    "Fine": _fine_rows,
+    "Loan": _loan_rows,
+}
+
+
+def generate_chunk(task):
+    """Render rows [start, stop) of a table as CSV text (runs in a worker)."""
+    table, start, stop, seed = task
+    rng = random.Random(f"{seed}:{table}:{start}")
+    buf = io.StringIO()
+    csv.writer(buf).writerows(ROW_GENERATORS[table](rng, start, stop))
+    return table, stop - start, buf.getvalue()
+
+
+def _seeded_tables():
+    return [table.lower() for table, _, _ in TABLES]
+
+
+def drop_constraints_and_indexes(cur):
+    """Drop keys and indexes on the seeded tables, returning SQL to recreate them."""
+    tables = _seeded_tables()
+    cur.execute("""
+        SELECT c.conrelid::regclass::text, c.conname, pg_get_constraintdef(c.oid), c.contype
+        FROM pg_constraint c
+        WHERE c.contype IN ('p', 'u', 'f')
+          AND (c.conrelid::regclass::text = ANY(%s)
+               OR (c.contype = 'f' AND c.confrelid::regclass::text = ANY(%s)))
+    """, (tables, tables))
+    constraints = cur.fetchall()
+    cur.execute("""
+        SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid::regclass::text = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """, (tables,))
+    indexes = cur.fetchall()
+
+    # Foreign keys first, since they depend on the primary/unique keys
+    for table, name, _, contype in sorted(constraints, key=lambda c: c[3] != "f"):
+        cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+    for name, _ in indexes:
+        cur.execute(f"DROP INDEX {name}")
+
+    recreate = [
+        f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'
+        for table, name, definition, contype in constraints if contype != "f"
+    ]
+    # A partitioned table's index is defined "ON ONLY" the parent, which would
+    # recreate it without its per-partition indexes
+    recreate += [definition.replace(" ON ONLY ", " ON ", 1) for _, definition in indexes]
+    recreate += [
+        f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'
+        for table, name, definition, contype in constraints if contype == "f"
+    ]
+    return recreate
+
+
+def plan_tasks(counts, seed):
+    for table, count_key, _ in TABLES:
+        total = counts[count_key]
+        for start in range(0, total, CHUNK_SIZE):
+            yield table, start, min(start + CHUNK_SIZE, total), seed
+
+
+def bulk_seed(dsn, counts, workers, seed):
+    columns = {table: cols for table, _, cols in TABLES}
+    count_keys = {table: key for table, key, _ in TABLES}
+    conn = psycopg2.connect(dsn)
+    started = time.monotonic()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET maintenance_work_mem = '512MB'")
+            cur.execute("SELECT to_regclass('loan') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                raise SystemExit("Loan table not found; apply the migrations first (python3 code/migrate.py).")
+            cur.execute("TRUNCATE TABLE Loan, Fine, Items, Book, Computers_Session, Identification, Library_Card RESTART IDENTITY CASCADE")
+            cur.execute("SELECT ensure_loan_partitions(3, CURRENT_DATE - %s)", (LOAN_HISTORY_DAYS,))
+            print("Dropping constraints and indexes...")
+            recreate = drop_constraints_and_indexes(cur)
+            # Summary-maintenance triggers would do per-statement work for
+            # every COPY chunk; summaries are rebuilt once after the load
+            for table, _, _ in TABLES:
+                cur.execute(f"ALTER TABLE {table} DISABLE TRIGGER USER")
+
+            loaded = {table: 0 for table, _, _ in TABLES}
+            table_started = {}
+            with multiprocessing.Pool(workers, _init_worker, (counts, seed)) as pool:
+                # imap keeps chunks in order, so COPY of one chunk overlaps
+                # with generation of the next ones in the other workers
+                for table, rows, data in pool.imap(generate_chunk, plan_tasks(counts, seed)):
+                    table_started.setdefault(table, time.monotonic())
+                    cur.copy_expert(f"COPY {table} ({columns[table]}) FROM STDIN WITH (FORMAT csv)", io.StringIO(data))
+                    loaded[table] += rows
+                    if loaded[table] == counts[count_keys[table]]:
+                        elapsed = time.monotonic() - table_started[table]
+                        print(f"Loaded {loaded[table]:,} rows into {table} in {elapsed:.1f}s "
+                              f"({loaded[table] / max(elapsed, 1e-9):,.0f} rows/s)")
+
+            for table, column in SERIAL_COLUMNS:
+                cur.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                    f"COALESCE((SELECT MAX({column}) FROM {table}), 0) + 1, false)"
+                )
+
+            print(f"Recreating {len(recreate)} constraints and indexes...")
+            index_started = time.monotonic()
+            for statement in recreate:
+                cur.execute(statement)
+            print(f"Constraints and indexes rebuilt in {time.monotonic() - index_started:.1f}s")
+
+            for table, _, _ in TABLES:
+                cur.execute(f"ALTER TABLE {table} ENABLE TRIGGER USER")
+            cur.execute("SELECT to_regproc('rebuild_report_summaries') IS NOT NULL")
+            if cur.fetchone()[0]:
+                print("Rebuilding report summaries...")
+                cur.execute("SELECT rebuild_report_summaries()")
+            cur.execute("SELECT backfill_loans()")
+            print(f"Opened {cur.fetchone()[0]:,} loans for checked-out books")
+            # TRUNCATE ... CASCADE on Library_Card also emptied the inventory
+            cur.execute("SELECT to_regclass('computer') IS NOT NULL")
+            if cur.fetchone()[0]:
+                cur.execute("""
+                    INSERT INTO Computer (name)
+                    SELECT 'PC-' || lpad(n::text, 3, '0') FROM generate_series(1, %s) n
+                    ON CONFLICT (name) DO NOTHING
+                """, (COMPUTERS,))
+
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    total_rows = sum(loaded.values())
+    elapsed = time.monotonic() - started
+    print(f"Database seeded with {total_rows:,} rows in {elapsed:.1f}s")
+
+
+def scaled_counts(scale, overrides=None):
+    """Row counts for a scale factor, with optional per-table overrides."""
+    overrides = overrides or {}
+    counts = {
+        key: overrides[key] if overrides.get(key) is not None else int(base * scale)
+        for key, base in BASE_COUNTS.items()
+    }
+    counts["cards"] = max(counts["cards"], 1)
+    counts["sessions"] = min(counts["sessions"], counts["cards"])
+    if not counts["books"]:
+        counts["loans"] = 0
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk-load a large synthetic library database.")
+    parser.add_argument("--dsn", default="", help="libpq connection string (default: PG* environment variables)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier applied to the default row counts")
+    for key, base in BASE_COUNTS.items():
+        parser.add_argument(f"--{key}", type=int, help=f"number of {key} (default {base:,} x scale)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="row generator processes")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for reproducible data")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    counts = scaled_counts(args.scale, {key: getattr(args, key) for key in BASE_COUNTS})
+    print("Row counts: " + ", ".join(f"{key}={value:,}" for key, value in counts.items()))
+    bulk_seed(args.dsn, counts, args.workers, args.seed)
@@ -74,7 +74,7 @@ def seed_data():
         print("Seeding Book...")
         book_isbns = []
         for _ in range(100):
-            isbn = fake.unique.isbn13()
+            isbn = fake.unique.isbn13(separator="")  # bare digits, like imports and scanners
             title = fake.sentence(nb_words=4).replace(".", "")
             author = fake.name()
             condition = random.choice(['New', 'Good', 'Fair', 'Poor'])
@@ -132,6 +132,30 @@ def seed_data():
                 (card_id, item_id, isbn, amount, status)
             )
 
+        # Loan history (code/migrations/004_loans.sql): one open loan per checked-out book
+        cur.execute("SELECT to_regclass('loan') IS NOT NULL;")
+        if cur.fetchone()[0]:
+            print("Seeding Loan...")
+            cur.execute("TRUNCATE TABLE Loan;")
+            cur.execute("SELECT backfill_loans();")
+
+        # Computer inventory (code/migrations/006_computers.sql); emptied by the
+        # TRUNCATE ... CASCADE above, so it is recreated with a few sessions running
+        cur.execute("SELECT to_regclass('computer') IS NOT NULL;")
+        if cur.fetchone()[0]:
+            print("Seeding Computer...")
+            cur.execute("SELECT card_id FROM Library_Card WHERE status = 'Active';")
+            active_cards = [row[0] for row in cur.fetchall()]
+            active_cards = random.sample(active_cards, min(4, len(active_cards)))
+            for number in range(1, 11):
+                card_id = active_cards[number - 1] if number <= len(active_cards) else None
+                cur.execute(
+                    "INSERT INTO Computer (name, location, status, card_id, session_started) VALUES (%s, %s, %s, %s, %s);",
+                    (f"PC-{number:02d}", random.choice(['Main Floor', 'Reference', 'Teen Room']),
+                     'In Use' if card_id else 'Available', card_id,
+                     fake.date_time_between(start_date='-2h', end_date='now') if card_id else None)
+                )
+
         conn.commit()
         print("Database seeded successfully!")
 
@@ -0,0 +1,38 @@
+import os
+import sys
+import uuid
+
+import psycopg2
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "code"))
+
+SCHEMA = os.path.join(ROOT, "code", "schema.sql")
+
+
+@pytest.fixture
+def scratch_dsn():
+    """A new database with schema.sql loaded on the LIBRARY_TEST_DSN server, dropped afterwards."""
+    server_dsn = os.environ.get("LIBRARY_TEST_DSN")
+    if not server_dsn:
+        pytest.skip("set LIBRARY_TEST_DSN (e.g. \"dbname=postgres\") to run against a database")
+    name = f"library_test_{uuid.uuid4().hex[:12]}"
+    admin = psycopg2.connect(server_dsn)
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {name}")
+        dsn = psycopg2.extensions.make_dsn(server_dsn, dbname=name)
+        conn = psycopg2.connect(dsn)
+        try:
+            with conn.cursor() as cur, open(SCHEMA) as f:
+                cur.execute(f.read())
+            conn.commit()
+        finally:
+            conn.close()
+        yield dsn
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.close()
@@ -0,0 +1,95 @@
+import asyncio
+
+import api
+import circulation
+
+
+class FakeLimiter:
+    """Runs return_books() batches against a shelf of checked-out ISBNs."""
+
+    def __init__(self, checked_out, error=None):
+        self.checked_out = set(checked_out)
+        self.error = error
+        self.calls = []
+
+    async def run(self, func, pool, isbns):
+        assert func is circulation.return_books
+        self.calls.append(list(isbns))
+        if self.error:
+            raise self.error
+        results = []
+        for isbn in isbns:
+            if isbn in self.checked_out:
+                self.checked_out.discard(isbn)
+                results.append({"isbn": isbn, "card_id": 7, "due_date": "2026-10-01", "days_overdue": 3,
+                                "outcome": circulation.RETURNED})
+            else:
+                results.append({"isbn": isbn, "card_id": None, "due_date": None, "days_overdue": 0,
+                                "outcome": circulation.ALREADY_AVAILABLE})
+        return results
+
+
+def submit_together(batcher, *requests):
+    async def run():
+        return await asyncio.gather(*(batcher.submit(isbns) for isbns in requests))
+    return asyncio.run(run())
+
+
+def outcomes(results):
+    return [(result["isbn"], result["outcome"]) for result in results]
+
+
+def test_concurrent_returns_share_one_statement():
+    limiter = FakeLimiter({"1", "2", "3"})
+    batcher = api.ReturnBatcher(None, limiter, window=0.01)
+    first, second = submit_together(batcher, ["1", "2"], ["3"])
+    assert limiter.calls == [["1", "2", "3"]]
+    assert outcomes(first) == [("1", "returned"), ("2", "returned")]
+    assert outcomes(second) == [("3", "returned")]
+    assert batcher.stats() == {"batches": 1, "requests": 2, "requests_per_batch": 2.0}
+
+
+def test_only_first_request_in_batch_claims_a_shared_isbn():
+    limiter = FakeLimiter({"1"})
+    batcher = api.ReturnBatcher(None, limiter, window=0.01)
+    first, second = submit_together(batcher, ["1"], ["1", "2"])
+    assert limiter.calls == [["1", "2"]]
+    assert first[0]["outcome"] == circulation.RETURNED and first[0]["card_id"] == 7
+    assert outcomes(second) == [("1", "already_available"), ("2", "already_available")]
+    assert second[0]["card_id"] is None and second[0]["days_overdue"] is None
+
+
+def test_full_batch_flushes_before_the_window_closes():
+    limiter = FakeLimiter({"1", "2", "3"})
+    batcher = api.ReturnBatcher(None, limiter, window=60, max_isbns=2)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(batcher.submit(["1"]), batcher.submit(["2", "3"])), 5)
+
+    first, second = asyncio.run(run())
+    assert limiter.calls == [["1", "2", "3"]]
+    assert outcomes(second) == [("2", "returned"), ("3", "returned")]
+
+
+def test_failed_batch_fails_every_request():
+    batcher = api.ReturnBatcher(None, FakeLimiter(set(), error=RuntimeError("pool exhausted")), window=0.01)
+
+    async def run():
+        return await asyncio.gather(batcher.submit(["1"]), batcher.submit(["2"]), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [str(result) for result in results] == ["pool exhausted", "pool exhausted"]
+
+
+def test_running_batches_are_referenced_until_done():
+    limiter = FakeLimiter({"1"})
+    batcher = api.ReturnBatcher(None, limiter, window=0)
+
+    async def run():
+        pending = asyncio.ensure_future(batcher.submit(["1"]))
+        await asyncio.sleep(0)
+        assert len(batcher._running) == 1
+        return await pending
+
+    assert outcomes(asyncio.run(run())) == [("1", "returned")]
+    assert batcher._running == set()
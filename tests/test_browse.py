@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import psycopg2
+import pytest
+
+import browse
+import db
+
+
+def test_build_query_orders_by_sort_column_then_key():
+    sql, params = browse.build_query("Book", {}, "author", True, 51)
+    assert "ORDER BY author DESC, isbn DESC" in sql
+    assert "WHERE" not in sql
+    assert params == {"limit": 51}
+
+
+def test_build_query_sorting_by_key_orders_once():
+    sql, _ = browse.build_query("Library_Card", {}, "card_id", False, 51)
+    assert "ORDER BY card_id ASC\n" in sql
+
+
+def test_build_query_filters():
+    sql, params = browse.build_query("Book", {"title": "100%_sure", "lib_card_id": "7"}, "title", False, 51)
+    assert "WHERE (lib_card_id = %(filter_0)s) AND (title ILIKE %(filter_1)s)" in sql
+    assert params["filter_0"] == "7"
+    assert params["filter_1"] == "%100\\%\\_sure%"
+
+
+@pytest.mark.parametrize("sort_column, filters", [("isbn; DROP TABLE Book", {}), ("title", {"1=1 OR title": "x"})])
+def test_build_query_rejects_unknown_columns(sort_column, filters):
+    with pytest.raises(ValueError):
+        browse.build_query("Book", filters, sort_column, False, 51)
+
+
+def keyset(sort_column, descending, after):
+    params = {}
+    not_null = sort_column in browse.BROWSE_TABLES["Book"]["not_null"]
+    return browse._keyset_condition(sort_column, "isbn", descending, not_null, after, params), params
+
+
+def test_keyset_condition_on_key_and_not_null_columns():
+    assert keyset("isbn", False, ("9780306406157", "9780306406157"))[0] == "isbn > %(after_key)s"
+    assert keyset("isbn", True, ("9780306406157", "9780306406157"))[0] == "isbn < %(after_key)s"
+    condition, params = keyset("title", False, ("Dune", "9780306406157"))
+    assert condition == "(title, isbn) > (%(after_value)s, %(after_key)s)"
+    assert params == {"after_value": "Dune", "after_key": "9780306406157"}
+
+
+def test_keyset_condition_nulls_last_when_ascending():
+    assert keyset("author", False, ("Herbert", "1"))[0] == \
+        "(author, isbn) > (%(after_value)s, %(after_key)s) OR author IS NULL"
+    assert keyset("author", False, (None, "1"))[0] == "author IS NULL AND isbn > %(after_key)s"
+
+
+def test_keyset_condition_nulls_first_when_descending():
+    assert keyset("author", True, (None, "1"))[0] == \
+        "(author IS NULL AND isbn < %(after_key)s) OR author IS NOT NULL"
+    assert keyset("author", True, ("Herbert", "1"))[0] == "(author, isbn) < (%(after_value)s, %(after_key)s)"
+
+
+def test_cursor_after_converts_missing_values_and_numpy_scalars():
+    page = pd.DataFrame({"card_id": np.array([1, 2]), "dob": pd.to_datetime(["2000-01-01", None]),
+                         "name": ["Ann", None]})
+    assert browse.cursor_after("Library_Card", page, "dob") == (None, 2)
+    assert type(browse.cursor_after("Library_Card", page, "card_id")[1]) is int
+    assert browse.cursor_after("Library_Card", page, "name") == (None, 2)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_cover_every_row_once(scratch_dsn, descending):
+    conn = psycopg2.connect(scratch_dsn)
+    with conn, conn.cursor() as cur:
+        cur.executemany("INSERT INTO Book (isbn, title, author, checkout_status) VALUES (%s, %s, %s, 'Available')",
+                        [(f"97800000000{i:02d}", f"Title {i % 3}", None if i % 4 == 0 else f"Author {i % 5}")
+                         for i in range(23)])
+    conn.close()
+    pool = db.ConnectionPool({"dsn": scratch_dsn}, minconn=0, maxconn=1)
+    try:
+        expected = db.dataframe(pool, *browse.build_query("Book", {}, "author", descending, 100))
+        seen, after = [], None
+        while True:
+            page = db.dataframe(pool, *browse.build_query("Book", {}, "author", descending, 4, after))
+            seen.extend(page["isbn"])
+            if len(page) < 4:
+                break
+            after = browse.cursor_after("Book", page, "author")
+        assert seen == list(expected["isbn"])
+        assert len(seen) == 23
+    finally:
+        pool.closeall()
@@ -0,0 +1,20 @@
+from circulation import parse_isbn_list
+
+
+def test_parse_isbn_list_scanner_output():
+    text = "9780306406157\n\n  9780804429573  \n9780306406157\n"
+    assert parse_isbn_list(text) == ["9780306406157", "9780804429573"]
+
+
+def test_parse_isbn_list_normalizes_typed_isbns():
+    text = "978-0-306-40615-7\n978 0 8044 2957 3\n0-8044-2957-x\n9780306406157\n"
+    assert parse_isbn_list(text) == ["9780306406157", "9780804429573"]
+
+
+def test_parse_isbn_list_keeps_invalid_isbns_stripped():
+    assert parse_isbn_list("978-0-306-40615-8\nabc-123\n") == ["9780306406158", "ABC123"]
+
+
+def test_parse_isbn_list_takes_first_csv_column():
+    text = 'isbn,title\n"9780306406157","Title"\r\n9780804429573,Other, with comma\n'
+    assert parse_isbn_list(text) == ["9780306406157", "9780804429573"]
@@ -0,0 +1,354 @@
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+import db
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Every connection the pools under test open, in order."""
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(psycopg2, "connect", connect)
+    return opened
+
+
+def test_pool_reuses_returned_connections(connections):
+    pool = db.ConnectionPool({}, minconn=1, maxconn=2, check_after=60)
+    assert len(connections) == 1
+    conn = pool.getconn()
+    assert conn is connections[0]
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    pool.putconn(conn)
+    stats = pool.stats()
+    assert (stats["checkouts"], stats["size"], stats["idle"], stats["in_use"]) == (2, 1, 1, 0)
+
+
+def test_pool_opens_connections_lazily_up_to_maxconn(connections):
+    pool = db.ConnectionPool({}, minconn=0, maxconn=2)
+    assert connections == []
+    first, second = pool.getconn(), pool.getconn()
+    assert first is not second
+    assert len(connections) == 2
+    with pytest.raises(db.PoolTimeout):
+        pool.getconn(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_pool_waiter_gets_the_returned_connection(connections):
+    pool = db.ConnectionPool({}, minconn=0, maxconn=1)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn(timeout=5)))
+    waiter.start()
+    while pool.stats()["waiting"] == 0:
+        time.sleep(0.01)
+    pool.putconn(conn)
+    waiter.join()
+    assert got == [conn]
+    assert pool.stats()["waits"] == 1
+
+
+def test_pool_rolls_back_open_transactions(connections):
+    pool = db.ConnectionPool({}, minconn=0, maxconn=1)
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert pool.getconn() is conn
+
+
+@pytest.mark.parametrize("break_connection", [
+    lambda conn: setattr(conn, "closed", 2),
+    lambda conn: setattr(conn, "status", extensions.TRANSACTION_STATUS_UNKNOWN),
+])
+def test_pool_discards_broken_connections(connections, break_connection):
+    pool = db.ConnectionPool({}, minconn=0, maxconn=1)
+    conn = pool.getconn()
+    break_connection(conn)
+    pool.putconn(conn)
+    assert pool.stats()["discarded"] == 1
+    assert pool.getconn() is not conn
+    assert len(connections) == 2
+
+
+def test_pool_discards_connection_after_connection_error(connections):
+    pool = db.ConnectionPool({}, minconn=0, maxconn=1)
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection() as conn:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+    assert conn.closed
+    assert pool.stats()["size"] == 0
+    with pool.connection() as replacement:
+        assert replacement is not conn
+
+
+def test_pool_keeps_connection_after_statement_error(connections):
+    pool = db.ConnectionPool({}, minconn=0, maxconn=1)
+    with pytest.raises(psycopg2.ProgrammingError):
+        with pool.connection() as conn:
+            raise psycopg2.ProgrammingError("syntax error")
+    with pool.connection() as again:
+        assert again is conn
+
+
+def test_pool_frees_the_slot_when_connecting_fails(monkeypatch):
+    def refuse(**kwargs):
+        raise psycopg2.OperationalError("could not connect to server")
+
+    monkeypatch.setattr(psycopg2, "connect", refuse)
+    pool = db.ConnectionPool({}, minconn=0, maxconn=1)
+    for _ in range(2):
+        with pytest.raises(psycopg2.OperationalError):
+            pool.getconn(timeout=0.05)
+    assert pool.stats()["size"] == 0
+
+
+def test_closed_pool_refuses_checkouts(connections):
+    pool = db.ConnectionPool({}, minconn=1, maxconn=1)
+    pool.closeall()
+    assert connections[0].closed
+    with pytest.raises(db.PoolError):
+        pool.getconn()
+
+
+@pytest.fixture
+def hot_queries(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(db, "_hot_queries", registry)
+    return registry
+
+
+def test_hot_query_numbers_named_parameters_once(hot_queries):
+    sql = "SELECT * FROM Book WHERE isbn = ANY(%(isbns)s) AND due_date < %(today)s OR lib_card_id = %(card)s " \
+          "AND isbn <> ALL(%(isbns)s)"
+    assert db.hot_query("lookup", sql) is sql
+    hot = hot_queries[sql]
+    assert hot.name == "hot_lookup"
+    assert hot.body == "SELECT * FROM Book WHERE isbn = ANY($1) AND due_date < $2 OR lib_card_id = $3 " \
+                       "AND isbn <> ALL($1)"
+    assert hot.params == ("isbns", "today", "card")
+
+
+def test_hot_query_positional_parameters_and_percent(hot_queries):
+    sql = "SELECT title FROM Book WHERE title LIKE '%%' || %s AND author = %s"
+    db.hot_query("positional", sql)
+    hot = hot_queries[sql]
+    assert hot.body == "SELECT title FROM Book WHERE title LIKE '%' || $1 AND author = $2"
+    assert hot.params == (0, 1)
+
+
+def test_hot_query_without_parameters(hot_queries):
+    db.hot_query("count", "SELECT count(*) FROM Book")
+    assert hot_queries["SELECT count(*) FROM Book"] == ("hot_count", "SELECT count(*) FROM Book", ())
+
+
+
+INT4, FLOAT8, NUMERIC, BOOL, TEXT, DATE = 23, 701, 1700, 16, 25, 1082
+
+
+class FakeCursor:
+    """Serves ``rows`` through fetchmany(), like a psycopg2 cursor."""
+
+    def __init__(self, columns, rows):
+        self.description = [(name, type_code) for name, type_code in columns]
+        self.rows = list(rows)
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_column_array_default_dtypes():
+    assert db._column_array([1, 2], "int64").dtype == np.int64
+    assert db._column_array([1.5, 2.0], "float64").dtype == np.float64
+    assert db._column_array([True, False], "bool").dtype == np.bool_
+    texts = db._column_array(["a", None], None)
+    assert texts.dtype == object and list(texts) == ["a", None]
+
+
+def test_column_array_nullable_integers_stay_integers():
+    values = db._column_array([5, None, 7], "int64")
+    assert str(values.dtype) == "Int64"
+    assert values[0] == 5 and values[1] is pd.NA
+
+
+def test_column_array_nulls_in_other_types():
+    floats = db._column_array([1.5, None], "float64")
+    assert floats.dtype == np.float64 and np.isnan(floats[1])
+    bools = db._column_array([True, None], "bool")
+    assert bools.dtype == object and list(bools) == [True, None]
+    dates = db._column_array([date(2026, 1, 2), None], "datetime64[D]")
+    assert dates.dtype == "datetime64[D]" and np.isnat(dates[1])
+
+
+def test_fetch_columns_keeps_numeric_exact():
+    cur = FakeCursor([("amount", NUMERIC)], [(Decimal("0.10"),), (Decimal("0.20"),), (None,)])
+    amounts = db._fetch_columns(cur, None)["amount"]
+    assert amounts.dtype == object
+    assert list(amounts) == [Decimal("0.10"), Decimal("0.20"), None]
+    assert amounts[:2].sum() == Decimal("0.30")
+
+
+def test_fetch_columns_numeric_as_float_on_request():
+    cur = FakeCursor([("amount", NUMERIC)], [(Decimal("2.50"),), (None,)])
+    amounts = db._fetch_columns(cur, {"amount": "float64"})["amount"]
+    assert amounts.dtype == np.float64
+    assert amounts[0] == 2.5 and np.isnan(amounts[1])
+
+
+def test_fetch_columns_joins_chunks_with_and_without_nulls(monkeypatch):
+    monkeypatch.setattr(db, "FETCH_CHUNK", 2)
+    rows = [(1, 1.0, True), (2, 2.0, False), (None, None, None), (4, 4.0, True), (5, 5.0, False)]
+    cur = FakeCursor([("card_id", INT4), ("score", FLOAT8), ("active", BOOL)], rows)
+    columns = db._fetch_columns(cur, None)
+    assert str(columns["card_id"].dtype) == "Int64"
+    assert list(columns["card_id"].fillna(0)) == [1, 2, 0, 4, 5]
+    assert columns["score"].dtype == np.float64 and np.isnan(columns["score"][2])
+    assert list(columns["active"]) == [True, False, None, True, False]
+
+
+def test_fetch_columns_without_nulls_stays_numpy(monkeypatch):
+    monkeypatch.setattr(db, "FETCH_CHUNK", 2)
+    cur = FakeCursor([("card_id", INT4)], [(i,) for i in range(5)])
+    card_ids = db._fetch_columns(cur, None)["card_id"]
+    assert isinstance(card_ids, np.ndarray) and card_ids.dtype == np.int64
+    assert list(card_ids) == [0, 1, 2, 3, 4]
+
+
+def test_fetch_columns_empty_result():
+    cur = FakeCursor([("card_id", INT4), ("name", TEXT), ("due_date", DATE)], [])
+    columns = db._fetch_columns(cur, {"due_date": "datetime64[D]"})
+    assert [(len(values), str(values.dtype)) for values in columns.values()] == \
+        [(0, "int64"), (0, "object"), (0, "datetime64[D]")]
+
+
+class FakePool:
+    recorder = None
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeServers:
+    """Answers the router's primary WAL and replica state queries."""
+
+    def __init__(self, primary, replica):
+        self.primary, self.replica = primary, replica
+        self.primary_lsn = 100
+        self.replica_state = {"in_recovery": True, "replayed_lsn": 100, "lag_seconds": 0.0}
+        self.replica_error = None
+        self.checks = 0
+
+    def query(self, pool, sql, params=None, shape=db.DATAFRAME, **kwargs):
+        if sql == db.PRIMARY_LSN_SQL:
+            assert pool is self.primary
+            return self.primary_lsn
+        assert sql == db.REPLICA_STATE_SQL and pool is self.replica
+        self.checks += 1
+        if self.replica_error:
+            raise self.replica_error
+        return dict(self.replica_state)
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    servers = FakeServers(FakePool("primary"), FakePool("replica"))
+    monkeypatch.setattr(db, "query", servers.query)
+    return servers
+
+
+def router(servers, **kwargs):
+    return db.ReadRouter(servers.primary, servers.replica, **kwargs)
+
+
+def test_router_reads_from_healthy_replica(servers):
+    reads = router(servers, check_every=60)
+    assert reads.choose() is servers.replica
+    assert reads.choose() is servers.replica
+    assert servers.checks == 1
+    stats = reads.stats()
+    assert (stats["replica_reads"], stats["primary_reads"], stats["replica_healthy"]) == (2, 0, True)
+
+
+def test_router_falls_back_while_replica_lags(servers):
+    servers.replica_state["lag_seconds"] = 30.0
+    reads = router(servers, max_lag=10, check_every=0)
+    assert reads.choose() is servers.primary
+    servers.replica_state["lag_seconds"] = 2.0
+    assert reads.choose() is servers.replica
+
+
+def test_router_skips_promoted_replica(servers):
+    servers.replica_state["in_recovery"] = False
+    reads = router(servers)
+    assert reads.choose() is servers.primary
+    assert reads.stats()["error"] == "not in recovery"
+
+
+def test_router_skips_unreachable_replica_until_next_check(servers):
+    servers.replica_error = psycopg2.OperationalError("could not connect to server")
+    reads = router(servers, check_every=60)
+    assert reads.choose() is servers.primary
+    servers.replica_error = None
+    assert reads.choose() is servers.primary
+    assert servers.checks == 1
+    assert reads.stats()["replica_failures"] == 1
+
+
+def test_router_reads_own_writes(servers):
+    reads = router(servers, check_every=60, recheck_after=0)
+    assert reads.choose() is servers.replica
+    servers.primary_lsn = 200
+    reads.mark_write()
+    assert reads.choose() is servers.primary
+    servers.replica_state["replayed_lsn"] = 200
+    assert reads.choose() is servers.replica
+    assert reads.stats()["required_lsn"] == 200
+
+
+def test_router_looks_up_primary_position_once_per_burst_of_writes(servers, monkeypatch):
+    lookups = []
+
+    def query(pool, sql, *args, **kwargs):
+        if sql == db.PRIMARY_LSN_SQL:
+            lookups.append(sql)
+        return servers.query(pool, sql, *args, **kwargs)
+
+    monkeypatch.setattr(db, "query", query)
+    reads = router(servers, check_every=60)
+    for _ in range(5):
+        reads.mark_write()
+    reads.choose()
+    reads.choose()
+    assert lookups == [db.PRIMARY_LSN_SQL]
@@ -0,0 +1,47 @@
+import import_catalog
+from import_catalog import CopyStream, normalize_isbn
+
+
+def test_normalize_isbn13():
+    assert normalize_isbn("9780306406157") == "9780306406157"
+    assert normalize_isbn("978-0-306-40615-7") == "9780306406157"
+    assert normalize_isbn(" 978 0306 40615 7\t") == "9780306406157"
+
+
+def test_normalize_isbn10_converts_to_isbn13():
+    assert normalize_isbn("0-306-40615-2") == "9780306406157"
+    assert normalize_isbn("080442957X") == "9780804429573"
+    assert normalize_isbn("080442957x") == "9780804429573"
+
+
+def test_normalize_isbn_rejects_invalid():
+    assert normalize_isbn("9780306406158") is None   # bad check digit
+    assert normalize_isbn("0-306-40615-3") is None   # bad check digit
+    assert normalize_isbn("1234567890123") is None   # not a 978/979 prefix
+    assert normalize_isbn("97803064061") is None     # too short
+    assert normalize_isbn("X306406152") is None
+    assert normalize_isbn("") is None
+
+
+def test_copy_stream_reads_everything():
+    stream = CopyStream(iter(["1,a\n", "", "2,b\n"]))
+    assert stream.read() == "1,a\n2,b\n"
+    assert stream.read() == ""
+
+
+def test_copy_stream_reads_across_blocks_in_sizes():
+    stream = CopyStream(iter(["abc", "de", "fghij"]))
+    assert stream.read(2) == "ab"
+    assert stream.read(4) == "cdef"
+    assert stream.read(0) == ""
+    assert stream.read(10) == "ghij"
+    assert stream.read(10) == ""
+
+
+def test_copy_stream_feeds_import_blocks():
+    records = iter([(1, {"isbn": "0-306-40615-2", "title": "Comma, Inc."}),
+                    (2, {"isbn": "bogus", "title": "Nope"})])
+    importer = import_catalog.Import(records)
+    data = CopyStream(importer.blocks()).read()
+    assert data.splitlines() == ['1,9780306406157,"Comma, Inc.",,,']
+    assert importer.rejected == {"invalid isbn": 1}
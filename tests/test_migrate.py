@@ -0,0 +1,60 @@
+import psycopg2
+import pytest
+
+import migrate
+from migrate import split_statements
+
+
+def test_split_statements():
+    sql = """-- migrate: no-transaction
+-- builds two indexes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS a_idx ON Book (title);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS b_idx
+    ON Book (author);  
+-- trailing comment;
+"""
+    assert split_statements(sql) == [
+        "-- migrate: no-transaction\n-- builds two indexes\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS a_idx ON Book (title)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS b_idx\n    ON Book (author)",
+    ]
+
+
+def test_split_statements_keeps_inline_semicolons():
+    sql = "COMMENT ON TABLE Book IS 'a; b';\nSELECT 1"
+    assert split_statements(sql) == ["COMMENT ON TABLE Book IS 'a; b'", "SELECT 1"]
+
+
+def test_split_statements_comment_only():
+    assert split_statements("-- nothing to do;\n\n") == []
+
+
+def test_every_migration_is_discovered():
+    versions = [version for version, _, _ in migrate.discover()]
+    assert versions == sorted(versions)
+    assert versions[0] == 1
+
+
+def test_migrate_fresh_database(scratch_dsn):
+    conn = psycopg2.connect(scratch_dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            if not cur.fetchone()[0]:
+                pytest.skip("pg_trgm is not installed on the test server")
+    finally:
+        conn.close()
+
+    versions = [version for version, _, _ in migrate.discover()]
+    assert migrate.migrate(scratch_dsn) == versions
+    assert migrate.migrate(scratch_dsn) == []
+
+    conn = psycopg2.connect(scratch_dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version FROM schema_migrations ORDER BY version")
+            assert [row[0] for row in cur.fetchall()] == versions
+            cur.execute("SELECT count(*) FROM pg_index WHERE NOT indisvalid")
+            assert cur.fetchone()[0] == 0
+    finally:
+        conn.close()
@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+import search
+from search import build_query, cursor_after, search_mode
+
+
+@pytest.mark.parametrize("term, mode", [
+    ("", "browse"),
+    ("978-0-306", "isbn"),
+    ("080442957X", "isbn"),
+    ("1984", "isbn"),
+    ("12", "text"),
+    ("dune", "text"),
+    ("978 0306", "text"),
+])
+def test_search_mode(term, mode):
+    assert search_mode(term) == mode
+
+
+def test_isbn_mode_is_a_prefix_match():
+    sql, params = build_query("978-0-306", "isbn", 26)
+    assert "WHERE isbn LIKE %(pattern)s" in sql
+    assert params == {"limit": 26, "pattern": "9780306%"}
+
+
+def test_isbn_modes_convert_isbn10():
+    assert build_query("0-8044-2957-x", "isbn", 26)[1]["pattern"] == "9780804429573%"
+    assert build_query("0306406152", "isbn_substring", 26)[1]["pattern"] == "%9780306406157%"
+
+
+def test_isbn_substring_mode_matches_anywhere():
+    sql, params = build_query("40615", "isbn_substring", 26, after=("9780306406157",))
+    assert "AND isbn > %(after_isbn)s" in sql
+    assert params == {"limit": 26, "pattern": "%40615%", "after_isbn": "9780306406157"}
+
+
+def test_text_mode_orders_by_distance():
+    sql, params = build_query("dune", "text", 26)
+    assert f"WHERE %(term)s <%% {search.SEARCH_TEXT}" in sql
+    assert "ORDER BY distance, isbn" in sql
+    assert params == {"limit": 26, "term": "dune"}
+
+
+def test_text_mode_keyset():
+    sql, params = build_query("dune", "text", 26, after=(0.25, "9780306406157"))
+    assert "(%(after_distance)s, %(after_isbn)s)" in sql
+    assert params["after_distance"] == 0.25 and params["after_isbn"] == "9780306406157"
+
+
+def test_browse_keyset():
+    sql, params = build_query("", "browse", 26, after=("Dune", "9780306406157"))
+    assert "WHERE (title, isbn) > (%(after_title)s, %(after_isbn)s)" in sql
+    assert params == {"limit": 26, "after_title": "Dune", "after_isbn": "9780306406157"}
+
+
+def test_queries_render_with_psycopg2_placeholders():
+    # % signs that are not placeholders must be doubled for psycopg2
+    for mode in ("browse", "isbn", "isbn_substring", "text"):
+        sql, params = build_query("dune", mode, 26, after=None)
+        sql % {name: "x" for name in params}
+
+
+def test_fallback_modes_end_in_text_search():
+    mode, seen = "isbn", []
+    while mode in search.FALLBACK_MODES:
+        mode = search.FALLBACK_MODES[mode]
+        seen.append(mode)
+    assert seen == ["isbn_substring", "text"]
+
+
+def test_cursor_after():
+    page = pd.DataFrame({"isbn": ["9780306406157", "9780804429573"], "title": ["A", "B"],
+                         "distance": [0.0, 0.125]})
+    assert cursor_after(page, "browse") == ("B", "9780804429573")
+    assert cursor_after(page, "isbn") == ("9780804429573",)
+    assert cursor_after(page, "isbn_substring") == ("9780804429573",)
+    assert cursor_after(page, "text") == (0.125, "9780804429573")
+    assert type(cursor_after(page, "text")[0]) is float
+
+
+def test_escape_like():
+    assert search.escape_like("50%_off\\") == "50\\%\\_off\\\\"